@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Connection, Parameter, Query, Project, ProjectNode, QueryExecution
+from .models import Connection, Parameter, Query, Project, ProjectNode, QueryExecution, ExportJob
 
 
 @admin.register(Project)
@@ -114,8 +114,8 @@ class ProjectNodeAdmin(admin.ModelAdmin):
 
 @admin.register(QueryExecution)
 class QueryExecutionAdmin(admin.ModelAdmin):
-    list_display = ['query', 'user', 'status', 'execution_time', 'rows_returned', 'executed_at']
-    list_filter = ['status', 'executed_at']
+    list_display = ['query', 'user', 'status', 'execution_time', 'rows_returned', 'cache_hit', 'executed_at']
+    list_filter = ['status', 'cache_hit', 'executed_at']
     search_fields = ['query__name', 'user__username']
     readonly_fields = ['executed_at']
     
@@ -124,9 +124,17 @@ class QueryExecutionAdmin(admin.ModelAdmin):
             'fields': ('query', 'user', 'parameters')
         }),
         ('Resultado', {
-            'fields': ('status', 'execution_time', 'rows_returned', 'error_message')
+            'fields': ('status', 'execution_time', 'rows_returned', 'cache_hit', 'error_message')
         }),
         ('Data', {
             'fields': ('executed_at',)
         }),
     )
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['query', 'user', 'format', 'status', 'rows_written', 'file_size', 'created_at', 'finished_at']
+    list_filter = ['status', 'format', 'created_at']
+    search_fields = ['query__name', 'user__username']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
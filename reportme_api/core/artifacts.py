@@ -0,0 +1,365 @@
+"""
+Artefatos de exportação (arquivos prontos reaproveitados entre usuários)
+
+O arquivo gerado por POST queries/export/ é guardado em ARTIFACT_DIR com o
+nome derivado de (consulta, versão, conexão, parâmetros canonicalizados,
+formato, compressão, limite) - a mesma chave do cache de resultados. Uma nova
+exportação com os mesmos dados é atendida a partir do arquivo, sem executar o
+SQL nem gerar o arquivo de novo, enquanto Query.cache_duration permitir.
+Alterar a consulta, seus parâmetros ou a conexão troca o token de versão e os
+artefatos anteriores deixam de ser encontrados (e expiram).
+
+Estrutura de um artefato (<ARTIFACT_DIR>/<chave>.*):
+- <chave>.<extensão>: o arquivo exportado
+- <chave>.json: consulta, formato, parâmetros, linhas, tamanho e validade;
+  o mtime registra o último acesso
+
+Quando o diretório excede ARTIFACT_DIR_MAX_BYTES, os artefatos menos acessados
+recentemente são removidos (LRU).
+
+Artefatos gerados a pedido do cliente (exportação em vários formatos com
+bundle 'artifacts') ficam disponíveis para download por ARTIFACT_DOWNLOAD_TTL
+segundos, mas só são reaproveitados por outras exportações dentro de
+cache_duration.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from .exporters import COMPRESSIONS, EXPORT_FORMATS
+from .result_cache import build_fingerprint, canonicalize_parameters, is_cache_enabled
+
+logger = logging.getLogger(__name__)
+
+
+ARTIFACT_DEFAULTS = {
+    'ENABLE_EXPORT_ARTIFACTS': True,
+    'ARTIFACT_DIR': None,                               # Padrão: <tmp>/reportme_artifacts
+    'ARTIFACT_DIR_MAX_BYTES': 5 * 1024 * 1024 * 1024,   # Tamanho total em disco
+    'ARTIFACT_DOWNLOAD_TTL': 3600,                      # Artefatos pedidos pelo cliente (bundle 'artifacts')
+}
+
+META_EXTENSION = 'json'
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Arquivos .tmp mais antigos que isso são de gravações interrompidas
+STALE_TEMP_SECONDS = 3600
+
+_ARTIFACT_KEY = re.compile(r'^[0-9a-f]{64}$')
+
+
+def get_artifact_setting(name):
+    """Obter configuração dos artefatos (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get(name, ARTIFACT_DEFAULTS[name])
+
+
+def get_artifact_dir():
+    directory = get_artifact_setting('ARTIFACT_DIR') or os.path.join(tempfile.gettempdir(), 'reportme_artifacts')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def is_artifact_enabled(query):
+    """Exportações da consulta são reaproveitadas (cache ativo e cache_duration > 0)"""
+    return bool(get_artifact_setting('ENABLE_EXPORT_ARTIFACTS')) and is_cache_enabled(query)
+
+
+def artifact_key(query, parameters, export_format, limit, compression=''):
+    return build_fingerprint(query, parameters, ('artifact', export_format, compression or '', limit))
+
+
+def artifact_extension(export_format, compression=''):
+    extension = EXPORT_FORMATS[export_format].extension
+    if compression:
+        extension = f"{extension}.{COMPRESSIONS[compression][0]}"
+    return extension
+
+
+class ExportArtifact:
+    """Arquivo de exportação armazenado e seus metadados"""
+
+    def __init__(self, key, meta):
+        self.key = key
+        self.meta = meta
+
+    @property
+    def path(self):
+        return os.path.join(get_artifact_dir(), f"{self.key}.{self.meta['extension']}")
+
+    @property
+    def meta_path(self):
+        return os.path.join(get_artifact_dir(), f"{self.key}.{META_EXTENSION}")
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def size(self):
+        return self.meta['size']
+
+    @property
+    def content_type(self):
+        return self.meta['content_type']
+
+    @property
+    def extension(self):
+        return self.meta['extension']
+
+    @property
+    def expired(self):
+        return time.time() > self.meta['expires_at']
+
+    @property
+    def reusable(self):
+        """Pode atender novas exportações (dentro de cache_duration)"""
+        return time.time() <= self.meta.get('reuse_until', self.meta['expires_at'])
+
+    def last_access(self):
+        return os.path.getmtime(self.meta_path)
+
+    def open(self):
+        """Abrir o arquivo para leitura (continua legível mesmo se removido em seguida)"""
+        return open(self.path, 'rb')
+
+    def chunks(self, chunk_size=READ_CHUNK_SIZE):
+        with self.open() as artifact_file:
+            while True:
+                data = artifact_file.read(chunk_size)
+                if not data:
+                    return
+                yield data
+
+    def delete(self):
+        for path in (self.meta_path, self.path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def as_dict(self):
+        """Representação para o endpoint de administração"""
+        return {
+            'key': self.key,
+            'query_id': self.meta['query_id'],
+            'query_name': self.meta['query_name'],
+            'format': self.meta['format'],
+            'compression': self.meta['compression'],
+            'limit': self.meta['limit'],
+            'parameters': self.meta['parameters'],
+            'rows': self.rows,
+            'size': self.size,
+            'created_at': _isoformat(self.meta['created_at']),
+            'expires_at': _isoformat(self.meta['expires_at']),
+            'last_access': _isoformat(self.last_access()),
+        }
+
+    @classmethod
+    def load(cls, key):
+        """Artefato pela chave (ou None se inexistente)"""
+        if not key or not _ARTIFACT_KEY.match(str(key)):
+            return None
+        try:
+            with open(os.path.join(get_artifact_dir(), f"{key}.{META_EXTENSION}")) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        artifact = cls(key, meta)
+        if not os.path.exists(artifact.path):
+            return None
+        return artifact
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def get_artifact(query, parameters, export_format, limit, compression=''):
+    """
+    Artefato válido para a exportação (ou None)
+
+    O acesso renova a posição do artefato na ordem de remoção (LRU), mas não
+    o prazo de validade, que conta a partir da geração.
+    """
+    if not is_artifact_enabled(query):
+        return None
+
+    artifact = ExportArtifact.load(artifact_key(query, parameters, export_format, limit, compression))
+    if artifact is None:
+        return None
+    if not artifact.reusable:
+        if artifact.expired:
+            artifact.delete()
+        return None
+
+    try:
+        os.utime(artifact.meta_path)
+    except OSError:
+        return None
+    return artifact
+
+
+class ArtifactWriter:
+    """
+    Arquivo temporário de uma exportação em andamento
+
+    commit(rows) publica o artefato ao final da exportação; discard() descarta
+    o arquivo (erro ou download interrompido). download_ttl mantém o arquivo
+    disponível para download por mais tempo que cache_duration.
+    """
+
+    def __init__(self, query, parameters, export_format, limit, compression='', download_ttl=None):
+        self.query = query
+        self.parameters = parameters or {}
+        self.format = export_format
+        self.limit = limit
+        self.compression = compression or ''
+        self.key = artifact_key(query, parameters, export_format, limit, compression)
+        self.download_ttl = download_ttl or 0
+        self.rows = 0
+        self.temp_path = os.path.join(get_artifact_dir(), f"{self.key}.{uuid.uuid4().hex}.tmp")
+        self.file = open(self.temp_path, 'w+b')
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return self.file.write(data)
+
+    def commit(self, rows=None):
+        """Publicar o arquivo gravado como artefato"""
+        if rows is not None:
+            self.rows = rows
+        self.file.close()
+
+        now = time.time()
+        reuse_ttl = self.query.cache_duration if is_artifact_enabled(self.query) else 0
+        meta = {
+            'query_id': self.query.pk,
+            'query_name': self.query.name,
+            'parameters': json.loads(canonicalize_parameters(self.parameters)),
+            'format': self.format,
+            'compression': self.compression,
+            'limit': self.limit,
+            'extension': artifact_extension(self.format, self.compression),
+            'content_type': (
+                COMPRESSIONS[self.compression][1] if self.compression
+                else EXPORT_FORMATS[self.format].content_type
+            ),
+            'rows': self.rows,
+            'size': os.path.getsize(self.temp_path),
+            'created_at': now,
+            'reuse_until': now + reuse_ttl,
+            'expires_at': now + max(reuse_ttl, self.download_ttl),
+        }
+        artifact = ExportArtifact(self.key, meta)
+
+        os.replace(self.temp_path, artifact.path)
+        meta_temp_path = f"{artifact.meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(meta_temp_path, 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(meta_temp_path, artifact.meta_path)
+
+        evict_artifacts(keep=self.key)
+        return artifact
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+def tee_to_artifact(chunks, writer):
+    """
+    Repassar as partes geradas por um exportador gravando-as no artefato
+
+    O artefato é publicado apenas se todas as partes forem geradas; erros e
+    downloads interrompidos descartam o arquivo.
+    """
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+    except BaseException:
+        writer.discard()
+        raise
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+    try:
+        writer.commit()
+    except OSError as e:
+        logger.warning(f"Não foi possível armazenar o artefato {writer.key}: {e}")
+        writer.discard()
+
+
+def list_artifacts():
+    """Artefatos armazenados, dos acessados mais recentemente para os mais antigos"""
+    artifacts = []
+    for entry in os.scandir(get_artifact_dir()):
+        name, _, extension = entry.name.partition('.')
+        if extension != META_EXTENSION:
+            continue
+        artifact = ExportArtifact.load(name)
+        if artifact is None:
+            continue
+        try:
+            artifacts.append((artifact.last_access(), artifact))
+        except OSError:
+            continue
+    return [artifact for _, artifact in sorted(artifacts, key=lambda item: item[0], reverse=True)]
+
+
+def purge_artifacts(query_id=None):
+    """Remover todos os artefatos (ou os de uma consulta); retorna quantos foram removidos"""
+    removed = 0
+    for artifact in list_artifacts():
+        if query_id is not None and artifact.meta['query_id'] != query_id:
+            continue
+        artifact.delete()
+        removed += 1
+    return removed
+
+
+def evict_artifacts(keep=None):
+    """Remover artefatos expirados e, acima do limite em disco, os menos usados"""
+    directory = get_artifact_dir()
+    max_bytes = get_artifact_setting('ARTIFACT_DIR_MAX_BYTES')
+    now = time.time()
+
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.tmp'):
+            # Gravação interrompida (ex.: worker finalizado no meio da escrita)
+            try:
+                if now - entry.stat().st_mtime > STALE_TEMP_SECONDS:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    artifacts = []
+    for artifact in list_artifacts():
+        if artifact.expired and artifact.key != keep:
+            artifact.delete()
+            continue
+        artifacts.append(artifact)
+
+    total = sum(artifact.size for artifact in artifacts)
+    # list_artifacts() ordena do mais recente para o mais antigo
+    for artifact in reversed(artifacts):
+        if total <= max_bytes:
+            break
+        if artifact.key == keep:
+            continue
+        logger.info(f"Removendo artefato de exportação {artifact.key} (LRU)")
+        artifact.delete()
+        total -= artifact.size
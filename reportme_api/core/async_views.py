@@ -0,0 +1,266 @@
+"""
+Execução assíncrona de consultas (ASGI)
+
+Os drivers dos bancos de origem são bloqueantes. Na rota assíncrona a leitura
+do banco de origem roda em um pool de threads dedicado, enquanto o worker ASGI
+continua atendendo as demais execuções. O número de execuções simultâneas por Connection é limitado; acima do
+limite as requisições aguardam uma vaga por ASYNC_QUEUE_TIMEOUT segundos e
+depois recebem 503.
+
+Em produção apenas esta rota é servida pelos workers ASGI (serviço api_async,
+roteado pelo nginx); sob WSGI ela continua funcionando, mas ocupa o worker
+durante a execução.
+"""
+import asyncio
+import json
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from authentication.audit import log_user_action
+
+from .connection_pool import get_pool_setting
+from .dialects import QueryTimeoutError, get_effective_timeout, limit_sql, prepare_query
+from .models import Query, QueryExecution
+from .result_cache import get_cached_result, set_cached_result
+from .result_formats import to_columnar
+from .serializers import QueryExecutionSerializer
+from .streaming import StreamingQuery
+
+
+ASYNC_DEFAULTS = {
+    'ASYNC_EXECUTOR_THREADS': 64,           # Consultas em execução simultânea por worker
+    'ASYNC_CONNECTION_CONCURRENCY': None,   # Por Connection (padrão: POOL_MAX_SIZE)
+    'ASYNC_QUEUE_TIMEOUT': 30,              # Segundos aguardando uma vaga na Connection
+}
+
+
+class ConnectionBusyError(Exception):
+    """Limite de execuções simultâneas da conexão atingido"""
+
+
+def get_async_setting(name):
+    """Obter configuração da execução assíncrona (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    value = reportme_settings.get(name, ASYNC_DEFAULTS[name])
+    if name == 'ASYNC_CONNECTION_CONCURRENCY' and not value:
+        value = get_pool_setting('POOL_MAX_SIZE')
+    return value
+
+
+_executor = None
+
+
+def get_executor():
+    """Pool de threads que executa as leituras nos bancos de origem"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_async_setting('ASYNC_EXECUTOR_THREADS'),
+            thread_name_prefix='reportme-query'
+        )
+    return _executor
+
+
+class ConnectionLimiter:
+    """
+    Semáforos por Connection, um conjunto por event loop (primitivas asyncio
+    não podem ser compartilhadas entre loops)
+    """
+
+    def __init__(self):
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self, connection_id):
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.setdefault(loop, {})
+        if connection_id not in semaphores:
+            semaphores[connection_id] = asyncio.Semaphore(get_async_setting('ASYNC_CONNECTION_CONCURRENCY'))
+        return semaphores[connection_id]
+
+    @asynccontextmanager
+    async def slot(self, connection_id, timeout=None):
+        """Reservar uma vaga de execução na conexão"""
+        semaphore = self._semaphore(connection_id)
+        if timeout is None:
+            timeout = get_async_setting('ASYNC_QUEUE_TIMEOUT')
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionBusyError(
+                "Limite de execuções simultâneas desta conexão atingido. Tente novamente em instantes."
+            )
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+connection_limiter = ConnectionLimiter()
+
+
+def _fetch_rows(connection, sql_query, sql_params, timeout):
+    """Ler o resultado no pool de threads (sem acesso ao banco do Django)"""
+    with StreamingQuery(connection, sql_query, sql_params, timeout=timeout) as stream:
+        rows = stream.fetch_all()
+        return stream.columns, stream.column_types, rows
+
+
+async def _run_blocking(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), func, *args)
+
+
+def _authenticate(request):
+    """Autenticar com os autenticadores do DRF (JWT); retorna o Request do DRF"""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    drf_request.user
+    return drf_request
+
+
+def _json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _error_response(error):
+    """Resposta de erro da execução (mesmo formato das actions síncronas)"""
+    if isinstance(error, QueryTimeoutError):
+        return _json_response({
+            'success': False,
+            'timeout': True,
+            'error': str(error),
+            'timestamp': timezone.now().isoformat()
+        }, status=504)
+    if isinstance(error, ConnectionBusyError):
+        response = _json_response({
+            'success': False,
+            'busy': True,
+            'error': str(error),
+            'timestamp': timezone.now().isoformat()
+        }, status=503)
+        response['Retry-After'] = '5'
+        return response
+    return _json_response({
+        'success': False,
+        'error': str(error),
+        'timestamp': timezone.now().isoformat()
+    }, status=400)
+
+
+@csrf_exempt
+async def execute_query_async(request):
+    """
+    Executar consulta SQL (versão assíncrona de POST queries/execute/)
+
+    Aceita o mesmo corpo (query_id, parameters, limit) e retorna o mesmo
+    resultado, inclusive ?format=columnar e o cache de resultados.
+    """
+    if request.method != 'POST':
+        return _json_response({'detail': f'Método "{request.method}" não permitido.'}, status=405)
+
+    try:
+        drf_request = await sync_to_async(_authenticate)(request)
+    except Exception as e:
+        return _json_response({'detail': str(e)}, status=401)
+    user = drf_request.user
+    if not user or not user.is_authenticated:
+        return _json_response({'detail': 'As credenciais de autenticação não foram fornecidas.'}, status=401)
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return _json_response({'detail': 'JSON inválido'}, status=400)
+
+    serializer = QueryExecutionSerializer(data=data, context={'request': drf_request})
+    if not await sync_to_async(serializer.is_valid)():
+        return _json_response(serializer.errors, status=400)
+
+    query_id = serializer.validated_data['query_id']
+    parameters = serializer.validated_data.get('parameters', {})
+    limit = serializer.validated_data.get('limit', 100)
+    query = await Query.objects.select_related('connection').aget(id=query_id)
+    columnar = request.GET.get('format') == 'columnar'
+
+    start_time = time.time()
+
+    # Resultado já em cache (Query.cache_duration)
+    cache_variant = ('execute', limit)
+    cached = await _run_blocking(get_cached_result, query, parameters, cache_variant)
+    if cached is not None:
+        result = {**cached, 'cache_hit': True, 'timestamp': timezone.now().isoformat()}
+        await QueryExecution.objects.acreate(
+            query=query,
+            user=user,
+            status='success',
+            execution_time=0,
+            rows_returned=len(result.get('rows', [])),
+            parameters=parameters,
+            cache_hit=True
+        )
+        return _json_response(to_columnar(result) if columnar else result)
+
+    sql_query = limit_sql(query.query, query.connection.sgbd) if limit and limit > 0 else query.query
+    sql_query, sql_params = prepare_query(
+        sql_query, query.connection.sgbd, {**parameters, 'reportme_limit': limit}
+    )
+
+    try:
+        async with connection_limiter.slot(query.connection_id):
+            columns, column_types, rows = await _run_blocking(
+                _fetch_rows, query.connection, sql_query, sql_params, get_effective_timeout(query)
+            )
+    except Exception as e:
+        if not isinstance(e, ConnectionBusyError):
+            await QueryExecution.objects.acreate(
+                query=query,
+                user=user,
+                status='timeout' if isinstance(e, QueryTimeoutError) else 'error',
+                execution_time=round(time.time() - start_time, 3),
+                error_message=str(e),
+                parameters=parameters
+            )
+        await sync_to_async(log_user_action)(
+            user=user,
+            action='execute_query',
+            details=f"Erro ao executar consulta (async) ID {query_id}: {str(e)}"
+        )
+        return _error_response(e)
+
+    execution_time = round((time.time() - start_time) * 1000, 2)
+    result = {
+        'success': True,
+        'columns': columns,
+        'column_types': column_types,
+        'rows': rows,
+        'total_records': len(rows),
+        'execution_time_ms': execution_time,
+        'timestamp': timezone.now().isoformat(),
+        'cache_hit': False
+    }
+    await _run_blocking(set_cached_result, query, parameters, cache_variant, result, len(rows))
+
+    await QueryExecution.objects.acreate(
+        query=query,
+        user=user,
+        status='success',
+        execution_time=execution_time / 1000,
+        rows_returned=len(rows),
+        parameters=parameters
+    )
+    await sync_to_async(log_user_action)(
+        user=user,
+        action='execute_query',
+        details=f"Executada consulta (async): {query.name} - {len(rows)} registros"
+    )
+
+    return _json_response(to_columnar(result) if columnar else result)
@@ -0,0 +1,392 @@
+"""
+Exportação em lote dos relatórios de uma pasta (ProjectNode e descendentes)
+
+As consultas dos nós são executadas em paralelo por um pool de threads
+(BULK_EXPORT_WORKERS), limitado por conexão (BULK_EXPORT_CONNECTION_CONCURRENCY,
+padrão POOL_MAX_SIZE), e cada resultado é gravado em um arquivo temporário.
+O tempo total fica próximo ao do relatório mais lento, e não à soma de todos.
+
+Formatos:
+- 'excel': uma pasta de trabalho com a aba "Índice" e uma aba por relatório
+- 'zip': um CSV por relatório, enviado à medida que cada um termina
+
+O limite por conexão vale para todas as exportações em lote do processo. Se a
+exportação é interrompida (ex.: download cancelado), as consultas em
+andamento param no próximo lote e as que aguardam vaga não são executadas.
+"""
+import csv
+import io
+import logging
+import pickle
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from django.conf import settings
+from openpyxl import Workbook
+
+from .connection_pool import get_pool_setting
+from .dialects import QueryTimeoutError, get_effective_timeout, limit_sql, prepare_query
+from .exporters import excel_value, write_csv
+from .models import ProjectNode
+from .streaming import StreamingQuery
+
+logger = logging.getLogger(__name__)
+
+
+BULK_EXPORT_DEFAULTS = {
+    'BULK_EXPORT_WORKERS': 8,                       # Relatórios executados em paralelo
+    'BULK_EXPORT_CONNECTION_CONCURRENCY': None,     # Por Connection (padrão: POOL_MAX_SIZE)
+}
+
+# Caracteres não permitidos em nomes de abas do Excel
+_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+_INVALID_FILE_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+# Intervalo (segundos) para verificar cancelamento enquanto aguarda vaga na conexão
+_SLOT_INTERVAL = 0.1
+
+
+def get_bulk_export_setting(name):
+    """Obter configuração da exportação em lote (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    value = reportme_settings.get(name, BULK_EXPORT_DEFAULTS[name])
+    if name == 'BULK_EXPORT_CONNECTION_CONCURRENCY' and not value:
+        value = get_pool_setting('POOL_MAX_SIZE')
+    return value
+
+
+class BulkReport:
+    """Um relatório (nó com consulta) da exportação em lote e seu resultado"""
+
+    def __init__(self, node, path):
+        self.node = node
+        self.query = node.query
+        self.path = path
+        self.columns = []
+        self.column_types = []
+        self.rows = 0
+        self.execution_time = 0
+        self.error = None
+        self.spool = None
+
+    @property
+    def status(self):
+        if self.error is None:
+            return 'success'
+        return 'timeout' if isinstance(self.error, QueryTimeoutError) else 'error'
+
+    def close(self):
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+
+
+def collect_reports(node):
+    """
+    Nós ativos com consulta sob node (inclusive), na ordem da árvore
+
+    A subárvore é lida em uma única consulta (índice de ancestrais) e
+    percorrida em memória.
+    """
+    nodes = ProjectNode.objects.filter(
+        ancestry__startswith=node.ancestry, is_active=True
+    ).select_related('query__connection').order_by('order', 'name')
+
+    children = defaultdict(list)
+    by_id = {}
+    for current in nodes:
+        children[current.parent_id].append(current)
+        by_id[current.pk] = current
+
+    reports = []
+    if node.pk not in by_id:
+        return reports
+
+    stack = [(by_id[node.pk], [node.name])]
+    while stack:
+        current, path = stack.pop()
+        if current.query_id and current.query.is_active:
+            reports.append(BulkReport(current, path))
+        for child in reversed(children[current.pk]):
+            stack.append((child, path + [child.name]))
+    return reports
+
+
+class BulkExportCancelled(Exception):
+    """A exportação foi interrompida antes de o relatório terminar"""
+
+
+class _ConnectionSlots:
+    """
+    Semáforos por Connection compartilhados pelas exportações em lote do
+    processo (um novo semáforo é criado se o limite configurado mudar)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def _semaphore(self, connection_id):
+        limit = get_bulk_export_setting('BULK_EXPORT_CONNECTION_CONCURRENCY')
+        with self._lock:
+            current = self._semaphores.get(connection_id)
+            if current is None or current[0] != limit:
+                current = (limit, threading.BoundedSemaphore(limit))
+                self._semaphores[connection_id] = current
+            return current[1]
+
+    @contextmanager
+    def slot(self, connection_id, cancelled):
+        """Reservar uma vaga na conexão; levanta BulkExportCancelled se a exportação for interrompida"""
+        semaphore = self._semaphore(connection_id)
+        while not semaphore.acquire(timeout=_SLOT_INTERVAL):
+            if cancelled.is_set():
+                raise BulkExportCancelled()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+connection_slots = _ConnectionSlots()
+
+
+class _CountingStream:
+    """StreamingQuery que conta as linhas lidas e para se a exportação for interrompida"""
+
+    def __init__(self, stream, cancelled):
+        self._stream = stream
+        self._cancelled = cancelled
+        self.rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def batches(self):
+        for batch in self._stream.batches():
+            if self._cancelled.is_set():
+                raise BulkExportCancelled()
+            self.rows += len(batch)
+            yield batch
+
+
+def _spool_report(report, parameters, limit, cancelled, spool_csv):
+    """
+    Executar a consulta do relatório e gravar o resultado em um arquivo
+    temporário: CSV pronto (zip) ou lotes serializados (excel). Roda nas
+    threads do pool, sem acesso ao banco do Django.
+    """
+    query = report.query
+    start_time = time.time()
+    try:
+        with connection_slots.slot(query.connection_id, cancelled):
+            sql_query = limit_sql(query.query, query.connection.sgbd) if limit else query.query
+            sql_query, sql_params = prepare_query(
+                sql_query, query.connection.sgbd, {**parameters, 'reportme_limit': limit}
+            )
+            stream = _CountingStream(StreamingQuery(
+                query.connection, sql_query, sql_params, timeout=get_effective_timeout(query)
+            ).open(), cancelled)
+            report.columns = list(stream.columns)
+            report.column_types = list(stream.column_types)
+            report.spool = tempfile.TemporaryFile()
+
+            if spool_csv:
+                write_csv(stream, report.spool)
+            else:
+                try:
+                    for batch in stream.batches():
+                        pickle.dump(batch, report.spool, protocol=pickle.HIGHEST_PROTOCOL)
+                finally:
+                    stream.close()
+            report.rows = stream.rows
+            report.spool.seek(0)
+    except BulkExportCancelled as e:
+        report.error = e
+        report.close()
+    except Exception as e:
+        logger.error(f"Erro na exportação em lote ({query.name}): {e}")
+        report.error = e
+        report.close()
+    report.execution_time = round(time.time() - start_time, 3)
+    return report
+
+
+def _read_batches(spool):
+    while True:
+        try:
+            yield pickle.load(spool)
+        except EOFError:
+            return
+
+
+def _unique_name(name, used, max_length, invalid):
+    base = invalid.sub('_', name).strip() or 'Relatorio'
+    candidate = base[:max_length]
+    counter = 2
+    while candidate.lower() in used:
+        suffix = f" ({counter})"
+        candidate = base[:max_length - len(suffix)] + suffix
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _index_rows(reports):
+    rows = [['Relatório', 'Caminho', 'Registros', 'Tempo (s)', 'Status', 'Erro']]
+    for report in reports:
+        rows.append([
+            report.node.name,
+            ' / '.join(report.path),
+            report.rows,
+            report.execution_time,
+            report.status,
+            str(report.error) if report.error else ''
+        ])
+    return rows
+
+
+class BulkExport:
+    """
+    Execução paralela dos relatórios de uma pasta
+
+    Uso:
+        export = BulkExport(reports, parameters, limit)
+        export.write_xlsx(output)      # ou: for chunk in export.stream_zip(): ...
+        export.reports                 # resultado de cada relatório
+
+    Relatórios com error já definido (ex.: sem permissão) não são executados
+    e aparecem apenas no índice.
+    """
+
+    def __init__(self, reports, parameters=None, limit=None):
+        self.reports = reports
+        self.parameters = parameters or {}
+        self.limit = limit
+        self._cancelled = threading.Event()
+
+    def _submit(self, executor, spool_csv):
+        return {
+            executor.submit(_spool_report, report, self.parameters, self.limit, self._cancelled, spool_csv): report
+            for report in self.reports if report.error is None
+        }
+
+    def _shutdown(self, executor):
+        """
+        Interromper os relatórios em andamento e aguardar as threads antes de
+        descartar os arquivos temporários (nenhuma thread grava em um arquivo
+        já fechado nem mantém a consulta aberta na origem)
+        """
+        self._cancelled.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        for report in self.reports:
+            report.close()
+
+    def _executor(self):
+        return ThreadPoolExecutor(
+            max_workers=get_bulk_export_setting('BULK_EXPORT_WORKERS'),
+            thread_name_prefix='reportme-bulk'
+        )
+
+    def write_xlsx(self, output):
+        """
+        Gravar a pasta de trabalho (aba "Índice" + uma aba por relatório, na
+        ordem da árvore). Cada aba é gravada assim que seu relatório e os
+        anteriores terminam, enquanto os demais continuam em execução.
+        """
+        workbook = Workbook(write_only=True)
+        index_sheet = workbook.create_sheet('Índice')
+        used_names = {'índice'}
+
+        executor = self._executor()
+        try:
+            futures = self._submit(executor, spool_csv=False)
+            by_report = {id(report): future for future, report in futures.items()}
+            for report in self.reports:
+                if id(report) in by_report:
+                    by_report[id(report)].result()
+                if report.error is not None:
+                    continue
+                sheet = workbook.create_sheet(_unique_name(report.node.name, used_names, 31, _INVALID_SHEET_CHARS))
+                sheet.append(report.columns)
+                for batch in _read_batches(report.spool):
+                    for row in batch:
+                        sheet.append([excel_value(value) for value in row])
+                report.close()
+        finally:
+            self._shutdown(executor)
+
+        for row in _index_rows(self.reports):
+            index_sheet.append(row)
+        workbook.save(output)
+
+    def stream_zip(self, on_complete=None):
+        """
+        Gerar o ZIP (um CSV por relatório e indice.csv) em partes, incluindo
+        cada relatório assim que sua consulta termina
+
+        on_complete(reports) é chamado após o envio do último relatório.
+        """
+        sink = _ZipSink()
+        archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+        used_names = {'indice.csv'}
+        width = len(str(len(self.reports)))
+        positions = {id(report): index for index, report in enumerate(self.reports, start=1)}
+
+        executor = self._executor()
+        try:
+            futures = self._submit(executor, spool_csv=True)
+            for future in as_completed(futures):
+                report = future.result()
+                if report.error is not None:
+                    continue
+                name = f"{positions[id(report)]:0{width}d} - {report.node.name}"
+                filename = _unique_name(name, used_names, 120, _INVALID_FILE_CHARS) + '.csv'
+                with archive.open(filename, 'w', force_zip64=True) as entry:
+                    while True:
+                        data = report.spool.read(ZIP_CHUNK_SIZE)
+                        if not data:
+                            break
+                        entry.write(data)
+                        yield from sink.drain()
+                report.close()
+                yield from sink.drain()
+
+            index = io.StringIO()
+            csv.writer(index).writerows(_index_rows(self.reports))
+            archive.writestr('indice.csv', index.getvalue().encode('utf-8'))
+            archive.close()
+            yield from sink.drain()
+            if on_complete:
+                on_complete(self.reports)
+        finally:
+            self._shutdown(executor)
+
+
+class _ZipSink(io.RawIOBase):
+    """Destino não posicionável do zipfile; drain() devolve o que foi gravado"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        """Partes gravadas desde a última chamada (lista vazia se nada foi gravado)"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return [data] if data else []
@@ -0,0 +1,484 @@
+"""
+Pool de conexões com os bancos de dados de origem
+
+Cada registro de Connection possui sua própria pool, compartilhada por todos os
+caminhos de execução (execute, execute-paginated, export). As conexões são
+reutilizadas entre requisições, evitando o custo de handshake (TCP, TLS,
+autenticação) a cada relatório executado.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Valores padrão, sobrescritos por settings.REPORTME_SETTINGS
+POOL_DEFAULTS = {
+    'POOL_MIN_SIZE': 0,           # Conexões abertas ao criar a pool e mantidas (repostas após descartes)
+    'POOL_MAX_SIZE': 5,           # Máximo de conexões (ociosas + em uso) por Connection
+    'POOL_IDLE_TIMEOUT': 300,     # Segundos até fechar uma conexão ociosa
+    'POOL_MAX_LIFETIME': 1800,    # Segundos de vida máxima de uma conexão
+    'POOL_ACQUIRE_TIMEOUT': 30,   # Segundos aguardando uma conexão livre
+    'POOL_PING_ON_BORROW': True,  # Validar a conexão antes de entregá-la
+}
+
+# Consulta leve usada no health check de cada SGBD
+PING_QUERIES = {
+    'oracle': 'SELECT 1 FROM DUAL',
+}
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo limite"""
+
+
+def get_pool_setting(name):
+    """Obter configuração da pool (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get(name, POOL_DEFAULTS[name])
+
+
+def connection_fingerprint(connection):
+    """
+    Assinatura dos dados de conexão. Quando o registro é editado a assinatura
+    muda e a pool antiga é descartada, inclusive em outros workers que ainda
+    não receberam o sinal de invalidação.
+    """
+    raw = '|'.join(str(value) for value in [
+        connection.sgbd, connection.host, connection.port, connection.database,
+        connection.user, connection.password, connection.extra_config,
+        connection.updated_at,
+    ])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+# ===== CRIAÇÃO DE CONEXÕES (DRIVERS) =====
+
+def create_connection(connection):
+    """Abrir uma nova conexão com o banco de origem"""
+    if connection.sgbd == 'postgresql':
+        return _connect_postgresql(connection)
+    elif connection.sgbd == 'mysql':
+        return _connect_mysql(connection)
+    elif connection.sgbd == 'sqlserver':
+        return _connect_sqlserver(connection)
+    elif connection.sgbd == 'oracle':
+        return _connect_oracle(connection)
+    elif connection.sgbd == 'sqlite':
+        return _connect_sqlite(connection)
+    else:
+        raise ValueError(f"Tipo de banco de dados não suportado: {connection.sgbd}")
+
+
+def _connect_postgresql(connection):
+    """Conectar ao PostgreSQL"""
+    try:
+        import psycopg2
+        return psycopg2.connect(
+            host=connection.host,
+            port=connection.port or 5432,
+            database=connection.database,
+            user=connection.user,
+            password=connection.password,
+            connect_timeout=30  # Timeout padrão de conexão
+        )
+    except ImportError:
+        raise Exception("Driver PostgreSQL (psycopg2) não está instalado")
+
+
+def _connect_mysql(connection):
+    """Conectar ao MySQL"""
+    try:
+        import pymysql
+        return pymysql.connect(
+            host=connection.host,
+            port=connection.port or 3306,
+            database=connection.database,
+            user=connection.user,
+            password=connection.password,
+            connect_timeout=30  # Timeout padrão de conexão
+        )
+    except ImportError:
+        try:
+            import MySQLdb
+            return MySQLdb.connect(
+                host=connection.host,
+                port=connection.port or 3306,
+                db=connection.database,
+                user=connection.user,
+                passwd=connection.password,
+                connect_timeout=30  # Timeout padrão de conexão
+            )
+        except ImportError:
+            raise Exception("Nenhum driver MySQL encontrado. Execute: pip install pymysql")
+
+
+def _connect_sqlserver(connection):
+    """Conectar ao SQL Server"""
+    try:
+        import pyodbc
+        conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={connection.host},{connection.port or 1433};DATABASE={connection.database};UID={connection.user};PWD={connection.password}"
+        return pyodbc.connect(conn_str, timeout=30)  # Timeout padrão de conexão
+    except ImportError:
+        raise Exception("Driver SQL Server (pyodbc) não está instalado")
+
+
+def _connect_oracle(connection):
+    """Conectar ao Oracle"""
+    try:
+        import cx_Oracle
+        dsn = cx_Oracle.makedsn(connection.host, connection.port or 1521, service_name=connection.database)
+        return cx_Oracle.connect(connection.user, connection.password, dsn)
+    except ImportError:
+        raise Exception("Driver Oracle (cx_Oracle) não está instalado")
+
+
+def _connect_sqlite(connection):
+    """Conectar ao SQLite"""
+    try:
+        import sqlite3
+        # A pool entrega cada conexão a um único chamador por vez, então ela pode
+        # ser usada por threads diferentes ao longo da vida do worker
+        return sqlite3.connect(connection.database, timeout=30, check_same_thread=False)
+    except Exception as e:
+        raise Exception(f"Erro SQLite: {str(e)}")
+
+
+# ===== POOL =====
+
+class PooledConnection:
+    """
+    Conexão emprestada da pool. Repassa os atributos para a conexão do driver;
+    close() devolve a conexão para a pool em vez de fechá-la.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self._borrowed = False
+        self._discard = False
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def invalidate(self):
+        """Marcar a conexão para ser fechada ao invés de voltar para a pool"""
+        self._discard = True
+
+    def close(self):
+        """Devolver a conexão para a pool"""
+        if self._borrowed:
+            self._borrowed = False
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    """
+    Pool de conexões de um registro Connection
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.connection_id = connection.pk
+        self.sgbd = connection.sgbd
+        self.fingerprint = connection_fingerprint(connection)
+        self.pid = os.getpid()
+
+        self.max_size = max(get_pool_setting('POOL_MAX_SIZE'), 1)
+        self.min_size = min(max(get_pool_setting('POOL_MIN_SIZE'), 0), self.max_size)
+        self.idle_timeout = get_pool_setting('POOL_IDLE_TIMEOUT')
+        self.max_lifetime = get_pool_setting('POOL_MAX_LIFETIME')
+        self.acquire_timeout = get_pool_setting('POOL_ACQUIRE_TIMEOUT')
+        self.ping_on_borrow = get_pool_setting('POOL_PING_ON_BORROW')
+
+        self._idle = deque()
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._counters = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'ping_failures': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def acquire(self):
+        """Emprestar uma conexão (reutilizada ou nova)"""
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            entry = None
+            to_close = []
+
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise Exception("Pool de conexões encerrada")
+
+                    to_close.extend(self._prune_locked())
+
+                    if self._idle:
+                        entry = self._idle.pop()
+                        self._in_use += 1
+                        break
+
+                    if self._in_use + len(self._idle) < self.max_size:
+                        self._in_use += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão disponível para '{self.connection.name}' "
+                            f"após {self.acquire_timeout}s (máximo {self.max_size})"
+                        )
+                    self._counters['waits'] += 1
+                    self._cond.wait(remaining)
+
+            for stale in to_close:
+                self._close_raw(stale.raw)
+            if to_close:
+                self.fill()
+
+            if entry is not None:
+                if not self.ping_on_borrow or self._ping(entry.raw):
+                    with self._cond:
+                        self._counters['reused'] += 1
+                    entry._borrowed = True
+                    entry._discard = False
+                    return entry
+
+                # Conexão morta: descartar e tentar novamente
+                with self._cond:
+                    self._counters['ping_failures'] += 1
+                    self._counters['discarded'] += 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                self._close_raw(entry.raw)
+                continue
+
+            try:
+                raw = create_connection(self.connection)
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+            with self._cond:
+                self._counters['created'] += 1
+            entry = PooledConnection(self, raw)
+            entry._borrowed = True
+            return entry
+
+    def release(self, entry):
+        """Receber de volta uma conexão emprestada"""
+        discard = entry._discard
+
+        if not discard:
+            try:
+                # Encerrar transação implícita aberta pelo SELECT
+                entry.raw.rollback()
+            except Exception:
+                discard = True
+
+        if self.max_lifetime and time.monotonic() - entry.created_at > self.max_lifetime:
+            discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if self._closed or discard:
+                self._counters['discarded'] += 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                entry = None
+            self._cond.notify()
+
+        if entry is not None:
+            self._close_raw(entry.raw)
+            self.fill()
+
+    def fill(self):
+        """
+        Abrir conexões ociosas até min_size (conexões em uso contam). Falhas são
+        apenas registradas: a próxima requisição tenta conectar novamente.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            missing = self.min_size - self._in_use - len(self._idle)
+            # Reservar as vagas, como em acquire(), enquanto as conexões são abertas
+            self._in_use += max(missing, 0)
+
+        for _ in range(max(missing, 0)):
+            try:
+                raw = create_connection(self.connection)
+            except Exception as e:
+                logger.warning(f"Não foi possível abrir conexão mínima da pool '{self.connection.name}': {e}")
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                self._in_use -= 1
+                self._counters['created'] += 1
+                if self._closed:
+                    raw_to_close = raw
+                else:
+                    self._idle.append(PooledConnection(self, raw))
+                    raw_to_close = None
+                self._cond.notify()
+            if raw_to_close is not None:
+                self._close_raw(raw_to_close)
+
+    def close(self):
+        """Encerrar a pool; conexões em uso são fechadas quando devolvidas"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        for entry in idle:
+            self._close_raw(entry.raw)
+
+    def stats(self):
+        """Estatísticas da pool"""
+        with self._cond:
+            return {
+                'connection_id': self.connection_id,
+                'connection_name': self.connection.name,
+                'sgbd': self.sgbd,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                **self._counters,
+            }
+
+    def _prune_locked(self):
+        """Remover conexões ociosas expiradas (chamado com o lock adquirido)"""
+        now = time.monotonic()
+        removed = []
+        kept = deque()
+
+        # Das mais antigas para as mais recentes
+        for entry in self._idle:
+            expired_lifetime = self.max_lifetime and now - entry.created_at > self.max_lifetime
+            expired_idle = (
+                self.idle_timeout
+                and now - entry.last_used > self.idle_timeout
+                and len(self._idle) - len(removed) > self.min_size
+            )
+            if expired_lifetime or expired_idle:
+                removed.append(entry)
+            else:
+                kept.append(entry)
+
+        if removed:
+            self._idle = kept
+            self._counters['discarded'] += len(removed)
+        return removed
+
+    def _ping(self, raw):
+        """Health check da conexão antes de emprestá-la"""
+        try:
+            cursor = raw.cursor()
+            try:
+                cursor.execute(PING_QUERIES.get(self.sgbd, 'SELECT 1'))
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Conexão da pool '{self.connection.name}' falhou no health check: {e}")
+            return False
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+
+# ===== REGISTRO DE POOLS (POR PROCESSO) =====
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connection):
+    """Obter (ou criar) a pool de um registro Connection"""
+    fingerprint = connection_fingerprint(connection)
+    retired = None
+
+    with _pools_lock:
+        pool = _pools.get(connection.pk)
+        # Pool herdada via fork ou criada com dados antigos da conexão
+        if pool is not None and (pool.fingerprint != fingerprint or pool.pid != os.getpid()):
+            retired = pool
+            pool = None
+        created = pool is None
+        if created:
+            pool = ConnectionPool(connection)
+            _pools[connection.pk] = pool
+
+    if retired is not None and retired.pid == os.getpid():
+        retired.close()
+    if created:
+        pool.fill()
+    return pool
+
+
+def get_pooled_connection(connection):
+    """Emprestar uma conexão da pool do registro Connection"""
+    return get_pool(connection).acquire()
+
+
+def invalidate_pool(connection_id):
+    """Descartar a pool de uma conexão (ex.: registro editado ou excluído)"""
+    with _pools_lock:
+        pool = _pools.pop(connection_id, None)
+    if pool is not None:
+        pool.close()
+
+
+def close_all_pools():
+    """Encerrar todas as pools do processo"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def get_pools_stats():
+    """Estatísticas de todas as pools do processo atual"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {
+        'pid': os.getpid(),
+        'settings': {name: get_pool_setting(name) for name in POOL_DEFAULTS},
+        'pools': [pool.stats() for pool in pools],
+    }
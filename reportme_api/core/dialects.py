@@ -0,0 +1,405 @@
+"""
+Particularidades de cada SGBD de origem (parâmetros, paginação, timeouts, etc.)
+"""
+import json
+import re
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+
+
+class QueryTimeoutError(Exception):
+    """A consulta excedeu Query.timeout e foi cancelada no servidor"""
+
+
+def get_effective_timeout(query):
+    """
+    Timeout efetivo da consulta em segundos (0 = sem limite)
+
+    Usa Query.timeout, limitado por settings.QUERY_TIMEOUT quando definido.
+    """
+    timeout = query.timeout or 0
+    max_timeout = getattr(settings, 'QUERY_TIMEOUT', None)
+    if max_timeout:
+        timeout = min(timeout, max_timeout) if timeout > 0 else max_timeout
+    return max(timeout, 0)
+
+
+class StatementTimeout:
+    """
+    Aplica o timeout da consulta na conexão emprestada, de acordo com o SGBD
+
+    - PostgreSQL: SET LOCAL statement_timeout (desfeito no rollback da pool)
+    - MySQL: SET SESSION MAX_EXECUTION_TIME
+    - SQL Server (pyodbc): timeout de consulta da conexão (envia SQLCancel)
+    - Oracle (cx_Oracle): callTimeout da conexão
+    - SQLite: progress handler que interrompe a execução após o prazo
+
+    Em todos os casos a execução é interrompida no próprio servidor/engine, e
+    não apenas abandonada pelo cliente.
+    """
+
+    # Instruções da máquina virtual do SQLite entre verificações do prazo
+    SQLITE_PROGRESS_STEPS = 1000
+
+    def __init__(self, db_connection, sgbd, seconds):
+        self.raw = getattr(db_connection, 'raw', db_connection)
+        self.sgbd = sgbd
+        self.seconds = seconds
+        self.fired = False
+        self._deadline = None
+
+    @property
+    def enabled(self):
+        return bool(self.seconds)
+
+    def apply(self):
+        """Configurar o timeout na conexão (antes de executar a consulta)"""
+        if not self.enabled:
+            return self
+
+        milliseconds = int(self.seconds * 1000)
+
+        if self.sgbd == 'postgresql':
+            cursor = self.raw.cursor()
+            cursor.execute(f"SET LOCAL statement_timeout = {milliseconds}")
+            cursor.close()
+        elif self.sgbd == 'mysql':
+            cursor = self.raw.cursor()
+            cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {milliseconds}")
+            cursor.close()
+        elif self.sgbd == 'sqlserver':
+            self.raw.timeout = int(self.seconds)
+        elif self.sgbd == 'oracle':
+            self.raw.callTimeout = milliseconds
+        elif self.sgbd == 'sqlite':
+            self.raw.set_progress_handler(self._sqlite_progress, self.SQLITE_PROGRESS_STEPS)
+
+        self.arm()
+        return self
+
+    def arm(self):
+        """Reiniciar o prazo (antes de cada execução/fetch)"""
+        if self.enabled:
+            self._deadline = time.monotonic() + self.seconds
+
+    def clear(self):
+        """Remover o timeout da conexão antes de devolvê-la para a pool"""
+        if not self.enabled:
+            return
+        try:
+            if self.sgbd == 'mysql':
+                cursor = self.raw.cursor()
+                cursor.execute("SET SESSION MAX_EXECUTION_TIME = 0")
+                cursor.close()
+            elif self.sgbd == 'sqlserver':
+                self.raw.timeout = 0
+            elif self.sgbd == 'oracle':
+                self.raw.callTimeout = 0
+            elif self.sgbd == 'sqlite':
+                self.raw.set_progress_handler(None, 0)
+        except Exception:
+            pass
+
+    def is_timeout_error(self, exc):
+        """Verificar se a exceção do driver corresponde ao timeout aplicado"""
+        if not self.enabled:
+            return False
+
+        if self.sgbd == 'postgresql':
+            # query_canceled
+            return getattr(exc, 'pgcode', None) == '57014'
+        if self.sgbd == 'mysql':
+            # ER_QUERY_TIMEOUT / ER_QUERY_INTERRUPTED
+            return bool(exc.args) and exc.args[0] in (3024, 1317)
+        if self.sgbd == 'sqlserver':
+            return bool(exc.args) and exc.args[0] in ('HYT00', 'HYT01')
+        if self.sgbd == 'oracle':
+            message = str(exc)
+            return 'DPI-1067' in message or 'ORA-01013' in message or 'ORA-03156' in message
+        if self.sgbd == 'sqlite':
+            return self.fired and 'interrupted' in str(exc)
+        return False
+
+    def _sqlite_progress(self):
+        # Retorno diferente de zero aborta a instrução em execução
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            self.fired = True
+            return 1
+        return 0
+
+
+# ===== PARÂMETROS =====
+
+# paramstyle (PEP 249) do driver usado para cada SGBD
+PARAMSTYLES = {
+    'postgresql': 'pyformat',  # psycopg2: %(nome)s
+    'mysql': 'pyformat',       # pymysql/MySQLdb: %(nome)s
+    'sqlserver': 'qmark',      # pyodbc: ?
+    'oracle': 'named',         # cx_Oracle: :nome
+    'sqlite': 'named',         # sqlite3: :nome
+}
+
+# Consultas compiladas mantidas em memória por worker
+COMPILED_CACHE_SIZE = 512
+
+# Trechos do SQL que não contêm parâmetros (literais, identificadores entre
+# aspas, comentários e casts do PostgreSQL) e os próprios parâmetros :nome
+_SQL_TOKENS_TEMPLATE = r"""
+    (?P<string>{string})
+  | (?P<quoted>{quoted})
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<cast>::)
+  | (?P<param>(?<![\w:]):(?P<name>[a-zA-Z_][a-zA-Z0-9_]*))
+  | (?P<percent>%)
+"""
+_STANDARD_STRING = r"'(?:[^']|'')*'"
+_DOUBLE_QUOTED = r'"(?:[^"]|"")*"'
+
+
+def _sql_tokens(string=_STANDARD_STRING, quoted=_DOUBLE_QUOTED):
+    return re.compile(_SQL_TOKENS_TEMPLATE.format(string=string, quoted=quoted), re.S | re.X)
+
+
+_SQL_TOKENS = {
+    # MySQL aceita escape com barra invertida nos literais e `identificador`
+    'mysql': _sql_tokens(string=r"'(?:[^'\\]|\\.|'')*'", quoted=_DOUBLE_QUOTED + r'|`[^`]*`'),
+    'sqlserver': _sql_tokens(quoted=_DOUBLE_QUOTED + r'|\[[^\]]*\]'),
+    'sqlite': _sql_tokens(quoted=_DOUBLE_QUOTED + r'|`[^`]*`|\[[^\]]*\]'),
+}
+_DEFAULT_SQL_TOKENS = _sql_tokens()
+
+# SQL no paramstyle do driver; names contém os parâmetros na ordem em que os
+# placeholders aparecem (usada pelo paramstyle qmark)
+CompiledQuery = namedtuple('CompiledQuery', ['sql', 'paramstyle', 'names'])
+
+
+def get_paramstyle(sgbd):
+    return PARAMSTYLES.get(sgbd, 'named')
+
+
+def list_bind_name(name, index):
+    """Nome do placeholder de cada item de um parâmetro com múltiplos valores"""
+    return f"{name}__{index}"
+
+
+def _placeholder(paramstyle, name):
+    if paramstyle == 'pyformat':
+        return f"%({name})s"
+    if paramstyle == 'qmark':
+        return '?'
+    return f":{name}"
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_sql(sql, sgbd, list_sizes=()):
+    """
+    Converter placeholders :nome para o paramstyle nativo do driver
+
+    O resultado depende apenas do texto SQL (ou seja, da versão da consulta),
+    do SGBD e do número de itens dos parâmetros de lista, e por isso é
+    reaproveitado entre execuções, usuários e valores. Como os valores são
+    enviados separadamente, o texto executado é sempre o mesmo e o banco de
+    origem reutiliza o plano em cache.
+
+    list_sizes: tupla ((nome, quantidade), ...) dos parâmetros de lista, cada
+    um expandido em quantidade placeholders (ex.: IN (:ids)).
+    """
+    paramstyle = get_paramstyle(sgbd)
+    sizes = dict(list_sizes)
+    escape_percent = paramstyle == 'pyformat'
+    names = []
+    parts = []
+    position = 0
+
+    tokens = _SQL_TOKENS.get(sgbd, _DEFAULT_SQL_TOKENS)
+
+    for match in tokens.finditer(sql):
+        parts.append(sql[position:match.start()])
+        position = match.end()
+        text = match.group(0)
+
+        if match.group('param'):
+            name = match.group('name')
+            if name in sizes:
+                bind_names = [list_bind_name(name, i) for i in range(sizes[name])]
+                names.extend(bind_names)
+                text = ', '.join(_placeholder(paramstyle, bind_name) for bind_name in bind_names)
+            else:
+                names.append(name)
+                text = _placeholder(paramstyle, name)
+        elif escape_percent:
+            # Com pyformat todo % literal precisa ser escrito como %%
+            text = text.replace('%', '%%')
+
+        parts.append(text)
+
+    parts.append(sql[position:])
+    return CompiledQuery(''.join(parts), paramstyle, tuple(names))
+
+
+def bind_values(compiled, values):
+    """Montar os valores no formato esperado pelo driver (dict ou sequência)"""
+    if compiled.paramstyle == 'qmark':
+        return [values.get(name) for name in compiled.names]
+    return {name: values.get(name) for name in compiled.names}
+
+
+def prepare_query(sql, sgbd, parameters=None):
+    """
+    Compilar a consulta e associar os valores dos parâmetros
+
+    Parâmetros ausentes, None ou vazios são enviados como NULL. Listas e tuplas
+    são expandidas em um placeholder por item. Retorna (sql, params).
+    """
+    values = {}
+    list_sizes = []
+    for name, value in (parameters or {}).items():
+        if value == '':
+            value = None
+        if isinstance(value, (list, tuple)):
+            # Lista vazia vira um único NULL (IN (NULL) não seleciona nada)
+            items = list(value) or [None]
+            list_sizes.append((name, len(items)))
+            for index, item in enumerate(items):
+                values[list_bind_name(name, index)] = item
+        else:
+            values[name] = value
+
+    compiled = compile_sql(sql, sgbd, tuple(sorted(list_sizes)))
+    return compiled.sql, bind_values(compiled, values)
+
+
+# ===== PAGINAÇÃO =====
+
+# Coluna auxiliar com o total de linhas (COUNT(*) OVER())
+TOTAL_COLUMN = 'reportme_total'
+
+# SGBDs em que a página pode trazer o total na mesma consulta. No SQL Server o
+# OFFSET exige ORDER BY no nível externo, o que não é possível ao envolver uma
+# consulta que já ordena; ele usa sempre a contagem separada.
+WINDOW_COUNT_SGBDS = ('postgresql', 'mysql', 'oracle', 'sqlite')
+
+# SGBDs com estimativa de linhas do otimizador
+ESTIMATE_SGBDS = ('postgresql', 'mysql')
+
+
+def limit_sql(sql, sgbd):
+    """Limitar o número de linhas conforme o SGBD (parâmetro :reportme_limit)"""
+    if sgbd == 'sqlserver':
+        return f"SELECT TOP (:reportme_limit) * FROM ({sql}) as limited_query"
+    if sgbd == 'oracle':
+        return f"SELECT * FROM ({sql}) WHERE ROWNUM <= :reportme_limit"
+    return f"{sql} LIMIT :reportme_limit"
+
+
+def paginate_sql(sql, sgbd, with_total=False):
+    """
+    Aplicar LIMIT/OFFSET conforme o SGBD
+
+    Usa os parâmetros internos :reportme_limit, :reportme_offset e
+    :reportme_end (offset + limit). Com with_total, a última coluna
+    (TOTAL_COLUMN) traz o total de linhas da consulta sem paginação.
+    """
+    if sgbd == 'sqlserver':
+        # SQL Server usa OFFSET/FETCH
+        return f"{sql} OFFSET :reportme_offset ROWS FETCH NEXT :reportme_limit ROWS ONLY"
+    if sgbd == 'oracle':
+        # Oracle usa ROWNUM (com o total, a contagem precisa da consulta inteira)
+        if with_total:
+            return (
+                f"SELECT * FROM (SELECT a.*, ROWNUM rnum, COUNT(*) OVER() {TOTAL_COLUMN} FROM ({sql}) a) "
+                f"WHERE rnum > :reportme_offset AND rnum <= :reportme_end"
+            )
+        return f"SELECT * FROM (SELECT a.*, ROWNUM rnum FROM ({sql}) a WHERE ROWNUM <= :reportme_end) WHERE rnum > :reportme_offset"
+    # PostgreSQL, MySQL, SQLite usam LIMIT/OFFSET
+    if with_total:
+        return (
+            f"SELECT reportme_page.*, COUNT(*) OVER() AS {TOTAL_COLUMN} FROM ({sql}) reportme_page "
+            f"LIMIT :reportme_limit OFFSET :reportme_offset"
+        )
+    return f"{sql} LIMIT :reportme_limit OFFSET :reportme_offset"
+
+
+def count_sql(sql, sgbd):
+    """Contagem exata das linhas da consulta"""
+    # Oracle não aceita AS antes do alias de tabela
+    alias = 'count_table' if sgbd == 'oracle' else 'AS count_table'
+    return f"SELECT COUNT(*) AS total FROM ({sql}) {alias}"
+
+
+def estimate_sql(sql, sgbd):
+    """Plano da consulta com a estimativa de linhas do otimizador"""
+    if sgbd == 'postgresql':
+        return f"EXPLAIN (FORMAT JSON) {sql}"
+    if sgbd == 'mysql':
+        return f"EXPLAIN FORMAT=TREE {sql}"
+    raise ValueError(f"Estimativa de linhas não suportada para {sgbd}")
+
+
+def parse_row_estimate(sgbd, plan):
+    """Extrair o número estimado de linhas do resultado de estimate_sql"""
+    if sgbd == 'postgresql':
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    if sgbd == 'mysql':
+        # Primeira linha do plano: "-> ... (cost=... rows=1234)"
+        match = re.search(r'rows=([\d.e+]+)', plan.splitlines()[0])
+        return int(float(match.group(1))) if match else None
+    return None
+
+
+def keyset_sql(sql, sgbd, key_columns, after=False):
+    """
+    Página por keyset: ordenar pelas colunas de key_columns e, com after,
+    continuar a partir da última chave (parâmetros :reportme_key_0, ...)
+
+    O predicado é escrito por extenso, (a > :k0) OR (a = :k0 AND b > :k1),
+    pois SQL Server e Oracle não comparam tuplas (a, b) > (x, y). Usa
+    :reportme_limit para o tamanho da página.
+    """
+    order = ', '.join(f"{column} {'DESC' if descending else 'ASC'}" for column, descending in key_columns)
+
+    where = ''
+    if after:
+        branches = []
+        for position, (column, descending) in enumerate(key_columns):
+            terms = [f"{previous} = :reportme_key_{index}" for index, (previous, _) in enumerate(key_columns[:position])]
+            terms.append(f"{column} {'<' if descending else '>'} :reportme_key_{position}")
+            branches.append('(' + ' AND '.join(terms) + ')')
+        where = ' WHERE ' + ' OR '.join(branches)
+
+    if sgbd == 'sqlserver':
+        return f"SELECT TOP (:reportme_limit) * FROM ({sql}) reportme_keyset{where} ORDER BY {order}"
+    if sgbd == 'oracle':
+        return f"SELECT * FROM (SELECT * FROM ({sql}) reportme_keyset{where} ORDER BY {order}) WHERE ROWNUM <= :reportme_limit"
+    return f"SELECT * FROM ({sql}) reportme_keyset{where} ORDER BY {order} LIMIT :reportme_limit"
+
+
+def partition_sql(sql, sgbd, column, lower=False, upper=False, include_nulls=False):
+    """
+    Uma partição da consulta: linhas com lower <= coluna < upper
+
+    Usa os parâmetros internos :reportme_lower e :reportme_upper; lower/upper
+    False deixam o intervalo aberto. include_nulls inclui as linhas com a
+    coluna nula (na primeira partição).
+    """
+    terms = []
+    if lower:
+        terms.append(f"{column} >= :reportme_lower")
+    if upper:
+        terms.append(f"{column} < :reportme_upper")
+    where = ' AND '.join(terms)
+    if include_nulls and where:
+        where = f"({where}) OR {column} IS NULL"
+    if not where:
+        return sql
+    return f"SELECT * FROM ({sql}) reportme_partition WHERE {where}"
+
+
+def bounds_sql(sql, sgbd, column):
+    """Menor e maior valor da coluna de particionamento"""
+    return f"SELECT MIN({column}), MAX({column}) FROM ({sql}) reportme_bounds"
@@ -0,0 +1,177 @@
+"""
+Download de arquivos de exportação já gravados em disco
+
+Os arquivos (exportações em segundo plano e artefatos) são enviados com
+ETag, Last-Modified, Content-Length e Accept-Ranges. Em GET, um download
+interrompido pode ser retomado com Range (apenas um intervalo por requisição),
+condicionado por If-Range ao mesmo arquivo; If-None-Match/If-Modified-Since
+retornam 304. Em POST (queries/export/) esses cabeçalhos são ignorados.
+
+Com EXPORT_SENDFILE o Django apenas autoriza o download e o servidor web
+envia o arquivo (e trata Range e ETag):
+- 'nginx': cabeçalho X-Accel-Redirect com EXPORT_SENDFILE_URL + caminho relativo
+  a EXPORT_SENDFILE_ROOT (location internal no nginx.conf)
+- 'apache': cabeçalho X-Sendfile com o caminho do arquivo (mod_xsendfile)
+Arquivos fora de EXPORT_SENDFILE_ROOT continuam sendo enviados pelo Django.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_etags, parse_http_date_safe, quote_etag
+
+DOWNLOAD_DEFAULTS = {
+    'EXPORT_SENDFILE': None,                    # None, 'nginx' ou 'apache'
+    'EXPORT_SENDFILE_ROOT': None,               # Padrão: EXPORT_DIR
+    'EXPORT_SENDFILE_URL': '/protected-exports/',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_download_setting(name):
+    """Obter configuração dos downloads (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get(name, DOWNLOAD_DEFAULTS[name])
+
+
+def file_etag(stat):
+    """ETag do arquivo (muda quando o arquivo é gerado novamente)"""
+    return quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+
+
+def parse_range(header, size):
+    """
+    Intervalo (início, fim inclusive) pedido em Range, ou None para enviar o
+    arquivo inteiro (sem Range, vários intervalos ou cabeçalho inválido)
+
+    Levanta ValueError se o intervalo não puder ser atendido (416).
+    """
+    match = _RANGE.match((header or '').strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # Últimos N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Intervalo vazio")
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise ValueError("Intervalo fora do arquivo")
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+
+def _range_applies(request, etag, last_modified):
+    """If-Range: o intervalo vale apenas se o arquivo não mudou"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        # Comparação forte: ETag fraca nunca corresponde
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags or f"W/{etag}" in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as download_file:
+        download_file.seek(start)
+        while length > 0:
+            data = download_file.read(min(CHUNK_SIZE, length))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+
+
+def _sendfile_response(path, filename, content_type):
+    """Resposta vazia para o servidor web enviar o arquivo, ou None se não aplicável"""
+    backend = get_download_setting('EXPORT_SENDFILE')
+    if not backend:
+        return None
+
+    if backend == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    elif backend == 'nginx':
+        root = get_download_setting('EXPORT_SENDFILE_ROOT')
+        if root is None:
+            from .export_jobs import get_export_dir
+            root = get_export_dir()
+        root = os.path.realpath(root)
+        real_path = os.path.realpath(path)
+        if os.path.commonpath([root, real_path]) != root:
+            return None
+        relative_path = os.path.relpath(real_path, root).replace(os.sep, '/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = get_download_setting('EXPORT_SENDFILE_URL').rstrip('/') + '/' + quote(relative_path)
+    else:
+        raise ValueError(f"EXPORT_SENDFILE inválido: {backend}")
+
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def file_download_response(request, path, filename, content_type):
+    """
+    Resposta de download de um arquivo em disco (200, 206, 304 ou 416)
+
+    Levanta OSError se o arquivo não existir.
+    """
+    stat = os.stat(path)
+    sendfile_response = _sendfile_response(path, filename, content_type)
+    if sendfile_response is not None:
+        return sendfile_response
+
+    size = stat.st_size
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    conditional = request.method in ('GET', 'HEAD')
+    if conditional and _not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size) if conditional else None
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+        if byte_range is not None and _range_applies(request, etag, last_modified):
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type)
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f"bytes {start}-{end}/{size}"
+            response['Content-Disposition'] = content_disposition_header(True, filename)
+        else:
+            response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,311 @@
+"""
+Exportações em segundo plano
+
+POST export-jobs/ cria um ExportJob (status pending) e o entrega ao backend de
+fila configurado em EXPORT_JOB_BACKEND. O worker executa run_export_job: lê a
+consulta em lotes, grava o arquivo em EXPORT_DIR e atualiza rows_written a
+cada lote (progresso). O arquivo fica disponível para download por
+EXPORT_FILE_TTL segundos após a conclusão. Um job em execução há mais de
+EXPORT_JOB_TIMEOUT segundos (worker encerrado no meio da exportação) é
+marcado como erro e seu arquivo temporário é removido.
+
+Backends disponíveis:
+- 'inline': executa na própria requisição (testes)
+- 'thread': pool de threads no próprio processo (desenvolvimento, máquinas sem Redis)
+- 'rq': fila Redis do django-rq, processada pelo serviço rqworker
+Outro backend pode ser informado pelo caminho da classe (ex.: 'app.jobs.CeleryBackend').
+"""
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from authentication.audit import log_user_action
+
+from .dialects import QueryTimeoutError, get_effective_timeout, limit_sql, prepare_query
+from .exporters import COMPRESSIONS, EXPORT_FORMATS, CompressedOutput, export_metadata
+from .models import ExportJob, QueryExecution
+from .partitioning import PartitionedQuery, is_partitioned
+from .streaming import StreamingQuery
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_JOB_DEFAULTS = {
+    'EXPORT_JOB_BACKEND': 'thread',     # inline, thread, rq ou caminho da classe
+    'EXPORT_JOB_THREADS': 2,            # Backend 'thread': exportações simultâneas
+    'EXPORT_JOB_QUEUE': 'default',      # Backend 'rq': fila (RQ_QUEUES)
+    'EXPORT_JOB_TIMEOUT': 3600,         # Tempo máximo do job (segundos); depois disso é marcado como erro
+    'EXPORT_DIR': None,                 # Padrão: <tmp>/reportme_exports
+    'EXPORT_FILE_TTL': 86400,           # Segundos em que o arquivo fica disponível
+    'EXPORT_PROGRESS_INTERVAL': 1.0,    # Segundos entre atualizações de rows_written
+    'MAX_EXPORT_ROWS': 100000,
+}
+
+
+def get_export_setting(name):
+    """Obter configuração das exportações (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get(name, EXPORT_JOB_DEFAULTS[name])
+
+
+def get_export_dir():
+    directory = get_export_setting('EXPORT_DIR') or os.path.join(tempfile.gettempdir(), 'reportme_exports')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class ExportJobBackend:
+    """Backend de fila: enqueue(job) entrega o job para execução por run_export_job"""
+
+    def enqueue(self, job):
+        raise NotImplementedError
+
+
+class InlineBackend(ExportJobBackend):
+    """Executa o job imediatamente, na própria requisição"""
+
+    def enqueue(self, job):
+        run_export_job(job.pk)
+
+
+class ThreadBackend(ExportJobBackend):
+    """Executa os jobs em um pool de threads do próprio processo"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=get_export_setting('EXPORT_JOB_THREADS'),
+            thread_name_prefix='reportme-export'
+        )
+
+    def enqueue(self, job):
+        # Após o commit, para que a thread encontre o job no banco
+        transaction.on_commit(lambda: self._executor.submit(self._run, job.pk))
+
+    def _run(self, job_id):
+        try:
+            run_export_job(job_id)
+        finally:
+            close_old_connections()
+
+
+class RQBackend(ExportJobBackend):
+    """Enfileira os jobs no Redis (django-rq); executados pelo serviço rqworker"""
+
+    def enqueue(self, job):
+        import django_rq
+
+        queue = django_rq.get_queue(get_export_setting('EXPORT_JOB_QUEUE'))
+        transaction.on_commit(lambda: queue.enqueue(
+            run_export_job, job.pk, job_timeout=get_export_setting('EXPORT_JOB_TIMEOUT')
+        ))
+
+
+EXPORT_JOB_BACKENDS = {
+    'inline': InlineBackend,
+    'thread': ThreadBackend,
+    'rq': RQBackend,
+}
+
+_backends = {}
+
+
+def get_backend():
+    """Instância do backend configurado (uma por processo)"""
+    name = get_export_setting('EXPORT_JOB_BACKEND')
+    if name not in _backends:
+        backend_class = EXPORT_JOB_BACKENDS.get(name) or import_string(name)
+        _backends[name] = backend_class()
+    return _backends[name]
+
+
+def submit_export_job(query, user, parameters, export_format, limit, compression=''):
+    """Criar o job e entregá-lo ao backend de fila"""
+    purge_expired_exports()
+
+    job = ExportJob.objects.create(
+        query=query,
+        user=user,
+        parameters=parameters,
+        format=export_format,
+        compression=compression,
+        limit=limit
+    )
+    get_backend().enqueue(job)
+    return job
+
+
+def export_file_extension(job):
+    """Extensão do arquivo gerado (ex.: xlsx, csv.gz)"""
+    extension = EXPORT_FORMATS[job.format].extension
+    if job.compression:
+        extension = f"{extension}.{COMPRESSIONS[job.compression][0]}"
+    return extension
+
+
+def export_content_type(job):
+    """Content-Type do arquivo gerado"""
+    if job.compression:
+        return COMPRESSIONS[job.compression][1]
+    return EXPORT_FORMATS[job.format].content_type
+
+
+class _ProgressStream:
+    """StreamingQuery que informa o total de linhas gravadas após cada lote"""
+
+    def __init__(self, stream, callback):
+        self._stream = stream
+        self._callback = callback
+        self.rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def batches(self):
+        for batch in self._stream.batches():
+            yield batch
+            self.rows += len(batch)
+            self._callback(self.rows)
+
+
+def run_export_job(job_id):
+    """
+    Executar um ExportJob pendente (chamado pelo worker)
+
+    O job é reservado com um UPDATE condicional, de forma que um job entregue
+    mais de uma vez é executado apenas uma.
+    """
+    claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        return
+
+    job = ExportJob.objects.select_related('query__connection', 'user').get(pk=job_id)
+    query = job.query
+    export_format = EXPORT_FORMATS[job.format]
+    path = os.path.join(get_export_dir(), f"{job.pk}.{export_file_extension(job)}")
+    temp_path = f"{path}.tmp"
+    start_time = time.time()
+    interval = get_export_setting('EXPORT_PROGRESS_INTERVAL')
+    last_update = [start_time]
+
+    def progress(rows):
+        now = time.time()
+        if now - last_update[0] >= interval:
+            ExportJob.objects.filter(pk=job.pk).update(rows_written=rows)
+            last_update[0] = now
+
+    def metadata(rows):
+        return export_metadata(query, job.user, rows, round((time.time() - start_time) * 1000, 2))
+
+    stream = None
+    try:
+        if is_partitioned(query):
+            source = PartitionedQuery(query, job.parameters, job.limit, timeout=get_effective_timeout(query))
+        else:
+            sql_query = limit_sql(query.query, query.connection.sgbd) if job.limit else query.query
+            sql_query, sql_params = prepare_query(
+                sql_query, query.connection.sgbd, {**job.parameters, 'reportme_limit': job.limit}
+            )
+            source = StreamingQuery(query.connection, sql_query, sql_params, timeout=get_effective_timeout(query))
+        stream = _ProgressStream(source.open(), progress)
+        with open(temp_path, 'wb') as output:
+            if job.compression:
+                compressed = CompressedOutput(output, job.compression)
+                export_format.write(stream, compressed, metadata=metadata)
+                compressed.close()
+            else:
+                export_format.write(stream, output, metadata=metadata)
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.error(f"Erro na exportação {job.pk}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        rows = stream.rows if stream else 0
+        ExportJob.objects.filter(pk=job.pk, status='running').update(
+            status='error', rows_written=rows, error_message=str(e), finished_at=timezone.now()
+        )
+        QueryExecution.objects.create(
+            query=query,
+            user=job.user,
+            status='timeout' if isinstance(e, QueryTimeoutError) else 'error',
+            execution_time=round(time.time() - start_time, 3),
+            rows_returned=rows,
+            error_message=str(e),
+            parameters=job.parameters
+        )
+        log_user_action(
+            user=job.user,
+            action='export_query',
+            details=f"Erro na exportação em segundo plano {job.pk} ({query.name}): {str(e)}"
+        )
+        return
+
+    # Condicional: o job pode ter sido encerrado por fail_stale_exports nesse meio tempo
+    finished = ExportJob.objects.filter(pk=job.pk, status='running').update(
+        status='success',
+        rows_written=stream.rows,
+        file_path=path,
+        file_size=os.path.getsize(path),
+        finished_at=timezone.now()
+    )
+    if not finished:
+        os.remove(path)
+        return
+    QueryExecution.objects.create(
+        query=query,
+        user=job.user,
+        status='success',
+        execution_time=round(time.time() - start_time, 3),
+        rows_returned=stream.rows,
+        parameters=job.parameters
+    )
+    log_user_action(
+        user=job.user,
+        action='export_query',
+        details=f"Exportada consulta em segundo plano: {query.name} ({export_file_extension(job)}) - {stream.rows} registros"
+    )
+
+
+def fail_stale_exports():
+    """
+    Marcar como erro os jobs em execução há mais de EXPORT_JOB_TIMEOUT segundos
+    (worker encerrado após reservar o job) e remover seus arquivos temporários
+    """
+    limit = timezone.now() - timedelta(seconds=get_export_setting('EXPORT_JOB_TIMEOUT'))
+    stale = ExportJob.objects.filter(status='running', started_at__lt=limit)
+    for job in stale.only('pk', 'format', 'compression'):
+        failed = ExportJob.objects.filter(pk=job.pk, status='running').update(
+            status='error',
+            error_message="Exportação interrompida: tempo máximo de execução excedido",
+            finished_at=timezone.now()
+        )
+        if not failed:
+            continue
+        logger.warning(f"Exportação {job.pk} em execução há mais de {get_export_setting('EXPORT_JOB_TIMEOUT')}s marcada como erro")
+        temp_path = os.path.join(get_export_dir(), f"{job.pk}.{export_file_extension(job)}.tmp")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def purge_expired_exports():
+    """
+    Remover os arquivos de exportações concluídas há mais de EXPORT_FILE_TTL
+    segundos e encerrar os jobs presos em execução (fail_stale_exports)
+    """
+    fail_stale_exports()
+    limit = timezone.now() - timedelta(seconds=get_export_setting('EXPORT_FILE_TTL'))
+    expired = ExportJob.objects.filter(status='success', finished_at__lt=limit)
+    for job in expired.only('pk', 'file_path'):
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+    expired.update(status='expired', file_path='')
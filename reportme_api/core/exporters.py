@@ -0,0 +1,573 @@
+"""
+Geração dos arquivos de exportação de resultados de consultas
+
+Os exportadores consomem um StreamingQuery aberto lote a lote, de forma que a
+memória usada não depende do tamanho da exportação.
+"""
+import csv
+import datetime
+import importlib.util
+import io
+import json
+import logging
+import zlib
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_DEFAULTS = {
+    'EXPORT_GZIP_LEVEL': 6,
+    'EXPORT_ZSTD_LEVEL': 3,
+    'PARQUET_COMPRESSION': 'zstd',        # zstd, snappy, gzip, lz4, brotli ou none
+    'PARQUET_ROW_GROUP_SIZE': 65536,      # Linhas por row group
+    'CSV_COPY_EXPORT': True,              # CSV do PostgreSQL gerado pelo COPY
+    'NDJSON_MAX_ROWS': 1000000,           # Limite de linhas de execute/export em NDJSON
+}
+
+# SGBDs em que o CSV é gerado pelo próprio servidor (CopyCSVQuery)
+COPY_CSV_SGBDS = ('postgresql',)
+
+
+def get_export_format_setting(name):
+    """Obter configuração dos formatos de exportação (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get(name, EXPORT_DEFAULTS[name])
+
+
+def stream_csv(stream, on_complete=None, delimiter=','):
+    """
+    Gerar o CSV em partes: o cabeçalho assim que a consulta é executada e
+    depois um bloco de texto por lote lido do cursor
+
+    on_complete(rows, error) é chamado ao término. Um erro no meio da leitura
+    interrompe o download (o cliente recebe um arquivo incompleto, e não um
+    CSV aparentemente válido).
+    """
+    rows_sent = 0
+    error = None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    try:
+        writer.writerow(stream.columns)
+        yield flush()
+
+        for batch in stream.batches():
+            writer.writerows(batch)
+            rows_sent += len(batch)
+            yield flush()
+    except Exception as e:
+        error = e
+        logger.error(f"Erro durante exportação CSV: {e}")
+        raise
+    finally:
+        stream.close()
+        if on_complete:
+            on_complete(rows_sent, error)
+
+
+def use_copy_csv(connection):
+    """CSV da conexão gerado pelo COPY do servidor (CSV_COPY_EXPORT)"""
+    return connection.sgbd in COPY_CSV_SGBDS and bool(get_export_format_setting('CSV_COPY_EXPORT'))
+
+
+def stream_copy_csv(stream, on_complete=None):
+    """
+    Repassar as partes do CSV gerado pelo COPY (CopyCSVQuery aberto)
+
+    Mesmo contrato de stream_csv: on_complete(rows, error) ao término e o
+    erro no meio do envio interrompe o download.
+    """
+    error = None
+    try:
+        yield from stream.chunks()
+    except Exception as e:
+        error = e
+        logger.error(f"Erro durante exportação CSV (COPY): {e}")
+        raise
+    finally:
+        stream.close()
+        if on_complete:
+            on_complete(stream.rows_read, error)
+
+
+def write_csv(stream, output, metadata=None, on_complete=None):
+    """Gravar o CSV em um arquivo binário (UTF-8), lote a lote"""
+    for chunk in stream_csv(stream, on_complete=on_complete):
+        output.write(chunk.encode('utf-8'))
+
+
+def stream_ndjson(stream, on_complete=None):
+    """
+    Gerar NDJSON (JSON Lines): um objeto {coluna: valor} por linha, enviado
+    em um bloco por lote lido do cursor
+
+    Mesmo contrato de stream_csv: on_complete(rows, error) ao término e um
+    erro no meio da leitura interrompe o envio (a última linha fica incompleta
+    ou ausente, e não há um objeto de erro misturado às linhas).
+    """
+    rows_sent = 0
+    error = None
+    encode = JSONEncoder(ensure_ascii=False).encode
+    columns = list(stream.columns)
+
+    try:
+        for batch in stream.batches():
+            yield ''.join(encode(dict(zip(columns, row))) + '\n' for row in batch).encode('utf-8')
+            rows_sent += len(batch)
+    except Exception as e:
+        error = e
+        logger.error(f"Erro durante exportação NDJSON: {e}")
+        raise
+    finally:
+        stream.close()
+        if on_complete:
+            on_complete(rows_sent, error)
+
+
+def write_ndjson(stream, output, metadata=None, on_complete=None):
+    """Gravar NDJSON em um arquivo binário (UTF-8), lote a lote"""
+    for chunk in stream_ndjson(stream, on_complete=on_complete):
+        output.write(chunk)
+
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def excel_value(value):
+    """Converter valores que o openpyxl não aceita diretamente"""
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub('', value)
+    if isinstance(value, (datetime.datetime, datetime.time)) and value.tzinfo is not None:
+        # Excel não suporta fuso horário: datas no fuso do servidor
+        if isinstance(value, datetime.datetime):
+            value = timezone.localtime(value)
+        return value.replace(tzinfo=None)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return ILLEGAL_CHARACTERS_RE.sub('', bytes(value).decode('utf-8', errors='replace'))
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+    return value
+
+
+def write_xlsx(stream, output, metadata=None, on_complete=None):
+    """
+    Gravar o resultado em XLSX (aba "Dados" e, opcionalmente, "Metadados")
+
+    Usa o modo write-only do openpyxl: as linhas são gravadas lote a lote e não
+    ficam em memória. metadata(rows) retorna os pares (campo, valor) da aba
+    "Metadados", calculados depois da leitura. O arquivo é salvo em output (um
+    arquivo temporário, normalmente). Retorna o número de linhas gravadas.
+    """
+    rows_written = 0
+    error = None
+    workbook = Workbook(write_only=True)
+
+    try:
+        data_sheet = workbook.create_sheet('Dados')
+        data_sheet.append(list(stream.columns))
+
+        for batch in stream.batches():
+            for row in batch:
+                data_sheet.append([excel_value(value) for value in row])
+            rows_written += len(batch)
+
+        if metadata:
+            metadata_sheet = workbook.create_sheet('Metadados')
+            metadata_sheet.append(['Campo', 'Valor'])
+            for field, value in metadata(rows_written):
+                metadata_sheet.append([field, excel_value(value)])
+
+        workbook.save(output)
+    except Exception as e:
+        error = e
+        logger.error(f"Erro durante exportação XLSX: {e}")
+        raise
+    finally:
+        stream.close()
+        if on_complete:
+            on_complete(rows_written, error)
+
+    return rows_written
+
+
+# Compressão em streaming (gzip / zstd) dos formatos de texto
+
+COMPRESSIBLE_FORMATS = {'csv', 'ndjson'}
+
+# Extensão acrescentada ao arquivo e Content-Type do arquivo comprimido
+COMPRESSIONS = {
+    'gzip': ('gz', 'application/gzip'),
+    'zstd': ('zst', 'application/zstd'),
+}
+
+
+class _GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, sync=False):
+        compressed = self._compressor.compress(data)
+        if sync:
+            compressed += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return compressed
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class _ZstdCompressor:
+    def __init__(self, level):
+        zstandard = _import_zstandard()
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data, sync=False):
+        compressed = self._compressor.compress(data)
+        if sync:
+            compressed += self._compressor.flush(self._flush_block)
+        return compressed
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise Exception("Compressão zstd requer zstandard. Execute: pip install zstandard")
+
+
+def get_compressor(compression):
+    """Compressor incremental: compress(data, sync=False) e flush() ao final"""
+    if compression == 'gzip':
+        return _GzipCompressor(get_export_format_setting('EXPORT_GZIP_LEVEL'))
+    if compression == 'zstd':
+        return _ZstdCompressor(get_export_format_setting('EXPORT_ZSTD_LEVEL'))
+    raise Exception(f"Compressão não suportada: {compression}")
+
+
+def check_compression(compression):
+    """Levantar erro se a compressão não é suportada ou depende de pacote não instalado"""
+    if compression not in COMPRESSIONS:
+        raise Exception(f"Compressão não suportada: {compression}")
+    if compression == 'zstd' and importlib.util.find_spec('zstandard') is None:
+        raise Exception("Compressão zstd indisponível: o pacote zstandard não está instalado")
+
+
+def negotiate_compression(accept_encoding):
+    """
+    Compressão a partir do cabeçalho Accept-Encoding (zstd preferido quando
+    disponível) ou None
+    """
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+
+    if 'zstd' in accepted and importlib.util.find_spec('zstandard') is not None:
+        return 'zstd'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress_chunks(chunks, compression):
+    """
+    Comprimir as partes geradas por um exportador (ex.: stream_csv), uma a uma
+
+    Cada parte é descarregada ao final (sync flush), para que o cliente receba
+    os dados à medida que o cursor é lido.
+    """
+    compressor = get_compressor(compression)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            compressed = compressor.compress(chunk, sync=True)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    finally:
+        # Encerrar o exportador (e devolver a conexão) se o download for interrompido
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+
+class CompressedOutput:
+    """Arquivo que comprime o que é gravado; close() grava o final do stream comprimido"""
+
+    def __init__(self, output, compression):
+        self.output = output
+        self.compressor = get_compressor(compression)
+
+    def write(self, data):
+        self.output.write(self.compressor.compress(data))
+
+    def close(self):
+        self.output.write(self.compressor.flush())
+
+
+# Exportação colunar (Parquet / Arrow IPC) - requer pyarrow (opcional)
+
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise Exception("Exportação Parquet/Arrow requer pyarrow. Execute: pip install pyarrow")
+
+
+# OID do PostgreSQL para timestamp with time zone
+_POSTGRESQL_TIMESTAMPTZ = 1184
+
+
+def _arrow_type(pa, type_name, column, sgbd):
+    """Tipo Arrow a partir do tipo lógico da coluna (cursor.description)"""
+    if type_name == 'integer':
+        return pa.int64()
+    if type_name == 'number':
+        return pa.float64()
+    if type_name == 'decimal':
+        # Precisão e escala do description; sem escala conhecida, float64
+        precision = column[4] if len(column) > 4 else None
+        scale = column[5] if len(column) > 5 else None
+        if isinstance(precision, int) and isinstance(scale, int) and 0 < precision <= 38 and 0 <= scale <= precision:
+            return pa.decimal128(precision, scale)
+        return pa.float64()
+    if type_name == 'boolean':
+        return pa.bool_()
+    if type_name == 'date':
+        return pa.date32()
+    if type_name == 'datetime':
+        # Com fuso apenas quando o tipo da coluna o declara (timestamptz)
+        aware = sgbd == 'postgresql' and len(column) > 1 and column[1] == _POSTGRESQL_TIMESTAMPTZ
+        return pa.timestamp('us', tz='UTC' if aware else None)
+    if type_name == 'time':
+        return pa.time64('us')
+    if type_name == 'binary':
+        return pa.binary()
+    return pa.string()
+
+
+def _aware_datetime(value):
+    return value.replace(tzinfo=datetime.timezone.utc) if value.tzinfo is None else value
+
+
+def _naive_datetime(value):
+    return value if value.tzinfo is None else value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _arrow_value(pa, type_name, arrow_type):
+    """Conversão dos valores que o Arrow não aceita diretamente no tipo da coluna"""
+    if type_name == 'integer':
+        return lambda value: value if isinstance(value, int) else int(value)
+    if type_name == 'number':
+        return float
+    if type_name == 'decimal':
+        if pa.types.is_floating(arrow_type):
+            return float
+        return lambda value: value if isinstance(value, Decimal) else Decimal(str(value))
+    if type_name == 'datetime':
+        # Naive em colunas com fuso é tratado como UTC; aware em colunas sem fuso vira UTC naive
+        return _aware_datetime if arrow_type.tz else _naive_datetime
+    if type_name == 'time':
+        return lambda value: value.replace(tzinfo=None)
+    if type_name == 'binary':
+        return bytes
+    if type_name == 'json':
+        return lambda value: value if isinstance(value, str) else json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+    if type_name == 'string':
+        return str
+    return None
+
+
+class _ArrowBatches:
+    """
+    Converter os lotes de linhas do cursor em RecordBatches com schema fixo
+
+    O schema vem dos tipos das colunas (describe_columns sobre
+    cursor.description, como no formato colunar), e não dos valores do
+    primeiro lote. Valores que não se encaixam no tipo em um lote posterior
+    (ex.: escala decimal maior que a declarada) são convertidos com cast.
+    """
+
+    def __init__(self, pa, stream):
+        self.pa = pa
+        self.stream = stream
+        self.converters = []
+        self.schema = self._build_schema()
+
+    def _build_schema(self):
+        pa = self.pa
+        description = self.stream.description or [(name,) for name in self.stream.columns]
+        connection = getattr(self.stream, 'connection', None)
+        sgbd = getattr(connection, 'sgbd', None)
+        fields = []
+        for index, (name, type_name) in enumerate(zip(self.stream.columns, self.stream.column_types)):
+            arrow_type = _arrow_type(pa, type_name, description[index], sgbd)
+            fields.append(pa.field(name, arrow_type))
+            self.converters.append(_arrow_value(pa, type_name, arrow_type))
+        return pa.schema(fields)
+
+    def _array(self, values, field):
+        try:
+            return self.pa.array(values, type=field.type)
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError, self.pa.ArrowNotImplementedError):
+            logger.warning(f"Coluna '{field.name}' convertida para {field.type} com cast")
+            return self.pa.array(values).cast(field.type, safe=False)
+
+    def record_batch(self, batch):
+        arrays = []
+        for index, field in enumerate(self.schema):
+            converter = self.converters[index]
+            values = [row[index] for row in batch]
+            if converter is not None:
+                values = [None if value is None else converter(value) for value in values]
+            arrays.append(self._array(values, field))
+        return self.pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def __iter__(self):
+        for batch in self.stream.batches():
+            yield self.record_batch(batch), len(batch)
+
+    def empty_schema(self):
+        """Schema para resultados sem linhas"""
+        return self.schema
+
+
+def _write_arrow(stream, on_complete, write):
+    rows_written = 0
+    error = None
+    try:
+        pa = _import_pyarrow()
+        rows_written = write(pa, _ArrowBatches(pa, stream))
+    except Exception as e:
+        error = e
+        logger.error(f"Erro durante exportação colunar: {e}")
+        raise
+    finally:
+        stream.close()
+        if on_complete:
+            on_complete(rows_written, error)
+    return rows_written
+
+
+def write_parquet(stream, output, metadata=None, on_complete=None):
+    """
+    Gravar Parquet (compressão PARQUET_COMPRESSION), um row group a cada
+    PARQUET_ROW_GROUP_SIZE linhas lidas do cursor
+    """
+    compression = get_export_format_setting('PARQUET_COMPRESSION')
+    row_group_size = get_export_format_setting('PARQUET_ROW_GROUP_SIZE')
+
+    def write(pa, batches):
+        rows_written = 0
+        pending = []
+        pending_rows = 0
+        writer = None
+        try:
+            for record_batch, rows in batches:
+                if writer is None:
+                    writer = pa.parquet.ParquetWriter(output, batches.schema, compression=compression)
+                pending.append(record_batch)
+                pending_rows += rows
+                rows_written += rows
+                if pending_rows >= row_group_size:
+                    writer.write_table(pa.Table.from_batches(pending))
+                    pending, pending_rows = [], 0
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(output, batches.empty_schema(), compression=compression)
+            if pending:
+                writer.write_table(pa.Table.from_batches(pending))
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows_written
+
+    return _write_arrow(stream, on_complete, write)
+
+
+def write_arrow_stream(stream, output, metadata=None, on_complete=None):
+    """Gravar Arrow IPC (formato stream), um RecordBatch por lote do cursor"""
+
+    def write(pa, batches):
+        rows_written = 0
+        writer = None
+        try:
+            for record_batch, rows in batches:
+                if writer is None:
+                    writer = pa.ipc.new_stream(output, batches.schema)
+                writer.write_batch(record_batch)
+                rows_written += rows
+            if writer is None:
+                writer = pa.ipc.new_stream(output, batches.empty_schema())
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows_written
+
+    return _write_arrow(stream, on_complete, write)
+
+
+def export_metadata(query, user, rows, execution_time_ms):
+    """Pares (campo, valor) da aba "Metadados" """
+    return [
+        ['Consulta', query.name],
+        ['Executado em', timezone.now().strftime('%d/%m/%Y %H:%M:%S')],
+        ['Usuário', user.get_full_name()],
+        ['Registros', rows],
+        ['Tempo de execução', f"{execution_time_ms}ms"]
+    ]
+
+
+# Formatos de exportação: extensão do arquivo, Content-Type, função de gravação
+# write(stream, output, metadata=None, on_complete=None) e módulo opcional exigido
+ExportFormat = namedtuple('ExportFormat', ['extension', 'content_type', 'write', 'requires'])
+
+EXPORT_FORMATS = {
+    'csv': ExportFormat('csv', CSV_CONTENT_TYPE, write_csv, None),
+    'ndjson': ExportFormat('ndjson', NDJSON_CONTENT_TYPE, write_ndjson, None),
+    'excel': ExportFormat('xlsx', XLSX_CONTENT_TYPE, write_xlsx, None),
+    'parquet': ExportFormat('parquet', PARQUET_CONTENT_TYPE, write_parquet, 'pyarrow'),
+    'arrow': ExportFormat('arrows', ARROW_CONTENT_TYPE, write_arrow_stream, 'pyarrow'),
+}
+
+
+def check_export_format(name):
+    """Levantar erro se o formato depende de um pacote não instalado"""
+    required = EXPORT_FORMATS[name].requires
+    if required and importlib.util.find_spec(required) is None:
+        raise Exception(f"Formato {name} indisponível: o pacote {required} não está instalado")
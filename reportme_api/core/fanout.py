@@ -0,0 +1,152 @@
+"""
+Exportação em vários formatos a partir de uma única execução da consulta
+
+fan_out lê os lotes do cursor uma vez e os repassa a um gravador por formato
+(EXPORT_FORMATS[...].write), cada um em sua thread e com sua fila limitada:
+CSV, XLSX e Parquet são gerados simultaneamente, sem executar o SQL de novo e
+sem materializar o resultado. A leitura avança no ritmo do gravador mais
+lento (FANOUT_QUEUE_SIZE lotes de folga por formato).
+
+Um erro na leitura ou em qualquer gravador interrompe todos os formatos.
+"""
+import logging
+import queue
+import threading
+
+from .exporters import EXPORT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+
+# Lotes aguardando em cada gravador antes de a leitura esperar
+FANOUT_QUEUE_SIZE = 4
+
+# Intervalo (segundos) para verificar falhas enquanto uma fila está cheia
+_PUT_INTERVAL = 0.1
+
+_END = object()
+_ABORT = object()
+
+
+class FanOutAborted(Exception):
+    """A exportação foi interrompida por erro em outro formato ou na leitura"""
+
+
+class _Branch:
+    """
+    StreamingQuery vista por um gravador: mesmas colunas, lotes recebidos da
+    fila. close() não fecha a consulta, que é fechada por fan_out.
+    """
+
+    def __init__(self, stream, export_format, output):
+        self._stream = stream
+        self.format = export_format
+        self.output = output
+        self.queue = queue.Queue(maxsize=FANOUT_QUEUE_SIZE)
+        self.error = None
+        self.thread = None
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def batches(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _END:
+                return
+            if batch is _ABORT:
+                raise FanOutAborted("Exportação interrompida")
+            yield batch
+
+    def close(self):
+        pass
+
+    def run(self, metadata):
+        try:
+            EXPORT_FORMATS[self.format].write(self, self.output, metadata=metadata)
+        except BaseException as e:
+            self.error = e
+
+    def put(self, item, failed):
+        """Entregar um lote; retorna False se a exportação falhou enquanto esperava"""
+        while True:
+            try:
+                self.queue.put(item, timeout=_PUT_INTERVAL)
+                return True
+            except queue.Full:
+                if failed():
+                    return False
+
+    def abort(self):
+        """Descartar os lotes pendentes e avisar o gravador"""
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.queue.put(_ABORT)
+
+
+def fan_out(stream, targets, metadata=None, on_complete=None):
+    """
+    Gravar o resultado de stream em vários formatos ao mesmo tempo
+
+    targets: pares (formato, arquivo binário de saída), ex.: [('csv', f1), ('excel', f2)]
+    metadata(rows): pares (campo, valor) da aba "Metadados" (Excel)
+    on_complete(rows, error): chamado uma vez ao término, como em stream_csv
+
+    Retorna o número de linhas lidas. Levanta o erro da leitura ou do primeiro
+    gravador que falhar; as saídas ficam incompletas e devem ser descartadas.
+    """
+    branches = [_Branch(stream, export_format, output) for export_format, output in targets]
+    rows_read = 0
+    error = None
+
+    def failed():
+        return any(branch.error is not None for branch in branches)
+
+    for branch in branches:
+        branch.thread = threading.Thread(
+            target=branch.run, args=(metadata,), name=f'reportme-fanout-{branch.format}', daemon=True
+        )
+        branch.thread.start()
+
+    try:
+        for batch in stream.batches():
+            for branch in branches:
+                if not branch.put(batch, failed):
+                    raise _first_error(branches)
+            rows_read += len(batch)
+        for branch in branches:
+            if not branch.put(_END, failed):
+                raise _first_error(branches)
+        for branch in branches:
+            branch.thread.join()
+        branch_error = _first_error(branches, required=False)
+        if branch_error is not None:
+            raise branch_error
+    except BaseException as e:
+        error = e
+        logger.error(f"Erro durante exportação em vários formatos: {e}")
+        for branch in branches:
+            if branch.thread.is_alive():
+                branch.abort()
+        for branch in branches:
+            branch.thread.join()
+        raise
+    finally:
+        stream.close()
+        if on_complete:
+            on_complete(rows_read, error)
+
+    return rows_read
+
+
+def _first_error(branches, required=True):
+    """Erro do primeiro gravador que falhou (ou None, se required=False e nenhum falhou)"""
+    for branch in branches:
+        if branch.error is not None:
+            return branch.error
+    if required:
+        return FanOutAborted("Exportação interrompida")
+    return None
@@ -0,0 +1,110 @@
+"""
+Paginação por keyset (seek) em execute-paginated
+
+Em vez de OFFSET, cada página continua a partir da chave de ordenação da última
+linha da página anterior (WHERE chave > última chave ORDER BY chave), de forma
+que o custo de avançar uma página não depende da profundidade.
+
+A chave vai para o cliente como um cursor opaco, assinado com SECRET_KEY e
+vinculado à consulta, às colunas de ordenação e aos parâmetros.
+"""
+import datetime
+import hashlib
+import re
+from decimal import Decimal
+
+from django.core import signing
+
+from .result_cache import canonicalize_parameters
+
+CURSOR_SALT = 'core.keyset'
+
+# Colunas de ordenação: nome simples, com '-' para ordem decrescente
+_KEY_COLUMN = re.compile(r'^-?[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class InvalidCursorError(ValueError):
+    """Cursor de continuação inválido ou de outra consulta"""
+
+
+def parse_order_by(order_by):
+    """
+    Validar as colunas de ordenação (['vendedor', '-id'])
+
+    A combinação precisa ser única e não nula no resultado (normalmente a
+    última coluna é a chave primária). Retorna [(coluna, descendente), ...].
+    """
+    if isinstance(order_by, str):
+        order_by = [column.strip() for column in order_by.split(',')]
+    if not order_by:
+        raise ValueError("Paginação keyset exige order_by com as colunas de ordenação")
+
+    key_columns = []
+    for column in order_by:
+        if not isinstance(column, str) or not _KEY_COLUMN.match(column):
+            raise ValueError(f"Coluna de ordenação inválida: {column}")
+        key_columns.append((column.lstrip('-'), column.startswith('-')))
+    return key_columns
+
+
+def key_column_indexes(columns, key_columns):
+    """Posição de cada coluna de ordenação no resultado (sem diferenciar maiúsculas)"""
+    lookup = {column.lower(): index for index, column in enumerate(columns)}
+    try:
+        return [lookup[name.lower()] for name, _ in key_columns]
+    except KeyError as e:
+        raise ValueError(f"Coluna de ordenação não encontrada no resultado: {e.args[0]}")
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'date': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'time': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'decimal': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        kind, raw = next(iter(value.items()))
+        if kind == 'datetime':
+            return datetime.datetime.fromisoformat(raw)
+        if kind == 'date':
+            return datetime.date.fromisoformat(raw)
+        if kind == 'time':
+            return datetime.time.fromisoformat(raw)
+        if kind == 'decimal':
+            return Decimal(raw)
+        raise InvalidCursorError("Cursor inválido")
+    return value
+
+
+def _fingerprint(query, key_columns, parameters):
+    raw = f"{query.pk}|{key_columns}|{canonicalize_parameters(parameters)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(query, key_columns, parameters, key_values):
+    """Gerar o cursor de continuação a partir da chave da última linha"""
+    if any(value is None for value in key_values):
+        raise ValueError("Colunas de ordenação da paginação keyset não podem ser nulas")
+    return signing.dumps({
+        'f': _fingerprint(query, key_columns, parameters),
+        'k': [_encode_value(value) for value in key_values],
+    }, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, query, key_columns, parameters):
+    """Obter a chave da última linha da página anterior"""
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursorError("Cursor inválido")
+
+    if data.get('f') != _fingerprint(query, key_columns, parameters) or len(data.get('k', [])) != len(key_columns):
+        raise InvalidCursorError("Cursor não corresponde à consulta, ordenação ou parâmetros informados")
+    return [_decode_value(value) for value in data['k']]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_remove_query_parameters_parameter_query_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queryexecution',
+            name='cache_hit',
+            field=models.BooleanField(default=False, verbose_name='Resultado do Cache'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_queryexecution_cache_hit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameters', models.JSONField(default=dict, verbose_name='Parâmetros Utilizados')),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('excel', 'Excel')], default='excel', max_length=20, verbose_name='Formato')),
+                ('limit', models.IntegerField(blank=True, null=True, verbose_name='Limite de Registros')),
+                ('status', models.CharField(choices=[('pending', 'Na fila'), ('running', 'Em execução'), ('success', 'Concluída'), ('error', 'Erro'), ('expired', 'Expirada')], default='pending', max_length=20)),
+                ('rows_written', models.IntegerField(default=0, verbose_name='Linhas Gravadas')),
+                ('file_path', models.CharField(blank=True, max_length=500, verbose_name='Arquivo')),
+                ('file_size', models.BigIntegerField(blank=True, null=True, verbose_name='Tamanho (bytes)')),
+                ('error_message', models.TextField(blank=True, verbose_name='Mensagem de Erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('query', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='core.query')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Exportação',
+                'verbose_name_plural': 'Exportações',
+                'db_table': 'core_export_job',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
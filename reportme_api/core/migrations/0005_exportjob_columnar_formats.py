@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='format',
+            field=models.CharField(choices=[('csv', 'CSV'), ('excel', 'Excel'), ('parquet', 'Parquet'), ('arrow', 'Arrow IPC')], default='excel', max_length=20, verbose_name='Formato'),
+        ),
+    ]
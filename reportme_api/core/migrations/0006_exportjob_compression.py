@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_exportjob_columnar_formats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='compression',
+            field=models.CharField(blank=True, choices=[('gzip', 'gzip'), ('zstd', 'zstd')], max_length=10, verbose_name='Compressão'),
+        ),
+    ]
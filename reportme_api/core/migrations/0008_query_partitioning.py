@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_exportjob_ndjson_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='query',
+            name='partition_bounds',
+            field=models.JSONField(blank=True, default=list, verbose_name='Limites das partições (vazio = MIN/MAX)'),
+        ),
+        migrations.AddField(
+            model_name='query',
+            name='partition_column',
+            field=models.CharField(blank=True, default='', max_length=128, verbose_name='Coluna de particionamento'),
+        ),
+        migrations.AddField(
+            model_name='query',
+            name='partition_count',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Partições (0 = sem particionamento)'),
+        ),
+    ]
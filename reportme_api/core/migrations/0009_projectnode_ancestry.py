@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:17
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_ancestry(apps, schema_editor):
+    """Preencher ancestry/depth das árvores existentes (um projeto por vez)"""
+    ProjectNode = apps.get_model('core', 'ProjectNode')
+    project_ids = ProjectNode.objects.values_list('project_id', flat=True).distinct()
+    for project_id in project_ids:
+        nodes = list(ProjectNode.objects.filter(project_id=project_id).only('id', 'parent_id'))
+        children = defaultdict(list)
+        for node in nodes:
+            children[node.parent_id].append(node)
+        
+        # Nós cujo pai está em outro projeto também são tratados como raízes
+        ids = {node.id for node in nodes}
+        stack = [(node, '') for node in nodes if node.parent_id is None or node.parent_id not in ids]
+        updated = []
+        while stack:
+            node, parent_ancestry = stack.pop()
+            node.ancestry = f"{parent_ancestry}{node.id}/"
+            node.depth = node.ancestry.count('/') - 1
+            updated.append(node)
+            stack.extend((child, node.ancestry) for child in children[node.id])
+        ProjectNode.objects.bulk_update(updated, ['ancestry', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_query_partitioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectnode',
+            name='ancestry',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='projectnode',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ancestry, migrations.RunPython.noop),
+    ]
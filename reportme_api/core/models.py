@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 import json
@@ -115,6 +117,11 @@ class Query(models.Model):
     timeout = models.IntegerField(default=30, verbose_name="Timeout (segundos)")
     cache_duration = models.IntegerField(default=0, verbose_name="Cache (segundos, 0 = sem cache)")
     
+    # Execução particionada (extrações grandes): intervalos da coluna lidos em paralelo
+    partition_column = models.CharField(max_length=128, blank=True, default='', verbose_name="Coluna de particionamento")
+    partition_count = models.PositiveSmallIntegerField(default=0, verbose_name="Partições (0 = sem particionamento)")
+    partition_bounds = models.JSONField(default=list, blank=True, verbose_name="Limites das partições (vazio = MIN/MAX)")
+    
     # Auditoria
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_queries')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -316,6 +323,11 @@ class ProjectNode(models.Model):
     icon = models.CharField(max_length=50, blank=True, verbose_name="Ícone")
     description = models.TextField(blank=True, verbose_name="Descrição")
     
+    # Índice de ancestrais (caminho materializado), mantido em save():
+    # ids da raiz até o próprio nó, cada um seguido de '/' (ex.: "1/5/12/")
+    ancestry = models.CharField(max_length=500, blank=True, default='', db_index=True, editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    
     # Auditoria
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -331,19 +343,52 @@ class ProjectNode(models.Model):
     def __str__(self):
         return f"{self.project.name} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        """
+        Salvar e manter o índice de ancestrais (ancestry/depth)
+        
+        Um nó novo ou movido recebe o caminho do pai; os descendentes de um
+        nó movido são atualizados em um único UPDATE.
+        """
+        super().save(*args, **kwargs)
+        
+        parent_ancestry = ''
+        if self.parent_id:
+            parent_ancestry = ProjectNode.objects.filter(pk=self.parent_id).values_list('ancestry', flat=True).first() or ''
+        ancestry = f"{parent_ancestry}{self.pk}/"
+        if ancestry == self.ancestry:
+            return
+        
+        old_ancestry, old_depth = self.ancestry, self.depth
+        self.ancestry = ancestry
+        self.depth = ancestry.count('/') - 1
+        ProjectNode.objects.filter(pk=self.pk).update(ancestry=self.ancestry, depth=self.depth)
+        if old_ancestry:
+            ProjectNode.objects.filter(ancestry__startswith=old_ancestry).exclude(pk=self.pk).update(
+                ancestry=Concat(
+                    Value(self.ancestry), Substr('ancestry', len(old_ancestry) + 1), output_field=models.CharField()
+                ),
+                depth=F('depth') + (self.depth - old_depth)
+            )
+
+    @property
+    def ancestor_ids(self):
+        """Ids dos ancestrais, da raiz até o pai"""
+        return [int(node_id) for node_id in self.ancestry.split('/')[:-2]]
+
     @property
     def level(self):
         """Retorna o nível do nó na árvore"""
-        if not self.parent:
-            return 0
-        return self.parent.level + 1
+        return self.depth
 
     @property
     def path(self):
         """Retorna o caminho completo do nó"""
-        if not self.parent:
-            return [self.name]
-        return self.parent.path + [self.name]
+        return [node.name for node in self.get_ancestors()] + [self.name]
+
+    def get_ancestors(self):
+        """Ancestrais do nó, da raiz até o pai (uma consulta)"""
+        return list(ProjectNode.objects.filter(pk__in=self.ancestor_ids).order_by('depth'))
 
     @property
     def has_query(self):
@@ -361,34 +406,31 @@ class ProjectNode(models.Model):
         if self.query and not self.is_leaf:
             raise ValidationError("Somente nós folha podem ter consulta associada.")
         
-        # Evitar referência circular
-        if self.parent:
-            current = self.parent
-            while current:
-                if current == self:
-                    raise ValidationError("Referência circular detectada.")
-                current = current.parent
+        # Evitar referência circular: o pai não pode estar na subárvore do nó
+        if self.parent_id and self.pk:
+            parent_ancestry = ProjectNode.objects.filter(pk=self.parent_id).values_list('ancestry', flat=True).first()
+            if self.parent_id == self.pk or (
+                    parent_ancestry and self.ancestry and parent_ancestry.startswith(self.ancestry)):
+                raise ValidationError("Referência circular detectada.")
 
     def get_descendants(self):
-        """Retorna todos os descendentes do nó"""
-        descendants = []
-        for child in self.children.all():
-            descendants.append(child)
-            descendants.extend(child.get_descendants())
-        return descendants
+        """
+        Retorna todos os descendentes do nó (QuerySet, por nível e na ordem
+        da árvore), pelo prefixo do índice de ancestrais
+        """
+        if not self.ancestry:
+            return ProjectNode.objects.none()
+        return ProjectNode.objects.filter(
+            ancestry__startswith=self.ancestry
+        ).exclude(pk=self.pk).order_by('depth', 'order', 'name')
     
     def get_descendants_count(self):
         """Retorna o número total de descendentes"""
-        return len(self.get_descendants())
+        return self.get_descendants().count()
     
     def is_descendant_of(self, node):
         """Verifica se este nó é descendente do nó especificado"""
-        current = self.parent
-        while current:
-            if current == node:
-                return True
-            current = current.parent
-        return False
+        return node.pk in self.ancestor_ids
 
 
 class QueryExecution(models.Model):
@@ -409,6 +451,7 @@ class QueryExecution(models.Model):
     execution_time = models.FloatField(null=True, blank=True, verbose_name="Tempo de Execução (segundos)")
     rows_returned = models.IntegerField(null=True, blank=True, verbose_name="Linhas Retornadas")
     error_message = models.TextField(blank=True, verbose_name="Mensagem de Erro")
+    cache_hit = models.BooleanField(default=False, verbose_name="Resultado do Cache")
     
     # Auditoria
     executed_at = models.DateTimeField(auto_now_add=True)
@@ -421,3 +464,55 @@ class QueryExecution(models.Model):
 
     def __str__(self):
         return f"{self.query.name} - {self.executed_at} ({self.status})"
+
+
+class ExportJob(models.Model):
+    """
+    Exportação executada em segundo plano (ver core/export_jobs.py)
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('running', 'Em execução'),
+        ('success', 'Concluída'),
+        ('error', 'Erro'),
+        ('expired', 'Expirada'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+        ('excel', 'Excel'),
+        ('parquet', 'Parquet'),
+        ('arrow', 'Arrow IPC'),
+    ]
+    
+    query = models.ForeignKey(Query, on_delete=models.CASCADE, related_name='export_jobs')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    parameters = models.JSONField(default=dict, verbose_name="Parâmetros Utilizados")
+    format = models.CharField(max_length=20, choices=FORMAT_CHOICES, default='excel', verbose_name="Formato")
+    compression = models.CharField(max_length=10, choices=[
+        ('gzip', 'gzip'),
+        ('zstd', 'zstd'),
+    ], blank=True, verbose_name="Compressão")
+    limit = models.IntegerField(null=True, blank=True, verbose_name="Limite de Registros")
+    
+    # Andamento e resultado
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    rows_written = models.IntegerField(default=0, verbose_name="Linhas Gravadas")
+    file_path = models.CharField(max_length=500, blank=True, verbose_name="Arquivo")
+    file_size = models.BigIntegerField(null=True, blank=True, verbose_name="Tamanho (bytes)")
+    error_message = models.TextField(blank=True, verbose_name="Mensagem de Erro")
+    
+    # Auditoria
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'core_export_job'
+        verbose_name = 'Exportação'
+        verbose_name_plural = 'Exportações'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.query.name} - {self.format} ({self.status})"
@@ -0,0 +1,307 @@
+"""
+Execução particionada de consultas (extrações muito grandes)
+
+Uma consulta com partition_column e partition_count > 1 é dividida em
+intervalos da coluna (partition_bounds ou, se vazio, partition_count
+intervalos iguais entre MIN e MAX) e cada intervalo é executado em uma
+conexão própria da pool, por até PARTITION_WORKERS threads ao mesmo tempo.
+Os lotes das partições são entregues à medida que chegam, pela mesma
+interface de StreamingQuery (columns, batches(), close()), de forma que
+exportações, jobs e snapshots leem o resultado sem saber da divisão.
+
+A ordem das linhas é preservada dentro de cada partição, mas não entre
+partições. Linhas com a coluna nula ficam na primeira partição.
+"""
+import logging
+import queue
+import threading
+
+from django.conf import settings
+
+from .connection_pool import get_pool_setting
+from .dialects import bounds_sql, limit_sql, partition_sql, prepare_query
+from .keyset import parse_order_by
+from .streaming import StreamingQuery
+
+logger = logging.getLogger(__name__)
+
+
+PARTITION_DEFAULTS = {
+    'ENABLE_PARTITIONED_EXECUTION': True,
+    'PARTITION_WORKERS': 4,             # Partições executadas ao mesmo tempo (até POOL_MAX_SIZE)
+    'PARTITION_MAX_COUNT': 64,          # Máximo de partições por consulta
+}
+
+# Lotes lidos e ainda não entregues (todas as partições)
+PARTITION_QUEUE_SIZE = 8
+
+# Intervalo (segundos) para verificar cancelamento enquanto a fila está cheia
+_PUT_INTERVAL = 0.1
+
+_OPEN = 'open'
+_BATCH = 'batch'
+_ERROR = 'error'
+_DONE = 'done'
+
+
+def get_partition_setting(name):
+    """Obter configuração da execução particionada (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get(name, PARTITION_DEFAULTS[name])
+
+
+def is_partitioned(query):
+    """A consulta declara particionamento (e ele está habilitado)"""
+    return (
+        bool(get_partition_setting('ENABLE_PARTITIONED_EXECUTION'))
+        and bool(query.partition_column)
+        and query.partition_count > 1
+    )
+
+
+def validate_partition_column(column):
+    """Nome simples de coluna (entra no SQL sem bind); levanta ValueError"""
+    key_columns = parse_order_by([column])
+    if key_columns[0][1]:
+        raise ValueError(f"Coluna de particionamento inválida: {column}")
+    return key_columns[0][0]
+
+
+def validate_partition_bounds(bounds, max_count=None):
+    """
+    Limites declarados na consulta: números ou textos (ex.: datas ISO), do
+    mesmo tipo e em ordem estritamente crescente; levanta ValueError
+    """
+    if not isinstance(bounds, list):
+        raise ValueError("Os limites das partições devem ser uma lista")
+    numeric = [isinstance(bound, (int, float)) and not isinstance(bound, bool) for bound in bounds]
+    if not all(numeric) and not all(isinstance(bound, str) for bound in bounds):
+        raise ValueError("Os limites das partições devem ser todos números ou todos textos")
+    if any(later <= earlier for earlier, later in zip(bounds, bounds[1:])):
+        raise ValueError("Os limites das partições devem estar em ordem crescente, sem repetição")
+    if max_count is not None and len(bounds) + 1 > max_count:
+        raise ValueError(f"O máximo de partições por consulta é {max_count}")
+    return bounds
+
+
+def partition_ranges(bounds):
+    """
+    Intervalos [(início, fim), ...] definidos pelos limites em ordem crescente
+
+    None indica intervalo aberto: [b1, b2] -> (None, b1), (b1, b2), (b2, None).
+    """
+    edges = [None] + list(bounds) + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def split_bounds(low, high, count):
+    """
+    count - 1 limites que dividem [low, high] em intervalos de mesma largura
+
+    Valores inteiros, decimais e datas; outros tipos (ex.: texto) ou um
+    intervalo vazio resultam em uma única partição ([]).
+    """
+    if low is None or high is None or count < 2 or isinstance(low, bool):
+        return []
+    try:
+        if isinstance(low, int) and isinstance(high, int):
+            bounds = [low + (high - low) * index // count for index in range(1, count)]
+        else:
+            bounds = [low + (high - low) * index / count for index in range(1, count)]
+    except TypeError:
+        return []
+    return sorted({bound for bound in bounds if low < bound <= high})
+
+
+def derive_bounds(query, parameters, timeout=None):
+    """Limites das partições a partir de MIN/MAX da coluna no banco de origem"""
+    sgbd = query.connection.sgbd
+    sql_query, sql_params = prepare_query(
+        bounds_sql(query.query, sgbd, query.partition_column), sgbd, parameters
+    )
+    stream = StreamingQuery(query.connection, sql_query, sql_params, timeout=timeout).open()
+    try:
+        rows = stream.fetch_all()
+    finally:
+        stream.close()
+    low, high = rows[0] if rows else (None, None)
+    return split_bounds(low, high, query.partition_count)
+
+
+class PartitionedQuery:
+    """
+    Consulta executada em partições paralelas, lida como um StreamingQuery
+
+    Uso:
+        stream = PartitionedQuery(query, parameters, limit, timeout=...).open()
+        stream.columns
+        for batch in stream.batches():
+            ...
+        stream.close()
+
+    open() calcula os intervalos, inicia as threads e aguarda a primeira
+    partição abrir (erros de SQL são levantados ali). Com limit, cada
+    partição é limitada e a leitura para ao atingir o total.
+    """
+
+    def __init__(self, query, parameters=None, limit=None, timeout=None, batch_size=None):
+        self.query = query
+        self.connection = query.connection
+        self.parameters = parameters or {}
+        self.limit = limit
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.columns = []
+        self.column_types = []
+        self.description = None
+        self.rows_read = 0
+        self.ranges = []
+        self._messages = queue.Queue(maxsize=PARTITION_QUEUE_SIZE)
+        self._cancelled = threading.Event()
+        self._threads = []
+        self._workers_done = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def open(self):
+        """Calcular as partições, iniciar as threads e aguardar a primeira abrir"""
+        bounds = self.query.partition_bounds or derive_bounds(self.query, self.parameters, self.timeout)
+        self.ranges = partition_ranges(bounds)
+
+        pending = queue.Queue()
+        for index, partition_range in enumerate(self.ranges):
+            pending.put((index, partition_range))
+
+        workers = min(
+            len(self.ranges),
+            max(get_partition_setting('PARTITION_WORKERS'), 1),
+            max(get_pool_setting('POOL_MAX_SIZE'), 1)
+        )
+        for number in range(workers):
+            thread = threading.Thread(
+                target=self._work, args=(pending,), name=f'reportme-partition-{number}', daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+        try:
+            while True:
+                kind, payload = self._next_message()
+                if kind == _ERROR:
+                    raise payload
+                if kind == _OPEN:
+                    self.description, self.columns, self.column_types = payload
+                    return self
+                if kind == _DONE:
+                    return self
+        except BaseException:
+            self.close()
+            raise
+
+    def batches(self):
+        """Gerar os lotes das partições na ordem em que são lidos"""
+        while True:
+            kind, payload = self._next_message()
+            if kind == _DONE:
+                return
+            if kind == _ERROR:
+                self.close()
+                raise payload
+            if kind == _OPEN:
+                continue
+            if self.limit and self.rows_read + len(payload) >= self.limit:
+                payload = payload[:self.limit - self.rows_read]
+                self.rows_read += len(payload)
+                if payload:
+                    yield payload
+                self.close()
+                return
+            self.rows_read += len(payload)
+            yield payload
+
+    def fetch_all(self):
+        """Ler todo o resultado (uma única cópia das linhas)"""
+        rows = []
+        for batch in self.batches():
+            rows.extend(batch)
+        return rows
+
+    def close(self, error=None):
+        """Cancelar as partições em andamento e devolver as conexões para a pool"""
+        self._cancelled.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _next_message(self):
+        """Próxima mensagem das threads; (_DONE, None) quando todas terminaram"""
+        while self._threads and self._workers_done < len(self._threads):
+            kind, payload = self._messages.get()
+            if kind == _DONE:
+                self._workers_done += 1
+                continue
+            return kind, payload
+        return _DONE, None
+
+    def _partition_query(self, index, partition_range):
+        sgbd = self.connection.sgbd
+        lower, upper = partition_range
+        sql_query = partition_sql(
+            self.query.query, sgbd, self.query.partition_column,
+            lower=lower is not None, upper=upper is not None, include_nulls=index == 0
+        )
+        if self.limit:
+            sql_query = limit_sql(sql_query, sgbd)
+        return prepare_query(sql_query, sgbd, {
+            **self.parameters,
+            'reportme_limit': self.limit,
+            'reportme_lower': lower,
+            'reportme_upper': upper,
+        })
+
+    def _put(self, message):
+        """Entregar uma mensagem à leitura; retorna False se a leitura foi cancelada"""
+        while not self._cancelled.is_set():
+            try:
+                self._messages.put(message, timeout=_PUT_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _work(self, pending):
+        """Thread: executar partições pendentes até acabarem ou a leitura ser cancelada"""
+        try:
+            while not self._cancelled.is_set():
+                try:
+                    index, partition_range = pending.get_nowait()
+                except queue.Empty:
+                    break
+                sql_query, sql_params = self._partition_query(index, partition_range)
+                stream = StreamingQuery(
+                    self.connection, sql_query, sql_params, batch_size=self.batch_size, timeout=self.timeout
+                ).open()
+                try:
+                    if not self._put((_OPEN, (stream.description, stream.columns, stream.column_types))):
+                        return
+                    for batch in stream.batches():
+                        if not self._put((_BATCH, batch)):
+                            return
+                finally:
+                    stream.close()
+        except Exception as e:
+            logger.error(f"Erro na execução particionada ({self.query.name}): {e}")
+            self._put((_ERROR, e))
+        finally:
+            self._put_done()
+
+    def _put_done(self):
+        # A leitura conta as threads encerradas; após o cancelamento ninguém mais lê
+        if not self._cancelled.is_set():
+            self._put((_DONE, None))
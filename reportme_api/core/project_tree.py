@@ -0,0 +1,74 @@
+"""
+Montagem da árvore de um projeto com uma única consulta
+
+Os nós do projeto são lidos de uma vez (com consulta e conexões em
+select_related), serializados sem recursão (ProjectTreeNodeSerializer) e
+ligados aos filhos em memória, em O(n). A representação de cada nó é montada
+uma vez e compartilhada entre as listas em que aparece.
+"""
+from collections import defaultdict
+
+from .models import ProjectNode
+
+
+class ProjectTree:
+    """
+    Nós de um projeto e suas representações com os filhos aninhados
+
+    Uso:
+        tree = ProjectTree(project.pk)
+        tree.node(node_id)        # dict do nó com 'children' (ou None)
+        tree.nodes()              # todos os nós, por pai e nome
+    """
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self._nodes = list(
+            ProjectNode.objects.filter(project_id=project_id)
+            .select_related('query__connection', 'connection')
+            .order_by('name')
+        )
+        self._children = defaultdict(list)
+        for node in self._nodes:
+            self._children[node.parent_id].append(node)
+        self._data = None
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def has_children(self, node_id):
+        return bool(self._children.get(node_id))
+
+    def _build(self):
+        from .serializers import ProjectTreeNodeSerializer
+
+        data = ProjectTreeNodeSerializer(self._nodes, many=True, context={'project_tree': self}).data
+        self._data = {node['id']: node for node in data}
+        for node_id, node in self._data.items():
+            node['children'] = [self._data[child.pk] for child in self._children.get(node_id, [])]
+
+    def node(self, node_id):
+        """Representação do nó com a subárvore aninhada (None se não pertence ao projeto)"""
+        if self._data is None:
+            self._build()
+        return self._data.get(node_id)
+
+    def nodes(self):
+        """Todos os nós do projeto (raízes primeiro, depois por pai e nome)"""
+        if self._data is None:
+            self._build()
+        ordered = sorted(self._nodes, key=lambda node: (node.parent_id is not None, node.parent_id or 0))
+        return [self._data[node.pk] for node in ordered]
+
+    def subtree_size(self, node_id):
+        """Número de nós na subárvore (inclusive o próprio nó)"""
+        size = 0
+        stack = [node_id]
+        while stack:
+            current = stack.pop()
+            size += 1
+            stack.extend(child.pk for child in self._children.get(current, []))
+        return size
+
+    def query_count(self):
+        return sum(1 for node in self._nodes if node.query_id)
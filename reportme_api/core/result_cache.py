@@ -0,0 +1,127 @@
+"""
+Cache de resultados de consultas (Query.cache_duration)
+
+A chave combina o id da consulta, o hash do texto SQL, a conexão, os
+parâmetros canonicalizados e a variante da execução (limite, página). Cada
+consulta e cada conexão possuem um token de versão no cache; alterar o
+registro (Query, Parameter ou Connection) troca o token e torna inacessíveis
+todas as entradas anteriores, em todos os workers que compartilham o cache.
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+CACHE_PREFIX = 'reportme:result'
+
+# Resultados maiores que isso não são armazenados
+DEFAULT_MAX_CACHED_ROWS = 10000
+
+# Tempo (segundos) em que o total da paginação é reaproveitado quando a
+# consulta não define cache_duration
+DEFAULT_PAGINATION_TOTAL_TTL = 300
+
+
+def _reportme_setting(name, default):
+    return getattr(settings, 'REPORTME_SETTINGS', {}).get(name, default)
+
+
+def is_cache_enabled(query):
+    """Verificar se a consulta usa cache de resultados"""
+    return bool(_reportme_setting('ENABLE_QUERY_CACHE', True)) and (query.cache_duration or 0) > 0
+
+
+def canonicalize_parameters(parameters):
+    """
+    Forma canônica dos parâmetros: chaves ordenadas e valores vazios removidos
+    (None, '' e parâmetro ausente resultam no mesmo SQL, com NULL)
+    """
+    canonical = {
+        name: value for name, value in (parameters or {}).items()
+        if value is not None and value != ''
+    }
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+
+def _version_token(kind, object_id):
+    """Token de versão atual (criado se ausente ou removido do cache)"""
+    key = f"{CACHE_PREFIX}:version:{kind}:{object_id}"
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        token = cache.get(key)
+    return token
+
+
+def _bump_version(kind, object_id):
+    cache.set(f"{CACHE_PREFIX}:version:{kind}:{object_id}", uuid.uuid4().hex, None)
+
+
+def build_fingerprint(query, parameters, variant):
+    """Hash (sha256) de (consulta, versão, conexão, parâmetros, variante)"""
+    raw = json.dumps([
+        query.pk,
+        hashlib.sha256(query.query.encode('utf-8')).hexdigest(),
+        _version_token('query', query.pk),
+        query.connection_id,
+        _version_token('connection', query.connection_id),
+        canonicalize_parameters(parameters),
+        list(variant),
+    ], default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def build_cache_key(query, parameters, variant):
+    """Chave do resultado para (consulta, versão, conexão, parâmetros, variante)"""
+    return f"{CACHE_PREFIX}:{build_fingerprint(query, parameters, variant)}"
+
+
+def get_cached_result(query, parameters, variant):
+    """Obter resultado em cache (ou None)"""
+    if not is_cache_enabled(query):
+        return None
+    return cache.get(build_cache_key(query, parameters, variant))
+
+
+def set_cached_result(query, parameters, variant, result, rows_count):
+    """Armazenar resultado pelo tempo de Query.cache_duration"""
+    if not is_cache_enabled(query):
+        return False
+    if rows_count > _reportme_setting('QUERY_CACHE_MAX_ROWS', DEFAULT_MAX_CACHED_ROWS):
+        return False
+
+    cached = dict(result)
+    cached['cached_at'] = timezone.now().isoformat()
+    cache.set(build_cache_key(query, parameters, variant), cached, query.cache_duration)
+    return True
+
+
+def get_cached_total(query, parameters, count_mode):
+    """Total de registros já calculado para (consulta, parâmetros), ou None"""
+    return cache.get(build_cache_key(query, parameters, ('total', count_mode)))
+
+
+def set_cached_total(query, parameters, count_mode, total):
+    """
+    Armazenar o total usado pela paginação
+
+    Independe de cache_duration: o total é reaproveitado nas páginas seguintes
+    por PAGINATION_TOTAL_TTL segundos (ou cache_duration, se maior) e
+    invalidado junto com os resultados ao alterar a consulta ou a conexão.
+    """
+    timeout = max(query.cache_duration or 0, _reportme_setting('PAGINATION_TOTAL_TTL', DEFAULT_PAGINATION_TOTAL_TTL))
+    if timeout > 0:
+        cache.set(build_cache_key(query, parameters, ('total', count_mode)), total, timeout)
+
+
+def invalidate_query_cache(query_id):
+    """Invalidar todos os resultados (e totais) em cache de uma consulta"""
+    _bump_version('query', query_id)
+
+
+def invalidate_connection_cache(connection_id):
+    """Invalidar todos os resultados em cache das consultas de uma conexão"""
+    _bump_version('connection', connection_id)
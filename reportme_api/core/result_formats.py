@@ -0,0 +1,204 @@
+"""
+Formatos de resposta dos resultados de consultas
+
+Além do formato padrão (lista de linhas), o resultado pode ser enviado em
+formato colunar (?format=columnar): um array por coluna, acompanhado do tipo
+de cada coluna obtido de cursor.description. Os valores de cada coluna são
+convertidos de uma só vez para tipos nativos de JSON, de acordo com o tipo da
+coluna, e o encoder não precisa tratar valor a valor.
+
+Para consumidores automatizados (ETL) o resultado pode ser enviado em NDJSON
+(?format=ndjson ou Accept: application/x-ndjson): um objeto JSON por linha,
+enviado lote a lote a partir do cursor.
+"""
+import datetime
+from decimal import Decimal
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# Tipos lógicos das colunas: integer, number, decimal, string, boolean, date,
+# datetime, time, binary, json
+
+# OIDs do PostgreSQL (pg_type)
+POSTGRESQL_TYPES = {
+    16: 'boolean',
+    17: 'binary',
+    20: 'integer', 21: 'integer', 23: 'integer', 26: 'integer',
+    700: 'number', 701: 'number',
+    1700: 'decimal',
+    18: 'string', 19: 'string', 25: 'string', 1042: 'string', 1043: 'string', 2950: 'string',
+    1082: 'date',
+    1114: 'datetime', 1184: 'datetime',
+    1083: 'time', 1266: 'time',
+    114: 'json', 3802: 'json',
+}
+
+# FIELD_TYPE do protocolo MySQL
+MYSQL_TYPES = {
+    0: 'decimal', 246: 'decimal',
+    1: 'integer', 2: 'integer', 3: 'integer', 8: 'integer', 9: 'integer', 13: 'integer', 16: 'integer',
+    4: 'number', 5: 'number',
+    7: 'datetime', 12: 'datetime',
+    10: 'date', 14: 'date',
+    11: 'time',
+    15: 'string', 247: 'string', 248: 'string', 253: 'string', 254: 'string',
+    245: 'json',
+    249: 'binary', 250: 'binary', 251: 'binary', 252: 'binary',
+}
+
+# Tipos Python (pyodbc informa o tipo Python em description)
+PYTHON_TYPES = [
+    (bool, 'boolean'),
+    (int, 'integer'),
+    (float, 'number'),
+    (Decimal, 'decimal'),
+    (datetime.datetime, 'datetime'),
+    (datetime.date, 'date'),
+    (datetime.time, 'time'),
+    ((bytes, bytearray, memoryview), 'binary'),
+    (str, 'string'),
+    ((dict, list), 'json'),
+]
+
+
+def _python_type(value_type):
+    for python_type, type_name in PYTHON_TYPES:
+        if issubclass(value_type, python_type):
+            return type_name
+    return None
+
+
+def _oracle_type(column):
+    name = getattr(column[1], 'name', str(column[1])).upper()
+    if 'NUMBER' in name:
+        # NUMBER(p, 0) é inteiro
+        scale = column[5] if len(column) > 5 else None
+        return 'integer' if scale == 0 and column[4] else 'decimal'
+    if 'BINARY_FLOAT' in name or 'BINARY_DOUBLE' in name:
+        return 'number'
+    if 'TIMESTAMP' in name or 'DATE' in name:
+        return 'datetime'
+    if 'RAW' in name or 'BLOB' in name:
+        return 'binary'
+    if 'CHAR' in name or 'CLOB' in name:
+        return 'string'
+    return None
+
+
+def _type_from_description(column, sgbd):
+    type_code = column[1]
+    if type_code is None:
+        return None
+    if isinstance(type_code, type):
+        return _python_type(type_code)
+    if sgbd == 'postgresql':
+        return POSTGRESQL_TYPES.get(type_code)
+    if sgbd == 'mysql':
+        return MYSQL_TYPES.get(type_code)
+    if sgbd == 'oracle':
+        return _oracle_type(column)
+    return None
+
+
+def _type_from_values(values):
+    for value in values:
+        if value is not None:
+            return _python_type(type(value)) or 'string'
+    return 'string'
+
+
+def describe_columns(description, sgbd, sample_rows=()):
+    """
+    Tipo lógico de cada coluna a partir de cursor.description
+
+    Quando o driver não informa o tipo (SQLite) ou o tipo não é reconhecido, ele
+    é inferido do primeiro valor não nulo das linhas de amostra.
+    """
+    column_types = []
+    for index, column in enumerate(description or []):
+        type_name = _type_from_description(column, sgbd)
+        if type_name is None:
+            type_name = _type_from_values(row[index] for row in sample_rows)
+        column_types.append(type_name)
+    return column_types
+
+
+def _isoformat(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _decimal(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _binary(value):
+    return bytes(value).decode('utf-8', errors='replace') if isinstance(value, (bytes, bytearray, memoryview)) else value
+
+
+# Conversão por tipo; colunas de tipos nativos do JSON seguem sem conversão
+COLUMN_CONVERTERS = {
+    'decimal': _decimal,
+    'date': _isoformat,
+    'datetime': _isoformat,
+    'time': _isoformat,
+    'binary': _binary,
+}
+
+
+def _convert_column(values, type_name):
+    converter = COLUMN_CONVERTERS.get(type_name)
+    if converter is None:
+        return values
+    return [None if value is None else converter(value) for value in values]
+
+
+def to_columnar(result):
+    """
+    Converter um resultado no formato de linhas ('columns', 'rows',
+    'column_types') para o formato colunar ('columns', 'column_types', 'data')
+    """
+    columnar = {key: value for key, value in result.items() if key != 'rows'}
+    columns = result.get('columns', [])
+    column_types = result.get('column_types') or ['string'] * len(columns)
+    rows = result.get('rows', [])
+
+    if rows:
+        data = [list(values) for values in zip(*rows)]
+    else:
+        data = [[] for _ in columns]
+
+    columnar['format'] = 'columnar'
+    columnar['column_types'] = column_types
+    columnar['data'] = [_convert_column(values, type_name) for values, type_name in zip(data, column_types)]
+    return columnar
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Renderer selecionado com ?format=columnar
+
+    A conversão para o formato colunar é feita pela view (to_columnar); o
+    renderer apenas registra o formato na negociação de conteúdo do DRF.
+    """
+    format = 'columnar'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renderer selecionado com ?format=ndjson ou Accept: application/x-ndjson
+
+    As linhas do resultado são geradas pela view (stream_ndjson); o renderer
+    é usado apenas nas respostas comuns (ex.: erros), com um objeto por linha.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        encode = JSONEncoder(ensure_ascii=False).encode
+        return ''.join(encode(item) + '\n' for item in items).encode('utf-8')
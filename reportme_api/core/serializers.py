@@ -1,21 +1,29 @@
 from rest_framework import serializers
-from .models import Project, ProjectNode, Query, Connection, Parameter
+from django.urls import reverse
+from .models import Project, ProjectNode, Query, Connection, Parameter, ExportJob
+from .export_jobs import get_export_setting
+from .partitioning import get_partition_setting, validate_partition_bounds, validate_partition_column
+from .project_tree import ProjectTree
+from .exporters import (
+    COMPRESSIBLE_FORMATS, EXPORT_FORMATS, check_compression, check_export_format, get_export_format_setting,
+)
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 
-class ProjectNodeSerializer(serializers.ModelSerializer):
+class ProjectTreeNodeSerializer(serializers.ModelSerializer):
     """
-    Serializer para nós de projeto (estrutura hierárquica)
+    Serializer de um nó sem recursão: os filhos são ligados por ProjectTree
+    (context['project_tree']), que também informa se o nó tem filhos
     """
     children = serializers.SerializerMethodField()
     query_name = serializers.CharField(source='query.name', read_only=True)
     connection_name = serializers.SerializerMethodField()
     has_query = serializers.SerializerMethodField()
     node_type = serializers.SerializerMethodField()
-    parent_id = serializers.IntegerField(source='parent.id', read_only=True, allow_null=True)
-    query_id = serializers.IntegerField(source='query.id', read_only=True, allow_null=True)
+    parent_id = serializers.IntegerField(read_only=True, allow_null=True)
+    query_id = serializers.IntegerField(read_only=True, allow_null=True)
     
     class Meta:
         model = ProjectNode
@@ -27,9 +35,8 @@ class ProjectNodeSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
     
     def get_children(self, obj):
-        """Retornar filhos do nó"""
-        children = obj.children.all().order_by('name')
-        return ProjectNodeSerializer(children, many=True, context=self.context).data
+        """Preenchido por ProjectTree"""
+        return []
     
     def get_connection_name(self, obj):
         """Obter nome da conexão - prioriza conexão direta, senão da query"""
@@ -41,18 +48,40 @@ class ProjectNodeSerializer(serializers.ModelSerializer):
     
     def get_has_query(self, obj):
         """Verificar se o nó tem consulta associada"""
-        return obj.query is not None
+        return obj.query_id is not None
     
     def get_node_type(self, obj):
         """Determinar tipo do nó"""
-        if obj.query:
+        if obj.query_id:
             return 'query'
-        elif obj.children.exists():
+        elif self.context['project_tree'].has_children(obj.pk):
             return 'folder'
         else:
             return 'empty'
 
 
+class ProjectNodeSerializer(ProjectTreeNodeSerializer):
+    """
+    Serializer para nós de projeto (estrutura hierárquica)
+    
+    O nó e sua subárvore vêm da árvore do projeto (ProjectTree), lida com uma
+    consulta e compartilhada pelos nós serializados na mesma resposta.
+    """
+    
+    def to_representation(self, instance):
+        trees = self.context.setdefault('project_trees', {})
+        if instance.project_id not in trees:
+            trees[instance.project_id] = ProjectTree(instance.project_id)
+        node = trees[instance.project_id].node(instance.pk)
+        if node is None:
+            # Nó não salvo: sem filhos
+            return super().to_representation(instance)
+        return node
+    
+    def get_node_type(self, obj):
+        return 'query' if obj.query_id else 'empty'
+
+
 class ProjectNodeCreateSerializer(serializers.ModelSerializer):
     """
     Serializer simplificado para criação de nós (sem recursão)
@@ -158,7 +187,7 @@ class ProjectSerializer(serializers.ModelSerializer):
     """
     Serializer para projetos
     """
-    root_node = ProjectNodeSerializer(source='first_node', read_only=True)
+    root_node = serializers.SerializerMethodField()
     node_count = serializers.SerializerMethodField()
     query_count = serializers.SerializerMethodField()
     created_by_name = serializers.CharField(source='owner.full_name', read_only=True)
@@ -173,19 +202,29 @@ class ProjectSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['owner', 'created_at', 'updated_at', 'first_node']
     
+    def _project_tree(self, obj):
+        """Árvore do projeto, lida uma vez para root_node e as contagens"""
+        trees = self.context.setdefault('project_trees', {})
+        if obj.pk not in trees:
+            trees[obj.pk] = ProjectTree(obj.pk)
+        return trees[obj.pk]
+    
+    def get_root_node(self, obj):
+        """Nó raiz com a árvore aninhada"""
+        if obj.first_node_id:
+            return self._project_tree(obj).node(obj.first_node_id)
+        return None
+    
     def get_node_count(self, obj):
         """Contar total de nós no projeto"""
-        if obj.first_node:
-            return obj.first_node.get_descendants_count() + 1
+        if obj.first_node_id:
+            return self._project_tree(obj).subtree_size(obj.first_node_id)
         return 0
     
     def get_query_count(self, obj):
         """Contar consultas no projeto"""
-        if obj.first_node:
-            return ProjectNode.objects.filter(
-                project=obj,
-                query__isnull=False
-            ).count()
+        if obj.first_node_id:
+            return self._project_tree(obj).query_count()
         return 0
     
     def create(self, validated_data):
@@ -248,9 +287,8 @@ class ProjectTreeSerializer(serializers.ModelSerializer):
     
     def get_tree(self, obj):
         """Retornar árvore completa do projeto"""
-        # Retornar todos os nós do projeto, não apenas o primeiro
-        nodes = obj.nodes.all().order_by('parent_id', 'name')
-        return ProjectNodeSerializer(nodes, many=True, context=self.context).data
+        # Retornar todos os nós do projeto, não apenas o primeiro (uma consulta)
+        return ProjectTree(obj.pk).nodes()
 
 
 class ConnectionSerializer(serializers.ModelSerializer):
@@ -448,6 +486,7 @@ class QuerySerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'query', 'connection', 'connection_name',
             'created_by', 'created_by_name', 'parameters', 'timeout', 'cache_duration',
+            'partition_column', 'partition_count', 'partition_bounds',
             'is_active', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at', 'created_by']
@@ -463,12 +502,33 @@ class QueryCreateSerializer(serializers.ModelSerializer):
         model = Query
         fields = [
             'name', 'query', 'connection', 'connection_id', 'timeout', 'cache_duration',
-            'is_active'
+            'partition_column', 'partition_count', 'partition_bounds', 'is_active'
         ]
         extra_kwargs = {
             'connection': {'required': False},
         }
     
+    def validate_partition_column(self, value):
+        """Nome simples de coluna (usado diretamente no SQL das partições)"""
+        if not value:
+            return ''
+        try:
+            return validate_partition_column(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+    
+    def validate_partition_count(self, value):
+        max_count = get_partition_setting('PARTITION_MAX_COUNT')
+        if value > max_count:
+            raise serializers.ValidationError(f"O máximo de partições por consulta é {max_count}")
+        return value
+    
+    def validate_partition_bounds(self, value):
+        try:
+            return validate_partition_bounds(value or [], get_partition_setting('PARTITION_MAX_COUNT'))
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+    
     def create(self, validated_data):
         """Criar consulta, lidando com connection_id"""
         connection_id = validated_data.pop('connection_id', None)
@@ -586,7 +646,18 @@ class QueryExecutionSerializer(serializers.Serializer):
     """
     query_id = serializers.IntegerField()
     parameters = serializers.DictField(required=False, default=dict)
-    limit = serializers.IntegerField(required=False, default=100, min_value=1, max_value=10000)
+    limit = serializers.IntegerField(required=False, default=100, min_value=1)
+    stream = serializers.BooleanField(required=False, default=False)
+    
+    # Limite de linhas por execução; clientes NDJSON (context['ndjson']) usam NDJSON_MAX_ROWS
+    MAX_ROWS = 10000
+    
+    def validate_limit(self, value):
+        """Limite máximo: MAX_ROWS, ou NDJSON_MAX_ROWS para respostas NDJSON"""
+        max_rows = get_export_format_setting('NDJSON_MAX_ROWS') if self.context.get('ndjson') else self.MAX_ROWS
+        if value > max_rows:
+            raise serializers.ValidationError(f"Certifique-se de que este valor seja inferior ou igual a {max_rows}.")
+        return value
     
     def validate_query_id(self, value):
         """Validar se a consulta existe e o usuário tem acesso"""
@@ -600,6 +671,112 @@ class QueryExecutionSerializer(serializers.Serializer):
             raise serializers.ValidationError("Consulta não encontrada")
 
 
+class QueryFanOutExportSerializer(QueryExecutionSerializer):
+    """
+    Serializer para exportação em vários formatos (uma única execução da consulta)
+    """
+    stream = None
+    formats = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(EXPORT_FORMATS)), min_length=1
+    )
+    bundle = serializers.ChoiceField(choices=['zip', 'artifacts'], default='zip')
+    
+    def validate_formats(self, value):
+        """Formatos sem repetição e disponíveis (pyarrow)"""
+        formats = list(dict.fromkeys(value))
+        for export_format in formats:
+            try:
+                check_export_format(export_format)
+            except Exception as e:
+                raise serializers.ValidationError(str(e))
+        return formats
+
+
+class ExportJobCreateSerializer(QueryExecutionSerializer):
+    """
+    Serializer para criação de exportação em segundo plano
+    """
+    stream = None
+    limit = serializers.IntegerField(required=False, default=None, allow_null=True, min_value=1)
+    format = serializers.ChoiceField(choices=ExportJob.FORMAT_CHOICES, default='excel')
+    compression = serializers.ChoiceField(choices=['none', 'gzip', 'zstd'], default='none')
+    
+    def validate_limit(self, value):
+        """Limite padrão e máximo: MAX_EXPORT_ROWS"""
+        max_rows = get_export_setting('MAX_EXPORT_ROWS')
+        if value is None:
+            return max_rows
+        if value > max_rows:
+            raise serializers.ValidationError(f"O limite máximo de registros para exportação é {max_rows}")
+        return value
+    
+    def validate_format(self, value):
+        """Formatos que dependem de pacotes opcionais (pyarrow)"""
+        try:
+            check_export_format(value)
+        except Exception as e:
+            raise serializers.ValidationError(str(e))
+        return value
+    
+    def validate(self, attrs):
+        """Compressão apenas para formatos de texto (CSV e NDJSON)"""
+        compression = attrs.get('compression')
+        if compression == 'none':
+            attrs['compression'] = ''
+        elif attrs.get('format') not in COMPRESSIBLE_FORMATS:
+            raise serializers.ValidationError({'compression': "Compressão disponível apenas para exportações CSV e NDJSON"})
+        else:
+            try:
+                check_compression(compression)
+            except Exception as e:
+                raise serializers.ValidationError({'compression': str(e)})
+        return attrs
+
+
+class ProjectNodeExportSerializer(serializers.Serializer):
+    """
+    Serializer para exportação em lote dos relatórios de uma pasta
+    """
+    format = serializers.ChoiceField(choices=['excel', 'zip'], default='excel')
+    parameters = serializers.DictField(required=False, default=dict)
+    limit = serializers.IntegerField(required=False, default=None, allow_null=True, min_value=1)
+    
+    def validate_limit(self, value):
+        """Limite padrão e máximo por relatório: MAX_EXPORT_ROWS"""
+        max_rows = get_export_setting('MAX_EXPORT_ROWS')
+        if value is None:
+            return max_rows
+        if value > max_rows:
+            raise serializers.ValidationError(f"O limite máximo de registros para exportação é {max_rows}")
+        return value
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer para status e progresso de exportações em segundo plano
+    """
+    query_id = serializers.IntegerField(source='query.id', read_only=True)
+    query_name = serializers.CharField(source='query.name', read_only=True)
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'query_id', 'query_name', 'format', 'compression', 'parameters', 'limit',
+            'status', 'rows_written', 'file_size', 'error_message',
+            'created_at', 'started_at', 'finished_at', 'download_url'
+        ]
+        read_only_fields = fields
+    
+    def get_download_url(self, obj):
+        """URL de download (apenas exportações concluídas)"""
+        if obj.status != 'success':
+            return None
+        request = self.context.get('request')
+        url = reverse('exportjob-download', args=[obj.id])
+        return request.build_absolute_uri(url) if request else url
+
+
 class QueryValidationSerializer(serializers.Serializer):
     """
     Serializer para validação de consulta SQL
@@ -0,0 +1,78 @@
+"""
+Sinais do app core
+"""
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import Connection, Query, Parameter, Project, ProjectNode
+from .connection_pool import invalidate_pool
+from .result_cache import invalidate_query_cache, invalidate_connection_cache
+from .tree_cache import (
+    invalidate_connection_trees, invalidate_project_tree, invalidate_query_trees, invalidate_user_trees
+)
+
+
+@receiver(post_save, sender=Connection)
+@receiver(post_delete, sender=Connection)
+def invalidate_connection_pool(sender, instance, **kwargs):
+    """Descartar a pool e os resultados em cache quando os dados da conexão mudam"""
+    invalidate_pool(instance.pk)
+    invalidate_connection_cache(instance.pk)
+
+
+@receiver(post_save, sender=Query)
+@receiver(post_delete, sender=Query)
+def invalidate_query_results(sender, instance, **kwargs):
+    """Invalidar resultados em cache quando a consulta muda"""
+    invalidate_query_cache(instance.pk)
+
+
+@receiver(post_save, sender=Parameter)
+@receiver(post_delete, sender=Parameter)
+def invalidate_parameter_query_results(sender, instance, **kwargs):
+    """Invalidar resultados em cache quando um parâmetro da consulta muda"""
+    invalidate_query_cache(instance.query_id)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_tree_cache(sender, instance, **kwargs):
+    """Invalidar a árvore em cache quando o projeto muda"""
+    invalidate_project_tree(instance.pk)
+
+
+@receiver(post_save, sender=ProjectNode)
+@receiver(post_delete, sender=ProjectNode)
+def invalidate_node_tree_cache(sender, instance, **kwargs):
+    """Invalidar a árvore em cache quando um nó do projeto muda"""
+    invalidate_project_tree(instance.project_id)
+
+
+@receiver(post_save, sender=Query)
+@receiver(pre_delete, sender=Query)
+def invalidate_query_tree_cache(sender, instance, **kwargs):
+    """Invalidar as árvores que exibem a consulta (antes da exclusão desligar os nós)"""
+    invalidate_query_trees(instance.pk)
+
+
+@receiver(post_save, sender=Connection)
+@receiver(pre_delete, sender=Connection)
+def invalidate_connection_tree_cache(sender, instance, **kwargs):
+    """Invalidar as árvores que exibem a conexão (antes da exclusão desligar os nós)"""
+    invalidate_connection_trees(instance.pk)
+
+
+# Campos que compõem o nome exibido (User.full_name / get_full_name)
+USER_NAME_FIELDS = {'name', 'first_name', 'last_name', 'username'}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tree_cache(sender, instance, created, update_fields=None, **kwargs):
+    """Invalidar as árvores que exibem o nome do usuário (dono do projeto, autor de consultas e conexões)"""
+    if created:
+        return
+    # Ex.: update_last_login salva apenas last_login
+    if update_fields is not None and not set(update_fields) & USER_NAME_FIELDS:
+        return
+    invalidate_user_trees(instance.pk)
@@ -0,0 +1,270 @@
+"""
+Snapshots de resultados para paginação (executar uma vez, paginar várias)
+
+Na primeira página o resultado completo é gravado em disco local, coluna a
+coluna, e as páginas seguintes são lidas do arquivo (mmap) sem consultar o
+banco de origem.
+
+Estrutura de um snapshot (diretório <SNAPSHOT_DIR>/<snapshot_id>/):
+- meta.json: colunas, total de linhas, consulta, usuário e parâmetros
+- <n>.data: valores da coluna n em JSON, um por linha
+- <n>.idx: offsets (uint64) do início de cada linha em <n>.data, mais o final
+
+Os snapshots expiram após SNAPSHOT_TTL segundos e, quando o diretório excede
+SNAPSHOT_DIR_MAX_BYTES, os menos acessados recentemente são removidos (LRU).
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from array import array
+from datetime import datetime, timezone
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .connection_pool import connection_fingerprint
+from .result_cache import canonicalize_parameters
+
+logger = logging.getLogger(__name__)
+
+
+SNAPSHOT_DEFAULTS = {
+    'SNAPSHOT_DIR': None,                         # Padrão: <tmp>/reportme_snapshots
+    'SNAPSHOT_TTL': 1800,                         # Segundos sem acesso até expirar
+    'SNAPSHOT_MAX_ROWS': 1000000,                 # Linhas por snapshot
+    'SNAPSHOT_MAX_BYTES': 256 * 1024 * 1024,      # Tamanho de um snapshot
+    'SNAPSHOT_DIR_MAX_BYTES': 2 * 1024 * 1024 * 1024,  # Tamanho total em disco
+}
+
+META_FILE = 'meta.json'
+
+_SNAPSHOT_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class SnapshotTooLargeError(Exception):
+    """O resultado excede os limites de tamanho de um snapshot"""
+
+
+def get_snapshot_setting(name):
+    """Obter configuração de snapshots (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get(name, SNAPSHOT_DEFAULTS[name])
+
+
+def get_snapshot_dir():
+    directory = get_snapshot_setting('SNAPSHOT_DIR') or os.path.join(tempfile.gettempdir(), 'reportme_snapshots')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _fingerprint(query, parameters):
+    """Hash de (consulta, SQL, conexão e seus dados, parâmetros): editar a conexão invalida o snapshot"""
+    raw = '|'.join([
+        str(query.pk),
+        query.query,
+        str(query.connection_id),
+        connection_fingerprint(query.connection),
+        canonicalize_parameters(parameters),
+    ])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _directory_size(path):
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file():
+            total += entry.stat().st_size
+    return total
+
+
+class ResultSnapshot:
+    """Resultado materializado em disco, lido por página via mmap"""
+
+    def __init__(self, snapshot_id, path, meta):
+        self.snapshot_id = snapshot_id
+        self.path = path
+        self.meta = meta
+
+    @property
+    def columns(self):
+        return self.meta['columns']
+
+    @property
+    def column_types(self):
+        return self.meta['column_types']
+
+    @property
+    def row_count(self):
+        return self.meta['row_count']
+
+    @property
+    def expires_at(self):
+        last_access = os.path.getmtime(os.path.join(self.path, META_FILE))
+        return datetime.fromtimestamp(last_access + get_snapshot_setting('SNAPSHOT_TTL'), tz=timezone.utc)
+
+    @classmethod
+    def create(cls, stream, query, parameters, user):
+        """
+        Gravar o resultado de um StreamingQuery aberto, lote a lote
+
+        Levanta SnapshotTooLargeError (e descarta o que foi gravado) se o
+        resultado exceder SNAPSHOT_MAX_ROWS ou SNAPSHOT_MAX_BYTES.
+        """
+        max_rows = get_snapshot_setting('SNAPSHOT_MAX_ROWS')
+        max_bytes = get_snapshot_setting('SNAPSHOT_MAX_BYTES')
+
+        snapshot_id = uuid.uuid4().hex
+        directory = get_snapshot_dir()
+        temp_path = os.path.join(directory, f"{snapshot_id}.tmp")
+        os.makedirs(temp_path)
+
+        columns = list(stream.columns)
+        data_files = [open(os.path.join(temp_path, f"{index}.data"), 'wb') for index in range(len(columns))]
+        index_files = [open(os.path.join(temp_path, f"{index}.idx"), 'wb') for index in range(len(columns))]
+        offsets = [0] * len(columns)
+        row_count = 0
+        size = 0
+
+        try:
+            for index_file in index_files:
+                array('Q', [0]).tofile(index_file)
+
+            for batch in stream.batches():
+                row_count += len(batch)
+                if row_count > max_rows:
+                    raise SnapshotTooLargeError(f"Resultado excede {max_rows} linhas")
+
+                for index, data_file in enumerate(data_files):
+                    encoded = [json.dumps(row[index], cls=JSONEncoder).encode('utf-8') + b'\n' for row in batch]
+                    batch_offsets = array('Q')
+                    for value in encoded:
+                        offsets[index] += len(value)
+                        batch_offsets.append(offsets[index])
+                    data_file.write(b''.join(encoded))
+                    batch_offsets.tofile(index_files[index])
+
+                size = sum(offsets) + (row_count + 1) * 8 * len(columns)
+                if size > max_bytes:
+                    raise SnapshotTooLargeError(f"Resultado excede {max_bytes} bytes")
+        except Exception:
+            for open_file in data_files + index_files:
+                open_file.close()
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+        for open_file in data_files + index_files:
+            open_file.close()
+
+        meta = {
+            'columns': columns,
+            'column_types': list(stream.column_types),
+            'row_count': row_count,
+            'size_bytes': size,
+            'query_id': query.pk,
+            'user_id': user.pk,
+            'fingerprint': _fingerprint(query, parameters),
+            'created_at': time.time(),
+        }
+        with open(os.path.join(temp_path, META_FILE), 'w') as meta_file:
+            json.dump(meta, meta_file)
+
+        path = os.path.join(directory, snapshot_id)
+        os.rename(temp_path, path)
+
+        evict_snapshots(keep=snapshot_id)
+        return cls(snapshot_id, path, meta)
+
+    @classmethod
+    def open(cls, snapshot_id, query, parameters, user):
+        """
+        Abrir um snapshot existente (ou None se expirado, removido ou de outra
+        consulta, parâmetros ou usuário). O acesso renova o prazo de expiração.
+        """
+        if not snapshot_id or not _SNAPSHOT_ID.match(str(snapshot_id)):
+            return None
+
+        path = os.path.join(get_snapshot_dir(), snapshot_id)
+        meta_path = os.path.join(path, META_FILE)
+        try:
+            if time.time() - os.path.getmtime(meta_path) > get_snapshot_setting('SNAPSHOT_TTL'):
+                shutil.rmtree(path, ignore_errors=True)
+                return None
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+        if (meta['query_id'] != query.pk or meta['user_id'] != user.pk
+                or meta['fingerprint'] != _fingerprint(query, parameters)):
+            return None
+
+        os.utime(meta_path)
+        return cls(snapshot_id, path, meta)
+
+    def page(self, offset, limit):
+        """Ler as linhas [offset, offset + limit) sem carregar o restante do arquivo"""
+        start_row = min(offset, self.row_count)
+        end_row = min(offset + limit, self.row_count)
+        if start_row >= end_row:
+            return []
+
+        column_values = []
+        for index in range(len(self.columns)):
+            with open(os.path.join(self.path, f"{index}.idx"), 'rb') as index_file, \
+                    mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index_map:
+                with memoryview(index_map) as view, view.cast('Q') as offsets:
+                    start, end = offsets[start_row], offsets[end_row]
+
+            with open(os.path.join(self.path, f"{index}.data"), 'rb') as data_file, \
+                    mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data_map:
+                chunk = data_map[start:end]
+
+            # Valores JSON não contêm quebras de linha literais
+            column_values.append(json.loads(b'[' + chunk[:-1].replace(b'\n', b',') + b']'))
+
+        return [list(row) for row in zip(*column_values)]
+
+
+def evict_snapshots(keep=None):
+    """Remover snapshots expirados e, acima do limite em disco, os menos usados"""
+    directory = get_snapshot_dir()
+    ttl = get_snapshot_setting('SNAPSHOT_TTL')
+    max_bytes = get_snapshot_setting('SNAPSHOT_DIR_MAX_BYTES')
+    now = time.time()
+
+    snapshots = []
+    for entry in os.scandir(directory):
+        if not entry.is_dir():
+            continue
+        if entry.name.endswith('.tmp'):
+            # Gravação interrompida (ex.: worker finalizado no meio da escrita)
+            if now - entry.stat().st_mtime > ttl:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            continue
+        if not _SNAPSHOT_ID.match(entry.name):
+            continue
+        try:
+            last_access = os.path.getmtime(os.path.join(entry.path, META_FILE))
+        except OSError:
+            continue
+        if now - last_access > ttl and entry.name != keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            continue
+        snapshots.append((last_access, entry.path, _directory_size(entry.path)))
+
+    total = sum(size for _, _, size in snapshots)
+    for last_access, path, size in sorted(snapshots):
+        if total <= max_bytes:
+            break
+        if os.path.basename(path) == keep:
+            continue
+        logger.info(f"Removendo snapshot {os.path.basename(path)} (LRU)")
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
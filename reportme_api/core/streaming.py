@@ -0,0 +1,403 @@
+"""
+Execução de consultas com cursores do lado do servidor
+
+Os resultados são lidos do banco de origem em lotes (fetchmany), de forma que a
+memória usada por requisição é limitada pelo tamanho do lote e não pelo tamanho
+do resultado.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .connection_pool import get_pooled_connection
+from .dialects import QueryTimeoutError, StatementTimeout
+from .result_formats import describe_columns
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_batch_size():
+    """Tamanho do lote de leitura (REPORTME_SETTINGS['STREAM_BATCH_SIZE'])"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get('STREAM_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def open_server_side_cursor(db_connection, sgbd, batch_size):
+    """
+    Abrir um cursor que não materializa o resultado inteiro no cliente
+
+    - PostgreSQL: cursor nomeado (psycopg2), lido em blocos de itersize
+    - MySQL: SSCursor (resultado não bufferizado)
+    - Oracle: arraysize/prefetchrows ajustados ao lote
+    - SQL Server (pyodbc) e SQLite: cursor padrão lido com fetchmany
+    """
+    raw = getattr(db_connection, 'raw', db_connection)
+
+    if sgbd == 'postgresql':
+        cursor = raw.cursor(name=f"reportme_{uuid.uuid4().hex}")
+        cursor.itersize = batch_size
+        return cursor
+
+    if sgbd == 'mysql':
+        try:
+            import pymysql.cursors
+            if isinstance(raw, pymysql.connections.Connection):
+                return raw.cursor(pymysql.cursors.SSCursor)
+        except ImportError:
+            pass
+        try:
+            import MySQLdb.cursors
+            return raw.cursor(MySQLdb.cursors.SSCursor)
+        except ImportError:
+            return raw.cursor()
+
+    cursor = raw.cursor()
+    if sgbd == 'oracle':
+        cursor.arraysize = batch_size
+        cursor.prefetchrows = batch_size + 1
+    else:
+        try:
+            cursor.arraysize = batch_size
+        except AttributeError:
+            pass
+    return cursor
+
+
+class StreamingQuery:
+    """
+    Consulta executada em um cursor do lado do servidor
+
+    Uso:
+        with StreamingQuery(connection, sql) as stream:
+            stream.columns
+            for batch in stream.batches():
+                ...
+
+    A conexão é emprestada da pool em open() e devolvida em close(). Com
+    timeout (segundos), a execução e cada fetch são cancelados no servidor ao
+    exceder o prazo, levantando QueryTimeoutError.
+    """
+
+    def __init__(self, connection, sql, params=None, batch_size=None, timeout=None):
+        self.connection = connection
+        self.sql = sql
+        self.params = params
+        self.batch_size = batch_size or get_batch_size()
+        self.timeout = timeout
+        self.db_connection = None
+        self.cursor = None
+        self.statement_timeout = None
+        self.columns = []
+        self.column_types = []
+        self.description = None
+        self.rows_read = 0
+        self._first_batch = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def open(self):
+        """Emprestar conexão, executar a consulta e ler o primeiro lote"""
+        self.db_connection = get_pooled_connection(self.connection)
+        try:
+            self.statement_timeout = StatementTimeout(
+                self.db_connection, self.connection.sgbd, self.timeout
+            ).apply()
+            self.cursor = open_server_side_cursor(self.db_connection, self.connection.sgbd, self.batch_size)
+            if self.params is None:
+                self.cursor.execute(self.sql)
+            else:
+                self.cursor.execute(self.sql, self.params)
+
+            # Cursores nomeados do psycopg2 só preenchem description após o primeiro fetch
+            if self.cursor.description is not None or self.connection.sgbd == 'postgresql':
+                self._first_batch = self.cursor.fetchmany(self.batch_size)
+            else:
+                self._first_batch = []
+            self.description = self.cursor.description
+            self.columns = [desc[0] for desc in self.description] if self.description else []
+            self.column_types = describe_columns(self.description, self.connection.sgbd, self._first_batch)
+        except Exception as e:
+            self.close(error=e)
+            self._raise_timeout(e)
+            raise
+        return self
+
+    def batches(self):
+        """Gerar lotes de linhas (listas), lidos sob demanda"""
+        batch = self._first_batch
+        self._first_batch = None
+
+        while batch:
+            self.rows_read += len(batch)
+            yield [list(row) for row in batch]
+            self.statement_timeout.arm()
+            try:
+                batch = self.cursor.fetchmany(self.batch_size)
+            except Exception as e:
+                self._raise_timeout(e)
+                raise
+
+    def fetch_all(self):
+        """Ler todo o resultado (uma única cópia das linhas)"""
+        rows = []
+        for batch in self.batches():
+            rows.extend(batch)
+        return rows
+
+    def execute_scalar(self, sql, params=None):
+        """Executar uma consulta auxiliar (ex.: COUNT) na mesma conexão e prazo"""
+        self.statement_timeout.arm()
+        cursor = self.db_connection.cursor()
+        try:
+            if params is None:
+                cursor.execute(sql)
+            else:
+                cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+        except Exception as e:
+            self._raise_timeout(e)
+            raise
+        finally:
+            cursor.close()
+
+    def close(self, error=None):
+        """Fechar o cursor e devolver a conexão para a pool"""
+        if self.cursor is not None:
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
+            self.cursor = None
+        if self.db_connection is not None:
+            if self.statement_timeout is not None:
+                self.statement_timeout.clear()
+                # Após um call timeout a sessão Oracle fica inutilizável
+                if (error is not None and self.connection.sgbd == 'oracle'
+                        and self.statement_timeout.is_timeout_error(error)):
+                    self.db_connection.invalidate()
+            self.db_connection.close()
+            self.db_connection = None
+
+    def _raise_timeout(self, exc):
+        """Converter o erro de timeout do driver em QueryTimeoutError"""
+        if self.statement_timeout is not None and self.statement_timeout.is_timeout_error(exc):
+            self.close(error=exc)
+            raise QueryTimeoutError(
+                f"Consulta excedeu o tempo limite de {self.timeout}s e foi cancelada"
+            ) from exc
+
+
+# Bytes acumulados antes de entregar uma parte do COPY à resposta
+COPY_CHUNK_SIZE = 64 * 1024
+
+# Partes do COPY aguardando envio ao cliente (limita a memória por download)
+COPY_QUEUE_SIZE = 16
+
+_COPY_DONE = object()
+
+
+class _CopyWriter:
+    """
+    Arquivo recebido pelo copy_expert: acumula as linhas do COPY e entrega
+    partes à fila, bloqueando quando o cliente não acompanha
+    """
+
+    def __init__(self, parts, cancelled):
+        self._parts = parts
+        self._cancelled = cancelled
+        self._buffer = bytearray()
+        self._last_put = time.monotonic()
+
+    def write(self, data):
+        if self._cancelled.is_set():
+            raise IOError("Exportação cancelada")
+        self._buffer += data.encode('utf-8') if isinstance(data, str) else data
+        # Entregar também a cada segundo, para consultas que produzem linhas devagar
+        if len(self._buffer) >= COPY_CHUNK_SIZE or time.monotonic() - self._last_put >= 1:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer = bytearray()
+        self._last_put = time.monotonic()
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._parts.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise IOError("Exportação cancelada")
+
+
+class CopyCSVQuery:
+    """
+    Consulta PostgreSQL exportada em CSV pelo próprio servidor
+
+    COPY (<consulta>) TO STDOUT WITH (FORMAT csv, HEADER true), lido com
+    copy_expert: os valores chegam já formatados como texto, sem conversão
+    para objetos Python e de volta para texto. copy_expert é bloqueante e roda
+    em uma thread, que entrega partes de até COPY_CHUNK_SIZE bytes para
+    chunks(); o cliente lento bloqueia a thread (e o servidor) em vez de
+    acumular o resultado em memória.
+
+    Os parâmetros são incorporados ao SQL pelo próprio driver (mogrify), pois
+    o COPY não aceita parâmetros. Com timeout, a consulta é cancelada se o
+    servidor passar mais que timeout segundos sem enviar dados (o mesmo prazo
+    por fetch de StreamingQuery).
+    """
+
+    def __init__(self, connection, sql, params=None, timeout=None):
+        self.connection = connection
+        self.sql = sql
+        self.params = params
+        self.timeout = timeout
+        self.db_connection = None
+        self.rows_read = 0
+        self._parts = queue.Queue(COPY_QUEUE_SIZE)
+        self._cancelled = threading.Event()
+        self._thread = None
+        self._first_part = None
+        self._error = None
+
+    def open(self):
+        """Emprestar conexão, iniciar o COPY e aguardar a primeira parte (cabeçalho ou erro)"""
+        self.db_connection = get_pooled_connection(self.connection)
+        try:
+            cursor = self.db_connection.cursor()
+            query_sql = cursor.mogrify(self.sql, self.params)
+            cursor.close()
+            if isinstance(query_sql, bytes):
+                query_sql = query_sql.decode('utf-8')
+            copy_sql = f"COPY ({query_sql.strip().rstrip(';')}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+            self._thread = threading.Thread(
+                target=self._copy, args=(copy_sql,), name='reportme-copy', daemon=True
+            )
+            self._thread.start()
+            self._first_part = self._next_part()
+        except Exception as e:
+            self.close(error=e)
+            raise
+        return self
+
+    def _copy(self, copy_sql):
+        writer = _CopyWriter(self._parts, self._cancelled)
+        cursor = self.db_connection.cursor()
+        try:
+            cursor.copy_expert(copy_sql, writer)
+            writer.flush()
+            self.rows_read = max(cursor.rowcount, 0)
+            writer._put(_COPY_DONE)
+        except Exception as e:
+            self._error = e
+            try:
+                writer._put(_COPY_DONE)
+            except IOError:
+                pass
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    def _next_part(self):
+        try:
+            part = self._parts.get(timeout=self.timeout or None)
+        except queue.Empty:
+            self._cancel()
+            raise QueryTimeoutError(
+                f"Consulta excedeu o tempo limite de {self.timeout}s e foi cancelada"
+            )
+        if part is _COPY_DONE:
+            if self._error is not None:
+                raise self._error
+            return None
+        return part
+
+    def chunks(self):
+        """Gerar as partes do CSV (bytes), a primeira com o cabeçalho"""
+        part = self._first_part
+        self._first_part = None
+        while part is not None:
+            yield part
+            part = self._next_part()
+
+    def _cancel(self):
+        """Interromper o COPY em andamento no servidor"""
+        self._cancelled.set()
+        if self._thread is not None and self._thread.is_alive():
+            try:
+                self.db_connection.raw.cancel()
+            except Exception:
+                pass
+
+    def close(self, error=None):
+        """Encerrar o COPY (se ainda em andamento) e devolver a conexão para a pool"""
+        if self.db_connection is None:
+            return
+        if self._thread is not None:
+            if self._thread.is_alive():
+                self._cancel()
+                # Conexão cancelada no meio do COPY não volta para a pool
+                self.db_connection.invalidate()
+            self._thread.join()
+        if error is not None or self._error is not None:
+            self.db_connection.invalidate()
+        self.db_connection.close()
+        self.db_connection = None
+
+
+def stream_json_result(stream, on_complete=None):
+    """
+    Gerar o corpo JSON da resposta lote a lote
+
+    O documento segue o formato de _execute_query ('columns', 'rows',
+    'total_records'); 'success' é emitido ao final, pois um erro pode ocorrer
+    depois que as primeiras linhas já foram enviadas. on_complete(rows, error)
+    é chamado ao término para registrar a execução.
+    """
+    start_time = time.time()
+    rows_sent = 0
+    error = None
+
+    try:
+        yield '{"columns": ' + json.dumps(stream.columns, cls=JSONEncoder) + ', "rows": ['
+        separator = ''
+        for batch in stream.batches():
+            chunk = ','.join(json.dumps(row, cls=JSONEncoder) for row in batch)
+            yield separator + chunk
+            separator = ','
+            rows_sent += len(batch)
+        yield '], "success": true, "total_records": ' + str(rows_sent)
+    except Exception as e:
+        error = e
+        logger.error(f"Erro durante streaming da consulta: {e}")
+        yield '], "success": false, "error": ' + json.dumps(str(e)) + ', "total_records": ' + str(rows_sent)
+    finally:
+        stream.close()
+
+    execution_time = round((time.time() - start_time) * 1000, 2)
+    yield ', "execution_time_ms": ' + json.dumps(execution_time)
+    yield ', "timestamp": ' + json.dumps(timezone.now().isoformat()) + '}'
+
+    if on_complete:
+        on_complete(rows_sent, error)
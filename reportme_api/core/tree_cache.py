@@ -0,0 +1,132 @@
+"""
+Cache da árvore de projetos (portal de leitura)
+
+Cada projeto possui um token de versão no cache, trocado por qualquer
+alteração que mude a árvore: nós do projeto, o próprio projeto, as consultas
+e conexões ligadas aos nós e os usuários cujos nomes aparecem nela. As representações de tree, retrieve e da lista
+de nós (?project=) são guardadas pela versão e respondidas com ETag; um
+If-None-Match com a versão atual custa uma leitura do cache e retorna 304.
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+TREE_CACHE_PREFIX = 'reportme:tree'
+
+TREE_CACHE_DEFAULTS = {
+    'ENABLE_TREE_CACHE': True,
+    'TREE_CACHE_TTL': 24 * 3600,        # Representações guardadas por versão
+}
+
+
+def get_tree_cache_setting(name):
+    """Obter configuração do cache de árvores (REPORTME_SETTINGS com fallback para o padrão)"""
+    reportme_settings = getattr(settings, 'REPORTME_SETTINGS', {})
+    return reportme_settings.get(name, TREE_CACHE_DEFAULTS[name])
+
+
+def tree_version(project_id):
+    """Token de versão atual da árvore (criado se ausente ou removido do cache)"""
+    key = f"{TREE_CACHE_PREFIX}:version:{project_id}"
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        token = cache.get(key)
+    return token
+
+
+def invalidate_project_tree(*project_ids):
+    """Trocar a versão da árvore dos projetos"""
+    cache.set_many({
+        f"{TREE_CACHE_PREFIX}:version:{project_id}": uuid.uuid4().hex
+        for project_id in project_ids if project_id is not None
+    }, None)
+
+
+def invalidate_query_trees(query_id):
+    """Trocar a versão das árvores com nós ligados à consulta"""
+    from .models import ProjectNode
+
+    project_ids = ProjectNode.objects.filter(query_id=query_id).values_list('project_id', flat=True)
+    invalidate_project_tree(*set(project_ids))
+
+
+def invalidate_connection_trees(connection_id):
+    """Trocar a versão das árvores com nós ligados à conexão (direto ou pela consulta)"""
+    from .models import ProjectNode
+
+    project_ids = ProjectNode.objects.filter(
+        Q(connection_id=connection_id) | Q(query__connection_id=connection_id)
+    ).values_list('project_id', flat=True)
+    invalidate_project_tree(*set(project_ids))
+
+
+def invalidate_user_trees(user_id):
+    """
+    Trocar a versão das árvores que exibem o nome do usuário: projetos dele e
+    projetos com nós ligados a consultas ou conexões criadas por ele
+    """
+    from .models import Project, ProjectNode
+
+    project_ids = set(Project.objects.filter(owner_id=user_id).values_list('pk', flat=True))
+    project_ids.update(ProjectNode.objects.filter(
+        Q(query__created_by_id=user_id)
+        | Q(connection__created_by_id=user_id)
+        | Q(query__connection__created_by_id=user_id)
+    ).values_list('project_id', flat=True))
+    invalidate_project_tree(*project_ids)
+
+
+def _fingerprint(kind, project_id, version, variant):
+    raw = json.dumps([kind, project_id, version, variant])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def _if_none_match(request):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    return parse_etags(if_none_match) if if_none_match else []
+
+
+def cached_tree_response(request, kind, project_id, build, variant=''):
+    """
+    Resposta com a representação da árvore guardada pela versão do projeto
+
+    kind: 'tree', 'project' ou 'nodes'
+    build(): dados da resposta, chamado apenas quando não estão no cache
+    (levanta Http404 se o projeto não existe)
+    variant: o que mais muda a resposta (ex.: filtros e página da lista)
+
+    If-None-Match com a ETag atual retorna 304 sem montar a resposta; '*'
+    só corresponde depois de obtida a representação (projeto inexistente
+    segue para o 404).
+    """
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        return Response(build())
+    if not get_tree_cache_setting('ENABLE_TREE_CACHE'):
+        return Response(build())
+
+    fingerprint = _fingerprint(kind, project_id, tree_version(project_id), variant)
+    etag = quote_etag(fingerprint)
+    etags = _if_none_match(request)
+    if etag in etags or f"W/{etag}" in etags:
+        response = HttpResponseNotModified()
+    else:
+        key = f"{TREE_CACHE_PREFIX}:{fingerprint}"
+        data = cache.get(key)
+        if data is None:
+            data = build()
+            cache.set(key, data, get_tree_cache_setting('TREE_CACHE_TTL'))
+        response = HttpResponseNotModified() if '*' in etags else Response(data)
+    response['ETag'] = etag
+    # O navegador sempre revalida; a resposta é a mesma para todos os usuários
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 # Create a router and register our viewsets
 router = DefaultRouter()
@@ -9,8 +9,13 @@ router.register(r'project-nodes', views.ProjectNodeViewSet, basename='projectnod
 router.register(r'connections', views.ConnectionViewSet, basename='connection')
 router.register(r'queries', views.QueryViewSet, basename='query')
 router.register(r'parameters', views.ParameterViewSet, basename='parameter')
+router.register(r'export-jobs', views.ExportJobViewSet, basename='exportjob')
+router.register(r'export-artifacts', views.ExportArtifactViewSet, basename='exportartifact')
 
 urlpatterns = [
+    # Execução assíncrona (antes do router, que trataria execute-async como pk)
+    path('queries/execute-async/', async_views.execute_query_async, name='execute_query_async'),
+    
     path('', include(router.urls)),
     
     # Custom endpoints (a serem implementados)
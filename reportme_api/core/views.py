@@ -1,8 +1,9 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, mixins, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db import transaction, connection
 from django.db import models
@@ -13,19 +14,49 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample
 import json
+import logging
 
-from .models import Project, ProjectNode, Query, Connection, Parameter, QueryExecution
+from .models import Project, ProjectNode, Query, Connection, Parameter, QueryExecution, ExportJob
 from .serializers import (
     ProjectSerializer, ProjectListSerializer, ProjectTreeSerializer,
     ProjectNodeSerializer, ProjectNodeCreateSerializer,
     ConnectionSerializer, ConnectionListSerializer, ConnectionTestSerializer,
     QuerySerializer, QueryListSerializer, QueryCreateSerializer,
-    QueryExecutionSerializer, QueryValidationSerializer,
-    ParameterSerializer
+    QueryExecutionSerializer, QueryFanOutExportSerializer, QueryValidationSerializer,
+    ParameterSerializer, ExportJobSerializer, ExportJobCreateSerializer,
+    ProjectNodeExportSerializer
 )
+from .connection_pool import get_pools_stats
+from .streaming import CopyCSVQuery, StreamingQuery, stream_json_result
+from .exporters import (
+    COMPRESSIBLE_FORMATS, COMPRESSIONS, EXPORT_FORMATS, NDJSON_CONTENT_TYPE, check_compression, check_export_format,
+    compress_chunks, export_metadata, negotiate_compression, stream_copy_csv, stream_csv, stream_ndjson,
+    use_copy_csv,
+)
+from .export_jobs import export_content_type, export_file_extension, submit_export_job
+from .bulk_export import BulkExport, collect_reports
+from .downloads import file_download_response
+from .fanout import fan_out
+from .partitioning import PartitionedQuery, is_partitioned
+from .artifacts import (
+    ArtifactWriter, ExportArtifact, get_artifact, get_artifact_setting, is_artifact_enabled,
+    list_artifacts, purge_artifacts, tee_to_artifact,
+)
+from .dialects import (
+    ESTIMATE_SGBDS, WINDOW_COUNT_SGBDS, QueryTimeoutError, count_sql, estimate_sql,
+    get_effective_timeout, keyset_sql, limit_sql, paginate_sql, parse_row_estimate, prepare_query,
+)
+from .keyset import decode_cursor, encode_cursor, key_column_indexes, parse_order_by
+from .snapshots import ResultSnapshot, SnapshotTooLargeError
+from .result_formats import ColumnarJSONRenderer, NDJSONRenderer, to_columnar
+from .result_cache import get_cached_result, get_cached_total, set_cached_result, set_cached_total
+from .tree_cache import cached_tree_response
 from authentication.decorators import require_permission
+from authentication.permissions import IsAdminUser
 from authentication.audit import log_user_action
 
+logger = logging.getLogger(__name__)
+
 
 @extend_schema(
     tags=['system'],
@@ -234,7 +265,11 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Permitir visualização para todos os usuários autenticados (portal de leitura)"""
         # Removida verificação de permissão para permitir acesso de leitura a todos os projetos
-        return super().retrieve(request, *args, **kwargs)
+        # Guardado pela versão da árvore do projeto (ETag / 304)
+        return cached_tree_response(
+            request, 'project', kwargs.get('pk'),
+            lambda: super(ProjectViewSet, self).retrieve(request, *args, **kwargs).data
+        )
     
     @extend_schema(
         tags=['projects'],
@@ -276,13 +311,15 @@ class ProjectViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def tree(self, request, pk=None):
         """Endpoint para obter árvore completa do projeto"""
-        project = self.get_object()
-        
         # Para o portal de leitura, todos os usuários autenticados podem ver a árvore
         # A verificação de permissão foi removida para permitir acesso de leitura
         
-        serializer = ProjectTreeSerializer(project, context={'request': request})
-        return Response(serializer.data)
+        # Árvore inalterada: uma leitura do cache (e 304 com If-None-Match)
+        def build():
+            project = self.get_object()
+            return ProjectTreeSerializer(project, context={'request': request}).data
+        
+        return cached_tree_response(request, 'tree', pk, build)
     
     @action(detail=True, methods=['post'])
     def duplicate(self, request, pk=None):
@@ -456,6 +493,18 @@ class ProjectNodeViewSet(viewsets.ModelViewSet):
                 details=f"Excluído nó: {node_name} do projeto {project_name}"
             )
     
+    def list(self, request, *args, **kwargs):
+        """Nós de um projeto (?project=) guardados pela versão da árvore (ETag / 304)"""
+        project_id = request.query_params.get('project')
+        if not project_id:
+            return super().list(request, *args, **kwargs)
+        # Filtros, busca, página e host (links de paginação) mudam a resposta
+        return cached_tree_response(
+            request, 'nodes', project_id,
+            lambda: super(ProjectNodeViewSet, self).list(request, *args, **kwargs).data,
+            variant=request.build_absolute_uri()
+        )
+    
     def retrieve(self, request, *args, **kwargs):
         """Permitir visualização para todos os usuários autenticados (portal de leitura)"""
         # Removida verificação de permissão para permitir acesso de leitura a todos os nós
@@ -521,6 +570,98 @@ class ProjectNodeViewSet(viewsets.ModelViewSet):
         serializer = ProjectNodeSerializer(node, context={'request': request})
         return Response(serializer.data)
     
+    @action(detail=True, methods=['post'])
+    def export(self, request, pk=None):
+        """
+        Exportar todos os relatórios da pasta (nó e descendentes) em um único
+        arquivo: Excel com uma aba por relatório ou ZIP de CSVs
+        
+        As consultas são executadas em paralelo (ver core/bulk_export.py).
+        """
+        import tempfile
+        from django.http import FileResponse, StreamingHttpResponse
+        
+        node = self.get_object()
+        
+        if not request.user.can_view_project(node.project):
+            return Response(
+                {"error": "Você não tem permissão para exportar este projeto"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = ProjectNodeExportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        export_format = serializer.validated_data['format']
+        
+        reports = collect_reports(node)
+        if not reports:
+            return Response(
+                {"error": "Nenhum relatório encontrado nesta pasta"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        for report in reports:
+            if not request.user.can_view_connection(report.query.connection):
+                report.error = PermissionError("Você não tem permissão para executar esta consulta")
+        
+        bulk_export = BulkExport(
+            reports,
+            parameters=serializer.validated_data['parameters'],
+            limit=serializer.validated_data['limit']
+        )
+        
+        def on_complete(reports):
+            self._record_bulk_export(
+                node, reports, request.user, export_format, serializer.validated_data['parameters']
+            )
+        
+        if export_format == 'zip':
+            response = StreamingHttpResponse(
+                bulk_export.stream_zip(on_complete=on_complete),
+                content_type='application/zip'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{node.name}_export.zip"'
+            return response
+        
+        output = tempfile.TemporaryFile()
+        try:
+            bulk_export.write_xlsx(output)
+        except Exception as e:
+            output.close()
+            return Response({
+                'error': f'Erro na exportação: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        on_complete(reports)
+        output.seek(0)
+        
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f"{node.name}_export.xlsx",
+            content_type=EXPORT_FORMATS['excel'].content_type
+        )
+    
+    def _record_bulk_export(self, node, reports, user, export_format, parameters):
+        """Registrar a execução de cada relatório da exportação em lote"""
+        for report in reports:
+            if isinstance(report.error, PermissionError):
+                continue
+            QueryExecution.objects.create(
+                query=report.query,
+                user=user,
+                status=report.status,
+                execution_time=report.execution_time,
+                rows_returned=report.rows,
+                error_message=str(report.error) if report.error else '',
+                parameters=parameters
+            )
+        
+        failed = sum(1 for report in reports if report.error is not None)
+        log_user_action(
+            user=user,
+            action='export_query',
+            details=f"Exportada pasta: {node.name} ({export_format}) - {len(reports)} relatórios, {failed} com erro"
+        )
+    
     @action(detail=True, methods=['post'])
     def duplicate(self, request, pk=None):
         """Duplicar nó e sua subárvore"""
@@ -990,7 +1131,23 @@ class ConnectionViewSet(viewsets.ModelViewSet):
             )
             
             return Response(error_result, status=status.HTTP_400_BAD_REQUEST)
-    
+
+    @extend_schema(
+        tags=['connections'],
+        summary='Estatísticas das pools de conexão',
+        description='Obter o estado das pools de conexão do worker atual (conexões ociosas, em uso, criadas, reutilizadas)',
+    )
+    @action(detail=False, methods=['get'], url_path='pool-stats')
+    def pool_stats(self, request):
+        """Endpoint para monitorar as pools de conexão do processo atual"""
+        if not (request.user.is_superuser or request.user.is_admin):
+            return Response(
+                {"error": "Apenas administradores podem visualizar as pools de conexão"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        return Response(get_pools_stats())
+
     @action(detail=True, methods=['post'])
     def duplicate(self, request, pk=None):
         """Duplicar conexão"""
@@ -1324,6 +1481,16 @@ class QueryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at', 'updated_at']
     ordering = ['-created_at']
     
+    # ?format=columnar seleciona o formato colunar nas actions que retornam
+    # resultados (COLUMNAR_ACTIONS; execute-async trata o parâmetro na própria
+    # view) e ?format=ndjson (ou Accept: application/x-ndjson) o envio em
+    # NDJSON nas actions que geram NDJSON (NDJSON_ACTIONS)
+    COLUMNAR_ACTIONS = ['execute', 'execute_paginated']
+    NDJSON_ACTIONS = ['execute', 'export_query_results']
+    
+    # Modos de contagem do total em execute-paginated
+    COUNT_MODES = ['exact', 'window', 'estimated']
+    
     def get_queryset(self):
         """Filtrar consultas baseado nas permissões do usuário"""
         user = self.request.user
@@ -1332,13 +1499,31 @@ class QueryViewSet(viewsets.ModelViewSet):
         # A segregação por usuário será implementada posteriormente se necessário
         return Query.objects.all()
     
+    def get_renderers(self):
+        """
+        Formato colunar apenas nas execuções e NDJSON apenas em execute e
+        export (nas demais actions: 404 com ?format=, 406 com Accept)
+        """
+        renderers = super().get_renderers()
+        if self.action in self.COLUMNAR_ACTIONS:
+            renderers.append(ColumnarJSONRenderer())
+        if self.action in self.NDJSON_ACTIONS:
+            renderers.append(NDJSONRenderer())
+        return renderers
+    
+    def get_serializer_context(self):
+        """Respostas NDJSON aceitam limites maiores (NDJSON_MAX_ROWS)"""
+        context = super().get_serializer_context()
+        context['ndjson'] = self._is_ndjson(self.request)
+        return context
+    
     def get_serializer_class(self):
         """Escolher serializer baseado na action"""
         if self.action == 'list':
             return QueryListSerializer
         elif self.action in ['create', 'update', 'partial_update']:
             return QueryCreateSerializer
-        elif self.action == 'execute':
+        elif self.action in ['execute', 'execute_paginated']:
             return QueryExecutionSerializer
         elif self.action == 'validate':
             return QueryValidationSerializer
@@ -1448,10 +1633,18 @@ class QueryViewSet(viewsets.ModelViewSet):
         query_id = serializer.validated_data['query_id']
         parameters = serializer.validated_data.get('parameters', {})
         limit = serializer.validated_data.get('limit', 100)
+        stream = serializer.validated_data.get('stream', False)
         print("***1")
         try:
             query = Query.objects.get(id=query_id)
             print("***2")
+            if self._is_ndjson(request):
+                # Uma linha JSON por registro, enviada lote a lote (clientes ETL)
+                return self._execute_query_ndjson(query, parameters, limit, request.user)
+            if stream:
+                # Resposta enviada em lotes a partir do cursor do servidor
+                return self._execute_query_streaming(query, parameters, limit, request.user)
+            
             # Executar consulta
             result = self._execute_query(query, parameters, limit, request.user)
             print("***3")
@@ -1462,7 +1655,7 @@ class QueryViewSet(viewsets.ModelViewSet):
                 details=f"Executada consulta: {query.name} - {result['total_records']} registros"
             )
             
-            return Response(result)
+            return Response(self._format_result(request, result))
             
         except Exception as e:
             log_user_action(
@@ -1471,11 +1664,7 @@ class QueryViewSet(viewsets.ModelViewSet):
                 details=f"Erro ao executar consulta ID {query_id}: {str(e)}"
             )
             
-            return Response({
-                'success': False,
-                'error': str(e),
-                'timestamp': timezone.now().isoformat()
-            }, status=status.HTTP_400_BAD_REQUEST)
+            return self._execution_error_response(e)
     
     @action(detail=False, methods=['post'], url_path='validate')
     def validate_query(self, request):
@@ -1609,7 +1798,8 @@ class QueryViewSet(viewsets.ModelViewSet):
                 'execution_time': execution.execution_time,
                 'rows_returned': execution.rows_returned,
                 'error_message': execution.error_message,
-                'parameters': execution.parameters
+                'parameters': execution.parameters,
+                'cache_hit': execution.cache_hit
             })
         
         # Estatísticas
@@ -1640,14 +1830,19 @@ class QueryViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'], url_path='export')
     def export_query_results(self, request):
-        """Exportar resultados de consulta para Excel/CSV"""
-        serializer = QueryExecutionSerializer(data=request.data)
+        """Exportar resultados de consulta para Excel/CSV (ou vários formatos com formats)"""
+        format_type = request.data.get('format', 'excel')  # excel, csv, ndjson, parquet, arrow
+        fanout = 'formats' in request.data
+        serializer_class = QueryFanOutExportSerializer if fanout else QueryExecutionSerializer
+        serializer = serializer_class(data=request.data, context={
+            'request': request,
+            'ndjson': str(format_type).lower() == 'ndjson'
+        })
         serializer.is_valid(raise_exception=True)
         
         query_id = serializer.validated_data['query_id']
         parameters = serializer.validated_data.get('parameters', {})
         limit = serializer.validated_data.get('limit', 1000)
-        format_type = request.data.get('format', 'excel')  # excel, csv
         
         try:
             query = Query.objects.get(id=query_id)
@@ -1658,74 +1853,70 @@ class QueryViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Executar consulta
-            result = self._execute_query(query, parameters, limit, request.user)
-            
-            if not result['success']:
-                return Response({
-                    'error': 'Erro ao executar consulta para exportação'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Preparar dados para exportação
-            import pandas as pd
-            from django.http import HttpResponse
-            import io
-            
-            # Criar DataFrame
-            df = pd.DataFrame(result['rows'], columns=result['columns'])
-            
-            # Gerar arquivo
-            if format_type.lower() == 'csv':
-                # Exportar CSV
-                output = io.StringIO()
-                df.to_csv(output, index=False, encoding='utf-8')
-                output.seek(0)
-                
-                response = HttpResponse(
-                    output.getvalue(), 
-                    content_type='text/csv; charset=utf-8'
-                )
-                response['Content-Disposition'] = f'attachment; filename="{query.name}_export.csv"'
-                
-            else:
-                # Exportar Excel
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df.to_excel(writer, sheet_name='Dados', index=False)
-                    
-                    # Adicionar metadados
-                    metadata_df = pd.DataFrame([
-                        ['Consulta', query.name],
-                        ['Executado em', timezone.now().strftime('%d/%m/%Y %H:%M:%S')],
-                        ['Usuário', request.user.get_full_name()],
-                        ['Registros', len(result['rows'])],
-                        ['Tempo de execução', f"{result['execution_time_ms']}ms"]
-                    ], columns=['Campo', 'Valor'])
-                    
-                    metadata_df.to_excel(writer, sheet_name='Metadados', index=False)
+            try:
+                if fanout:
+                    return self._export_fanout(
+                        query, parameters, limit, request.user, serializer.validated_data['formats'],
+                        serializer.validated_data['bundle'], request
+                    )
                 
-                output.seek(0)
+                if format_type.lower() in ('csv', 'ndjson'):
+                    # CSV/NDJSON enviado em lotes a partir do cursor, sem materializar o resultado;
+                    # comprimido se pedido (compression) ou aceito pelo cliente (Accept-Encoding)
+                    format_type = format_type.lower()
+                    compression = request.data.get('compression')
+                    if compression:
+                        compression = None if compression == 'none' else compression
+                        return self._export_streaming(
+                            query, parameters, limit, request.user, format_type,
+                            compression=compression, request=request
+                        )
+                    return self._export_streaming(
+                        query, parameters, limit, request.user, format_type, request=request,
+                        compression=negotiate_compression(request.META.get('HTTP_ACCEPT_ENCODING')),
+                        content_encoding=True
+                    )
                 
-                response = HttpResponse(
-                    output.getvalue(),
-                    content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-                response['Content-Disposition'] = f'attachment; filename="{query.name}_export.xlsx"'
-            
-            # Log da exportação
-            log_user_action(
-                user=request.user,
-                action='export_query',
-                details=f"Exportada consulta: {query.name} ({format_type}) - {len(result['rows'])} registros"
-            )
-            
-            return response
+                # Excel (openpyxl write-only), Parquet ou Arrow gravado em arquivo temporário
+                if format_type.lower() not in EXPORT_FORMATS:
+                    format_type = 'excel'
+                return self._export_file(query, parameters, limit, request.user, format_type.lower(), request)
+            except Exception as e:
+                return Response({
+                    'error': f'Erro ao executar consulta para exportação: {str(e)}'
+                }, status=status.HTTP_400_BAD_REQUEST)
             
         except Exception as e:
             return Response({
                 'error': f'Erro na exportação: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @extend_schema(
+        tags=['queries'],
+        summary='Download de exportação',
+        description='Baixar (ou retomar com Range) um arquivo exportado, pelo endereço informado em Content-Location'
+    )
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<key>[0-9a-f]{64})', url_name='export-download')
+    def export_download(self, request, key=None):
+        """Baixar um artefato de exportação (suporta Range, If-Range e ETag)"""
+        artifact = ExportArtifact.load(key)
+        if artifact is None or artifact.expired:
+            return Response({'error': 'O arquivo desta exportação expirou'}, status=status.HTTP_410_GONE)
+        
+        query = get_object_or_404(Query.objects.select_related('connection'), id=artifact.meta['query_id'])
+        if not request.user.can_view_connection(query.connection):
+            return Response(
+                {"error": "Você não tem permissão para exportar esta consulta"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            return file_download_response(
+                request, artifact.path, f"{query.name}_export.{artifact.extension}", artifact.content_type
+            )
+        except OSError:
+            return Response({'error': 'O arquivo desta exportação expirou'}, status=status.HTTP_410_GONE)
+    
     @action(detail=False, methods=['post'], url_path='execute-paginated')
     def execute_paginated(self, request):
         """Executar consulta SQL com paginação"""
@@ -1736,10 +1927,18 @@ class QueryViewSet(viewsets.ModelViewSet):
         parameters = serializer.validated_data.get('parameters', {})
         page = request.data.get('page', 1)
         page_size = request.data.get('page_size', 50)
+        count_mode = request.data.get('count_mode', self._default_count_mode())
+        pagination_mode = request.data.get('pagination_mode', 'offset')
+        snapshot_id = request.data.get('snapshot_id')
+        use_snapshot = bool(request.data.get('snapshot', False) or snapshot_id)
         
         # Validar page_size
         if page_size not in [10, 50, 100]:
             page_size = 50
+        
+        # Validar modo de contagem do total
+        if count_mode not in self.COUNT_MODES:
+            count_mode = self._default_count_mode()
             
         try:
             query = Query.objects.get(id=query_id)
@@ -1751,9 +1950,17 @@ class QueryViewSet(viewsets.ModelViewSet):
                 )
             
             # Executar consulta com paginação
-            result = self._execute_query_paginated(query, parameters, page, page_size, request.user)
+            if pagination_mode == 'keyset':
+                result = self._execute_query_keyset(
+                    query, parameters, request.data.get('order_by'), request.data.get('cursor'),
+                    page_size, request.user
+                )
+            elif use_snapshot:
+                result = self._execute_query_snapshot(query, parameters, page, page_size, request.user, snapshot_id)
+            else:
+                result = self._execute_query_paginated(query, parameters, page, page_size, request.user, count_mode)
             
-            return Response(result)
+            return Response(self._format_result(request, result))
             
         except Exception as e:
             log_user_action(
@@ -1762,55 +1969,79 @@ class QueryViewSet(viewsets.ModelViewSet):
                 details=f"Erro ao executar consulta paginada ID {query_id}: {str(e)}"
             )
             
-            return Response({
-                'success': False,
-                'error': str(e),
-                'timestamp': timezone.now().isoformat()
-            }, status=status.HTTP_400_BAD_REQUEST)
+            return self._execution_error_response(e)
     
-    def _execute_query_paginated(self, query, parameters, page, page_size, user):
-        """Executar consulta SQL com paginação"""
+    def _execute_query_paginated(self, query, parameters, page, page_size, user, count_mode='exact'):
+        """
+        Executar consulta SQL com paginação
+        
+        O total de registros é calculado uma vez por (consulta, parâmetros) e
+        reaproveitado nas páginas seguintes. count_mode define como ele é obtido
+        na primeira página:
+        - exact: COUNT(*) separado sobre a consulta
+        - window: COUNT(*) OVER() na própria consulta da página (uma ida ao banco)
+        - estimated: estimativa do otimizador, sem percorrer o resultado
+        SGBDs sem suporte ao modo escolhido usam exact.
+        """
         import time
-        from django.core.cache import cache
         
         start_time = time.time()
         
+        # Página já em cache (Query.cache_duration)
+        cache_variant = ('page', page, page_size, count_mode)
+        cached_result = self._get_cached_execution(query, parameters, cache_variant, user)
+        if cached_result is not None:
+            return cached_result
+        
         try:
-            # Substituir parâmetros na consulta
-            sql_query = self._replace_query_parameters(query.query, parameters)
-            
-            # Adicionar OFFSET e LIMIT para paginação
+            sgbd = query.connection.sgbd
             offset = (page - 1) * page_size
             
-            # Adaptar paginação por tipo de banco
-            if query.connection.sgbd == 'sqlserver':
-                # SQL Server usa OFFSET/FETCH
-                sql_query += f" OFFSET {offset} ROWS FETCH NEXT {page_size} ROWS ONLY"
-            elif query.connection.sgbd == 'oracle':
-                # Oracle usa ROWNUM (mais complexo)
-                sql_query = f"SELECT * FROM (SELECT a.*, ROWNUM rnum FROM ({sql_query}) a WHERE ROWNUM <= {offset + page_size}) WHERE rnum > {offset}"
-            else:
-                # PostgreSQL, MySQL, SQLite usam LIMIT/OFFSET
-                sql_query += f" LIMIT {page_size} OFFSET {offset}"
-            
-            # Obter conexão de banco
-            db_connection = self._get_database_connection(query.connection)
+            # Total já calculado em uma página anterior (exato tem preferência)
+            total_records = get_cached_total(query, parameters, 'exact')
+            total_is_estimate = False
+            if total_records is None and count_mode == 'estimated':
+                total_records = get_cached_total(query, parameters, 'estimated')
+                total_is_estimate = total_records is not None
             
-            # Executar consulta principal
-            cursor = db_connection.cursor()
-            cursor.execute(sql_query)
-            columns = [desc[0] for desc in cursor.description] if cursor.description else []
-            rows = cursor.fetchall()
+            with_total = total_records is None and count_mode == 'window' and sgbd in WINDOW_COUNT_SGBDS
             
-            # Contar total de registros (sem paginação)
-            count_query = self._replace_query_parameters(query.query, parameters)
-            count_sql = f"SELECT COUNT(*) as total FROM ({count_query}) as count_table"
-            
-            cursor.execute(count_sql)
-            total_records = cursor.fetchone()[0]
+            # Adicionar OFFSET e LIMIT para paginação (também como parâmetros)
+            sql_query, sql_params = self._prepare_sql(
+                query, paginate_sql(query.query, sgbd, with_total=with_total), parameters,
+                reportme_limit=page_size, reportme_offset=offset, reportme_end=offset + page_size
+            )
             
-            cursor.close()
-            db_connection.close()
+            # Executar consulta principal (conexão devolvida à pool ao final do bloco)
+            with StreamingQuery(query.connection, sql_query, sql_params, timeout=get_effective_timeout(query)) as stream:
+                columns = stream.columns
+                column_types = stream.column_types
+                rows = stream.fetch_all()
+                
+                if with_total:
+                    # Total vem na última coluna de cada linha
+                    columns = columns[:-1]
+                    column_types = column_types[:-1]
+                    if rows:
+                        total_records = rows[0][-1]
+                        rows = [row[:-1] for row in rows]
+                    elif offset == 0:
+                        total_records = 0
+                
+                if total_records is None and count_mode == 'estimated' and sgbd in ESTIMATE_SGBDS:
+                    estimate_query, estimate_params = self._prepare_sql(query, estimate_sql(query.query, sgbd), parameters)
+                    total_records = parse_row_estimate(sgbd, stream.execute_scalar(estimate_query, estimate_params))
+                    if total_records is not None:
+                        total_is_estimate = True
+                        set_cached_total(query, parameters, 'estimated', total_records)
+                
+                if total_records is None:
+                    # Contar total de registros (sem paginação)
+                    count_query, count_params = self._prepare_sql(query, count_sql(query.query, sgbd), parameters)
+                    total_records = stream.execute_scalar(count_query, count_params)
+                
+                if not total_is_estimate:
+                    set_cached_total(query, parameters, 'exact', total_records)
             
             end_time = time.time()
             execution_time = round((end_time - start_time) * 1000, 2)
@@ -1823,7 +2054,8 @@ class QueryViewSet(viewsets.ModelViewSet):
             result = {
                 'success': True,
                 'columns': columns,
-                'rows': [list(row) for row in rows],
+                'column_types': column_types,
+                'rows': rows,
                 'pagination': {
                     'page': page,
                     'page_size': page_size,
@@ -1831,11 +2063,184 @@ class QueryViewSet(viewsets.ModelViewSet):
                     'total_pages': total_pages,
                     'has_next': has_next,
                     'has_previous': has_previous,
+                    'records_in_page': len(rows),
+                    'total_is_estimate': total_is_estimate
+                },
+                'execution_time_ms': execution_time,
+                'timestamp': timezone.now().isoformat(),
+                'cache_hit': False
+            }
+            set_cached_result(query, parameters, cache_variant, result, len(rows))
+            
+            # Salvar execução no histórico
+            QueryExecution.objects.create(
+                query=query,
+                user=user,
+                status='success',
+                execution_time=execution_time / 1000,
+                rows_returned=len(rows),
+                parameters=parameters
+            )
+            
+            return result
+            
+        except Exception as e:
+            end_time = time.time()
+            execution_time = round((end_time - start_time) * 1000, 2)
+            
+            # Salvar execução com erro (ou timeout)
+            QueryExecution.objects.create(
+                query=query,
+                user=user,
+                status='timeout' if isinstance(e, QueryTimeoutError) else 'error',
+                execution_time=execution_time / 1000,
+                error_message=str(e),
+                parameters=parameters
+            )
+            
+            raise e
+
+    def _execute_query_snapshot(self, query, parameters, page, page_size, user, snapshot_id=None):
+        """
+        Executar consulta SQL com paginação a partir de um snapshot local
+        
+        A primeira chamada executa a consulta completa e grava o resultado em
+        disco (snapshots.ResultSnapshot); as chamadas com o snapshot_id
+        devolvido leem apenas a página pedida do arquivo, sem consultar o banco
+        de origem. Snapshot expirado é recriado; resultado acima dos limites
+        usa a paginação normal.
+        """
+        import time
+        
+        start_time = time.time()
+        snapshot = ResultSnapshot.open(snapshot_id, query, parameters, user)
+        from_snapshot = snapshot is not None
+        
+        if snapshot is None:
+            try:
+                if is_partitioned(query):
+                    stream = PartitionedQuery(query, parameters, timeout=get_effective_timeout(query))
+                else:
+                    sql_query, sql_params = self._prepare_sql(query, query.query, parameters)
+                    stream = StreamingQuery(query.connection, sql_query, sql_params, timeout=get_effective_timeout(query))
+                with stream:
+                    snapshot = ResultSnapshot.create(stream, query, parameters, user)
+            except SnapshotTooLargeError as e:
+                logger.info(f"Snapshot não criado para a consulta {query.pk}: {e}")
+                return self._execute_query_paginated(query, parameters, page, page_size, user)
+            except Exception as e:
+                QueryExecution.objects.create(
+                    query=query,
+                    user=user,
+                    status='timeout' if isinstance(e, QueryTimeoutError) else 'error',
+                    execution_time=round(time.time() - start_time, 3),
+                    error_message=str(e),
+                    parameters=parameters
+                )
+                raise e
+        
+        rows = snapshot.page((page - 1) * page_size, page_size)
+        total_records = snapshot.row_count
+        total_pages = (total_records + page_size - 1) // page_size
+        execution_time = round((time.time() - start_time) * 1000, 2)
+        
+        # Leitura do snapshot é registrada como cache hit (sem acesso à origem)
+        QueryExecution.objects.create(
+            query=query,
+            user=user,
+            status='success',
+            execution_time=execution_time / 1000,
+            rows_returned=len(rows),
+            parameters=parameters,
+            cache_hit=from_snapshot
+        )
+        
+        return {
+            'success': True,
+            'columns': snapshot.columns,
+            'column_types': snapshot.column_types,
+            'rows': rows,
+            'pagination': {
+                'page': page,
+                'page_size': page_size,
+                'total_records': total_records,
+                'total_pages': total_pages,
+                'has_next': page < total_pages,
+                'has_previous': page > 1,
+                'records_in_page': len(rows),
+                'total_is_estimate': False
+            },
+            'snapshot': {
+                'id': snapshot.snapshot_id,
+                'expires_at': snapshot.expires_at.isoformat()
+            },
+            'execution_time_ms': execution_time,
+            'timestamp': timezone.now().isoformat(),
+            'cache_hit': from_snapshot
+        }
+
+    def _execute_query_keyset(self, query, parameters, order_by, cursor, page_size, user):
+        """
+        Executar consulta SQL com paginação por keyset
+        
+        A consulta é ordenada por order_by e cada página continua a partir do
+        cursor devolvido na página anterior (sem OFFSET nem contagem do total).
+        """
+        import time
+        
+        start_time = time.time()
+        key_columns = parse_order_by(order_by)
+        key_values = decode_cursor(cursor, query, key_columns, parameters) if cursor else []
+        
+        # Página já em cache (Query.cache_duration)
+        cache_variant = ('keyset', key_columns, cursor, page_size)
+        cached_result = self._get_cached_execution(query, parameters, cache_variant, user)
+        if cached_result is not None:
+            return cached_result
+        
+        try:
+            # Uma linha a mais indica se existe próxima página
+            key_params = {f"reportme_key_{index}": value for index, value in enumerate(key_values)}
+            sql_query, sql_params = self._prepare_sql(
+                query, keyset_sql(query.query, query.connection.sgbd, key_columns, after=bool(cursor)), parameters,
+                reportme_limit=page_size + 1, **key_params
+            )
+            
+            with StreamingQuery(query.connection, sql_query, sql_params, timeout=get_effective_timeout(query)) as stream:
+                columns = stream.columns
+                column_types = stream.column_types
+                rows = stream.fetch_all()
+            
+            has_next = len(rows) > page_size
+            rows = rows[:page_size]
+            
+            next_cursor = None
+            if has_next:
+                indexes = key_column_indexes(columns, key_columns)
+                next_cursor = encode_cursor(query, key_columns, parameters, [rows[-1][index] for index in indexes])
+            
+            end_time = time.time()
+            execution_time = round((end_time - start_time) * 1000, 2)
+            
+            result = {
+                'success': True,
+                'columns': columns,
+                'column_types': column_types,
+                'rows': rows,
+                'pagination': {
+                    'mode': 'keyset',
+                    'page_size': page_size,
+                    'order_by': [f"{'-' if descending else ''}{column}" for column, descending in key_columns],
+                    'has_next': has_next,
+                    'has_previous': bool(cursor),
+                    'next_cursor': next_cursor,
                     'records_in_page': len(rows)
                 },
                 'execution_time_ms': execution_time,
-                'timestamp': timezone.now().isoformat()
+                'timestamp': timezone.now().isoformat(),
+                'cache_hit': False
             }
+            set_cached_result(query, parameters, cache_variant, result, len(rows))
             
             # Salvar execução no histórico
             QueryExecution.objects.create(
@@ -1853,11 +2258,11 @@ class QueryViewSet(viewsets.ModelViewSet):
             end_time = time.time()
             execution_time = round((end_time - start_time) * 1000, 2)
             
-            # Salvar execução com erro
+            # Salvar execução com erro (ou timeout)
             QueryExecution.objects.create(
                 query=query,
                 user=user,
-                status='error',
+                status='timeout' if isinstance(e, QueryTimeoutError) else 'error',
                 execution_time=execution_time / 1000,
                 error_message=str(e),
                 parameters=parameters
@@ -1868,39 +2273,25 @@ class QueryViewSet(viewsets.ModelViewSet):
     def _execute_query(self, query, parameters, limit, user):
         """Executar consulta SQL sem paginação"""
         import time
-        from django.core.cache import cache
         
         start_time = time.time()
         
+        # Resultado já em cache (Query.cache_duration)
+        cache_variant = ('execute', limit)
+        cached_result = self._get_cached_execution(query, parameters, cache_variant, user)
+        if cached_result is not None:
+            return cached_result
+        
         try:
-            print(f'**DEBUG - Query original: {query.query}')
-            print(f'**DEBUG - Parâmetros recebidos: {parameters}')
-            
-            # Substituir parâmetros na consulta
-            sql_query = self._replace_query_parameters(query.query, parameters)
-            print(f'**DEBUG - Query após substituição: {sql_query}')
-            
-            # Adicionar LIMIT se especificado
-            if limit and limit > 0:
-                if query.connection.sgbd == 'sqlserver':
-                    sql_query = f"SELECT TOP {limit} * FROM ({sql_query}) as limited_query"
-                elif query.connection.sgbd == 'oracle':
-                    sql_query = f"SELECT * FROM ({sql_query}) WHERE ROWNUM <= {limit}"
-                else:
-                    sql_query += f" LIMIT {limit}"
-            print('**7')
-            # Obter conexão de banco
-            db_connection = self._get_database_connection(query.connection)
-            print('**8')
-            # Executar consulta
-            cursor = db_connection.cursor()
-            print('**9')
-            cursor.execute(sql_query)
-            columns = [desc[0] for desc in cursor.description] if cursor.description else []
-            rows = cursor.fetchall()
-            print('**10')
-            cursor.close()
-            db_connection.close()
+            # Compilar parâmetros e adicionar LIMIT
+            sql_query, sql_params = self._build_limited_sql(query, parameters, limit)
+            logger.debug(f"Consulta {query.pk} compilada: {sql_query}")
+            
+            # Executar consulta lendo em lotes (conexão devolvida à pool ao final do bloco)
+            with StreamingQuery(query.connection, sql_query, sql_params, timeout=get_effective_timeout(query)) as stream:
+                columns = stream.columns
+                column_types = stream.column_types
+                rows = stream.fetch_all()
             
             end_time = time.time()
             execution_time = round((end_time - start_time) * 1000, 2)
@@ -1908,11 +2299,14 @@ class QueryViewSet(viewsets.ModelViewSet):
             result = {
                 'success': True,
                 'columns': columns,
-                'rows': [list(row) for row in rows],
+                'column_types': column_types,
+                'rows': rows,
                 'total_records': len(rows),
                 'execution_time_ms': execution_time,
-                'timestamp': timezone.now().isoformat()
+                'timestamp': timezone.now().isoformat(),
+                'cache_hit': False
             }
+            set_cached_result(query, parameters, cache_variant, result, len(rows))
             
             # Salvar execução no histórico
             QueryExecution.objects.create(
@@ -1929,14 +2323,12 @@ class QueryViewSet(viewsets.ModelViewSet):
         except Exception as e:
             end_time = time.time()
             execution_time = round((end_time - start_time) * 1000, 2)
-            print(f"Erro na execução da query: {str(e)}")
-            print(f"SQL executado: {sql_query}")
-            print(f"Parâmetros: {parameters}")
-            # Salvar execução com erro
+            logger.error(f"Erro na execução da consulta {query.pk} ({query.name}): {e}")
+            # Salvar execução com erro (ou timeout)
             QueryExecution.objects.create(
                 query=query,
                 user=user,
-                status='error',
+                status='timeout' if isinstance(e, QueryTimeoutError) else 'error',
                 execution_time=execution_time / 1000,
                 error_message=str(e),
                 parameters=parameters
@@ -1944,120 +2336,415 @@ class QueryViewSet(viewsets.ModelViewSet):
             
             raise e
 
-    def _get_database_connection(self, connection):
-        """Obter conexão com banco de dados"""
-        if connection.sgbd == 'postgresql':
-            return self._get_postgresql_connection(connection)
-        elif connection.sgbd == 'mysql':
-            return self._get_mysql_connection(connection)
-        elif connection.sgbd == 'sqlserver':
-            return self._get_sqlserver_connection(connection)
-        elif connection.sgbd == 'oracle':
-            return self._get_oracle_connection(connection)
-        elif connection.sgbd == 'sqlite':
-            return self._get_sqlite_connection(connection)
+    def _default_count_mode(self):
+        """Modo de contagem padrão (REPORTME_SETTINGS['PAGINATION_COUNT_MODE'])"""
+        return getattr(settings, 'REPORTME_SETTINGS', {}).get('PAGINATION_COUNT_MODE', 'exact')
+
+    def _get_cached_execution(self, query, parameters, variant, user):
+        """Obter resultado do cache e registrar a execução como cache hit"""
+        cached = get_cached_result(query, parameters, variant)
+        if cached is None:
+            return None
+        
+        result = dict(cached)
+        result['cache_hit'] = True
+        result['timestamp'] = timezone.now().isoformat()
+        
+        rows_returned = len(result.get('rows', []))
+        QueryExecution.objects.create(
+            query=query,
+            user=user,
+            status='success',
+            execution_time=0,
+            rows_returned=rows_returned,
+            parameters=parameters,
+            cache_hit=True
+        )
+        return result
+
+    def _execute_query_streaming(self, query, parameters, limit, user):
+        """Executar consulta SQL enviando as linhas em lotes (StreamingHttpResponse)"""
+        from django.http import StreamingHttpResponse
+        
+        stream, on_complete = self._open_stream(query, parameters, limit, user, 'execute_query', 'streaming')
+        
+        return StreamingHttpResponse(
+            stream_json_result(stream, on_complete=on_complete),
+            content_type='application/json'
+        )
+
+    def _execute_query_ndjson(self, query, parameters, limit, user):
+        """Executar consulta SQL enviando uma linha JSON por registro (application/x-ndjson)"""
+        from django.http import StreamingHttpResponse
+        
+        stream, on_complete = self._open_stream(query, parameters, limit, user, 'execute_query', 'ndjson')
+        
+        return StreamingHttpResponse(
+            stream_ndjson(stream, on_complete=on_complete),
+            content_type=NDJSON_CONTENT_TYPE
+        )
+
+    def _is_ndjson(self, request):
+        """Resposta em NDJSON (?format=ndjson ou Accept: application/x-ndjson)"""
+        renderer = getattr(request, 'accepted_renderer', None)
+        return renderer is not None and renderer.format == 'ndjson'
+
+    def _export_streaming(self, query, parameters, limit, user, format_type='csv', compression=None,
+                          content_encoding=False, request=None):
+        """
+        Exportar CSV ou NDJSON gerado lote a lote a partir do cursor (StreamingHttpResponse)
+        
+        Com compressão, cada lote é comprimido ao ser gerado: como arquivo
+        .csv.gz/.csv.zst (parâmetro compression) ou de forma transparente, com
+        Content-Encoding negociado pelo Accept-Encoding (content_encoding=True).
+        Sem compressão, um arquivo já armazenado como artefato é enviado do
+        disco, com Content-Length e o endereço de download (Content-Location).
+        No PostgreSQL o CSV é gerado pelo servidor (COPY ... TO STDOUT).
+        """
+        from django.http import StreamingHttpResponse
+        
+        if compression:
+            check_compression(compression)
+        export_format = EXPORT_FORMATS[format_type]
+        label = f'{format_type}+{compression}' if compression else format_type
+        
+        # O artefato guarda o arquivo sem compressão e atende qualquer Accept-Encoding
+        artifact = get_artifact(query, parameters, format_type, limit)
+        if artifact is not None:
+            self._record_artifact_hit(query, parameters, user, artifact, label)
+            if not compression and request is not None:
+                return self._artifact_response(request, query, artifact)
+            chunks = artifact.chunks()
         else:
-            raise ValueError(f"Tipo de banco de dados não suportado: {connection.sgbd}")
+            if format_type == 'csv' and use_copy_csv(query.connection) and not is_partitioned(query):
+                stream, on_complete = self._open_stream(
+                    query, parameters, limit, user, 'export_query', f'{label}, copy', stream_class=CopyCSVQuery
+                )
+                generate = stream_copy_csv
+            else:
+                stream, on_complete = self._open_stream(query, parameters, limit, user, 'export_query', label)
+                generate = stream_ndjson if format_type == 'ndjson' else stream_csv
+            if is_artifact_enabled(query):
+                writer = ArtifactWriter(query, parameters, format_type, limit)
+                chunks = tee_to_artifact(
+                    generate(stream, on_complete=self._artifact_on_complete(writer, on_complete)), writer
+                )
+            else:
+                chunks = generate(stream, on_complete=on_complete)
+        
+        filename = f"{query.name}_export.{export_format.extension}"
+        content_type = export_format.content_type
+        if compression:
+            chunks = compress_chunks(chunks, compression)
+            if not content_encoding:
+                extension, content_type = COMPRESSIONS[compression]
+                filename = f"{filename}.{extension}"
+        
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if compression and content_encoding:
+            response['Content-Encoding'] = compression
+        response['Vary'] = 'Accept-Encoding'
+        return response
 
-    def _get_postgresql_connection(self, connection):
-        """Conectar ao PostgreSQL"""
+    def _export_file(self, query, parameters, limit, user, format_type, request):
+        """
+        Exportar Excel (abas Dados e Metadados), Parquet ou Arrow lendo o cursor em lotes
+        
+        O arquivo é montado em um arquivo temporário, enviado em partes pelo
+        FileResponse e removido ao final da resposta. Se a consulta usa cache
+        (cache_duration), o arquivo é guardado como artefato e reaproveitado
+        pelas exportações seguintes com os mesmos parâmetros, e o download
+        pode ser retomado pelo endereço informado em Content-Location.
+        """
+        import tempfile
+        import time
+        from django.http import FileResponse
+        
+        start_time = time.time()
+        export_format = EXPORT_FORMATS[format_type]
+        check_export_format(format_type)
+        
+        artifact = get_artifact(query, parameters, format_type, limit)
+        if artifact is not None:
+            self._record_artifact_hit(query, parameters, user, artifact, format_type)
+            return self._artifact_response(request, query, artifact)
+        
+        stream, on_complete = self._open_stream(query, parameters, limit, user, 'export_query', format_type)
+        
+        def metadata(rows_written):
+            return export_metadata(query, user, rows_written, round((time.time() - start_time) * 1000, 2))
+        
+        if is_artifact_enabled(query):
+            writer = ArtifactWriter(query, parameters, format_type, limit)
+            try:
+                export_format.write(
+                    stream, writer.file, metadata=metadata,
+                    on_complete=self._artifact_on_complete(writer, on_complete)
+                )
+            except Exception:
+                writer.discard()
+                raise
+            return self._artifact_response(request, query, writer.commit())
+        
+        output = tempfile.TemporaryFile()
         try:
-            print('**12')
-            import psycopg2
-            return psycopg2.connect(
-                host=connection.host,
-                port=connection.port or 5432,
-                database=connection.database,
-                user=connection.user,
-                password=connection.password,
-                connect_timeout=30  # Timeout padrão de conexão
-            )
-        except ImportError:
-            raise Exception("Driver PostgreSQL (psycopg2) não está instalado")
+            export_format.write(stream, output, metadata=metadata, on_complete=on_complete)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f"{query.name}_export.{export_format.extension}",
+            content_type=export_format.content_type
+        )
 
-    def _get_mysql_connection(self, connection):
-        """Conectar ao MySQL"""
-        try:
-            import pymysql
-            return pymysql.connect(
-                host=connection.host,
-                port=connection.port or 3306,
-                database=connection.database,
-                user=connection.user,
-                password=connection.password,
-                connect_timeout=30  # Timeout padrão de conexão
+    def _export_fanout(self, query, parameters, limit, user, formats, bundle, request):
+        """
+        Exportar vários formatos executando a consulta uma única vez
+        
+        Os lotes do cursor são gravados simultaneamente por todos os formatos
+        (fan_out). Formatos que já têm artefato válido são reaproveitados e a
+        consulta é executada apenas para os demais.
+        bundle='zip': um ZIP com um arquivo por formato.
+        bundle='artifacts': cada formato é guardado como artefato (disponível
+        por ARTIFACT_DOWNLOAD_TTL) e a resposta traz os endereços de download.
+        """
+        import shutil
+        import tempfile
+        import time
+        import zipfile
+        from django.http import FileResponse
+        from django.urls import reverse
+        
+        if bundle == 'artifacts' and not get_artifact_setting('ENABLE_EXPORT_ARTIFACTS'):
+            return Response(
+                {'error': 'Artefatos de exportação estão desativados (ENABLE_EXPORT_ARTIFACTS)'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        except ImportError:
+        
+        start_time = time.time()
+        artifacts = {}
+        for export_format in formats:
+            artifact = get_artifact(query, parameters, export_format, limit)
+            if artifact is not None:
+                self._record_artifact_hit(query, parameters, user, artifact, export_format)
+                artifacts[export_format] = artifact
+        missing = [export_format for export_format in formats if export_format not in artifacts]
+        
+        outputs = {}
+        if missing:
+            store = bundle == 'artifacts' or is_artifact_enabled(query)
+            download_ttl = get_artifact_setting('ARTIFACT_DOWNLOAD_TTL') if bundle == 'artifacts' else None
+            stream, on_complete = self._open_stream(
+                query, parameters, limit, user, 'export_query', '+'.join(missing)
+            )
+            
+            def metadata(rows_written):
+                return export_metadata(query, user, rows_written, round((time.time() - start_time) * 1000, 2))
+            
+            writers = {}
             try:
-                import MySQLdb
-                return MySQLdb.connect(
-                    host=connection.host,
-                    port=connection.port or 3306,
-                    db=connection.database,
-                    user=connection.user,
-                    passwd=connection.password,
-                    connect_timeout=30  # Timeout padrão de conexão
-                )
-            except ImportError:
-                raise Exception("Nenhum driver MySQL encontrado. Execute: pip install pymysql")
-
-    def _get_sqlserver_connection(self, connection):
-        """Conectar ao SQL Server"""
+                for export_format in missing:
+                    if store:
+                        writers[export_format] = ArtifactWriter(
+                            query, parameters, export_format, limit, download_ttl=download_ttl
+                        )
+                        outputs[export_format] = writers[export_format].file
+                    else:
+                        outputs[export_format] = tempfile.TemporaryFile()
+                rows = fan_out(stream, list(outputs.items()), metadata=metadata, on_complete=on_complete)
+            except Exception:
+                stream.close()
+                for writer in writers.values():
+                    writer.discard()
+                for output in outputs.values():
+                    output.close()
+                raise
+            for export_format, writer in writers.items():
+                artifacts[export_format] = writer.commit(rows)
+                del outputs[export_format]
+        
+        if bundle == 'artifacts':
+            result = {}
+            for export_format in formats:
+                artifact = artifacts[export_format]
+                result[export_format] = {
+                    'key': artifact.key,
+                    'download_url': reverse('query-export-download', kwargs={'key': artifact.key}),
+                    'rows': artifact.rows,
+                    'size': artifact.size,
+                    'content_type': artifact.content_type,
+                    'expires_at': artifact.as_dict()['expires_at'],
+                }
+            return Response({'query_id': query.id, 'artifacts': result})
+        
+        bundle_file = tempfile.TemporaryFile()
         try:
-            import pyodbc
-            conn_str = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={connection.host},{connection.port or 1433};DATABASE={connection.database};UID={connection.user};PWD={connection.password}"
-            return pyodbc.connect(conn_str, timeout=30)  # Timeout padrão de conexão
-        except ImportError:
-            raise Exception("Driver SQL Server (pyodbc) não está instalado")
+            with zipfile.ZipFile(bundle_file, 'w') as archive:
+                for export_format in formats:
+                    extension = EXPORT_FORMATS[export_format].extension
+                    # XLSX, Parquet e Arrow já são comprimidos
+                    compress_type = zipfile.ZIP_DEFLATED if export_format in COMPRESSIBLE_FORMATS else zipfile.ZIP_STORED
+                    info = zipfile.ZipInfo(f"{query.name}_export.{extension}", date_time=time.localtime()[:6])
+                    info.compress_type = compress_type
+                    with archive.open(info, 'w', force_zip64=True) as entry:
+                        source = artifacts[export_format].open() if export_format in artifacts else outputs[export_format]
+                        source.seek(0)
+                        try:
+                            shutil.copyfileobj(source, entry)
+                        finally:
+                            source.close()
+        except Exception:
+            bundle_file.close()
+            raise
+        finally:
+            for output in outputs.values():
+                output.close()
+        bundle_file.seek(0)
+        
+        return FileResponse(
+            bundle_file,
+            as_attachment=True,
+            filename=f"{query.name}_export.zip",
+            content_type='application/zip'
+        )
 
-    def _get_oracle_connection(self, connection):
-        """Conectar ao Oracle"""
-        try:
-            import cx_Oracle
-            dsn = cx_Oracle.makedsn(connection.host, connection.port or 1521, service_name=connection.database)
-            return cx_Oracle.connect(connection.user, connection.password, dsn)
-        except ImportError:
-            raise Exception("Driver Oracle (cx_Oracle) não está instalado")
+    def _artifact_response(self, request, query, artifact):
+        """Enviar um artefato do disco, informando o endereço para retomar o download"""
+        from django.urls import reverse
+        
+        response = file_download_response(
+            request, artifact.path, f"{query.name}_export.{artifact.extension}", artifact.content_type
+        )
+        response['Content-Location'] = reverse('query-export-download', kwargs={'key': artifact.key})
+        return response
 
-    def _get_sqlite_connection(self, connection):
-        """Conectar ao SQLite"""
+    def _artifact_on_complete(self, writer, on_complete):
+        """on_complete que também informa ao artefato o total de linhas exportadas"""
+        def wrapper(rows_sent, error):
+            writer.rows = rows_sent
+            on_complete(rows_sent, error)
+        return wrapper
+
+    def _record_artifact_hit(self, query, parameters, user, artifact, label):
+        """Registrar exportação atendida por um artefato já gerado"""
+        QueryExecution.objects.create(
+            query=query,
+            user=user,
+            status='success',
+            execution_time=0,
+            rows_returned=artifact.rows,
+            parameters=parameters,
+            cache_hit=True
+        )
+        log_user_action(
+            user=user,
+            action='export_query',
+            details=f"Exportada consulta ({label}, artefato em cache): {query.name} - {artifact.rows} registros"
+        )
+
+    def _open_stream(self, query, parameters, limit, user, action, label, stream_class=None):
+        """
+        Abrir a consulta para envio em lotes
+        
+        Executa e lê o primeiro lote antes de responder, para que erros de SQL
+        continuem retornando erro HTTP. Retorna (stream, on_complete), onde
+        on_complete(rows, error) registra a execução ao final do envio.
+        stream_class: StreamingQuery (padrão) ou CopyCSVQuery (CSV gerado pelo PostgreSQL).
+        Consultas particionadas (partition_column) usam PartitionedQuery.
+        """
+        import time
+        
+        start_time = time.time()
+        
         try:
-            import sqlite3
-            return sqlite3.connect(connection.database, timeout=30)  # Timeout padrão de conexão
+            if stream_class is None and is_partitioned(query):
+                stream = PartitionedQuery(query, parameters, limit, timeout=get_effective_timeout(query)).open()
+            else:
+                sql_query, sql_params = self._build_limited_sql(query, parameters, limit)
+                stream = (stream_class or StreamingQuery)(
+                    query.connection, sql_query, sql_params, timeout=get_effective_timeout(query)
+                ).open()
         except Exception as e:
-            raise Exception(f"Erro SQLite: {str(e)}")
+            QueryExecution.objects.create(
+                query=query,
+                user=user,
+                status='timeout' if isinstance(e, QueryTimeoutError) else 'error',
+                execution_time=round(time.time() - start_time, 3),
+                error_message=str(e),
+                parameters=parameters
+            )
+            raise e
+        
+        def on_complete(rows_sent, error):
+            QueryExecution.objects.create(
+                query=query,
+                user=user,
+                status=self._execution_status(error),
+                execution_time=round(time.time() - start_time, 3),
+                rows_returned=rows_sent,
+                error_message=str(error) if error else '',
+                parameters=parameters
+            )
+            log_user_action(
+                user=user,
+                action=action,
+                details=f"Executada consulta ({label}): {query.name} - {rows_sent} registros"
+            )
+        
+        return stream, on_complete
 
-    def _replace_query_parameters(self, query_sql, parameters):
-        """Substituir parâmetros na consulta SQL"""
-        import re
-        
-        sql = query_sql
-        
-        # Substituir parâmetros no formato :param_name
-        for param_name, param_value in parameters.items():
-            placeholder = f":{param_name}"
-            
-            # Se o valor está vazio ou None, substituir por NULL
-            if param_value is None or param_value == '':
-                replacement = "NULL"
-            elif isinstance(param_value, str):
-                # Escapar aspas simples em strings
-                escaped_value = param_value.replace("'", "''")
-                replacement = f"'{escaped_value}'"
-            elif isinstance(param_value, bool):
-                replacement = "TRUE" if param_value else "FALSE"
-            else:
-                replacement = str(param_value)
-            
-            # Substituir todas as ocorrências do parâmetro
-            sql = sql.replace(placeholder, replacement)
+    def _format_result(self, request, result):
+        """Converter o resultado para o formato pedido (?format=columnar)"""
+        if getattr(request, 'accepted_renderer', None) and request.accepted_renderer.format == 'columnar':
+            return to_columnar(result)
+        return result
+
+    def _execution_error_response(self, error):
+        """Resposta de erro das actions de execução (timeout retorna 504)"""
+        if isinstance(error, QueryTimeoutError):
+            return Response({
+                'success': False,
+                'timeout': True,
+                'error': str(error),
+                'timestamp': timezone.now().isoformat()
+            }, status=status.HTTP_504_GATEWAY_TIMEOUT)
+        
+        return Response({
+            'success': False,
+            'error': str(error),
+            'timestamp': timezone.now().isoformat()
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    def _execution_status(self, error):
+        """Status do QueryExecution a partir do erro (None = sucesso)"""
+        if error is None:
+            return 'success'
+        return 'timeout' if isinstance(error, QueryTimeoutError) else 'error'
+
+    def _build_limited_sql(self, query, parameters, limit):
+        """Aplicar o LIMIT conforme o SGBD e compilar os parâmetros (retorna sql, params)"""
+        sql_query = query.query
         
-        # Para lidar com parâmetros não fornecidos, substituir por NULL
-        remaining_params = re.findall(r':(\w+)', sql)
-        for param in remaining_params:
-            sql = sql.replace(f":{param}", "NULL")
+        # Adicionar LIMIT se especificado
+        if limit and limit > 0:
+            sql_query = limit_sql(sql_query, query.connection.sgbd)
         
-        return sql
+        return self._prepare_sql(query, sql_query, parameters, reportme_limit=limit)
+
+    def _prepare_sql(self, query, sql_query, parameters, **extra_values):
+        """
+        Compilar os placeholders :nome para o paramstyle do driver da conexão
+        
+        Os valores são enviados separados do SQL (bind), de forma que o texto
+        executado não muda entre execuções e o plano em cache do banco de origem
+        é reaproveitado. extra_values são parâmetros internos (LIMIT, OFFSET).
+        """
+        return prepare_query(sql_query, query.connection.sgbd, {**parameters, **extra_values})
 
 
 @extend_schema_view(
@@ -2193,3 +2880,167 @@ class ParameterViewSet(viewsets.ModelViewSet):
             return Response({
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@extend_schema_view(
+    list=extend_schema(
+        tags=['queries'],
+        summary='Listar exportações',
+        description='Listar as exportações em segundo plano do usuário'
+    ),
+    retrieve=extend_schema(
+        tags=['queries'],
+        summary='Status da exportação',
+        description='Obter status e progresso (linhas gravadas) de uma exportação'
+    ),
+    create=extend_schema(
+        tags=['queries'],
+        summary='Criar exportação',
+        description='Enfileirar a exportação de uma consulta (CSV/Excel) para execução em segundo plano'
+    ),
+)
+class ExportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                       mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    ViewSet para exportações em segundo plano
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        """Usuários veem apenas as próprias exportações"""
+        queryset = ExportJob.objects.select_related('query')
+        user = self.request.user
+        if not (user.is_superuser or user.is_admin):
+            queryset = queryset.filter(user=user)
+        return queryset
+    
+    def get_serializer_class(self):
+        """Escolher serializer baseado na action"""
+        if self.action == 'create':
+            return ExportJobCreateSerializer
+        return ExportJobSerializer
+    
+    def create(self, request, *args, **kwargs):
+        """Enfileirar exportação; retorna o job (202) para acompanhamento"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        query = Query.objects.get(id=serializer.validated_data['query_id'])
+        job = submit_export_job(
+            query=query,
+            user=request.user,
+            parameters=serializer.validated_data.get('parameters', {}),
+            export_format=serializer.validated_data['format'],
+            limit=serializer.validated_data['limit'],
+            compression=serializer.validated_data['compression']
+        )
+        
+        log_user_action(
+            user=request.user,
+            action='export_query',
+            details=f"Exportação em segundo plano enfileirada: {query.name} ({job.format}) - job {job.pk}"
+        )
+        
+        job.refresh_from_db()
+        return Response(
+            ExportJobSerializer(job, context={'request': request}).data,
+            status=status.HTTP_202_ACCEPTED
+        )
+    
+    @extend_schema(
+        tags=['queries'],
+        summary='Download da exportação',
+        description='Baixar o arquivo de uma exportação concluída'
+    )
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Baixar o arquivo gerado pela exportação (suporta Range, If-Range e ETag)"""
+        job = self.get_object()
+        
+        if job.status == 'expired':
+            return Response({'error': 'O arquivo desta exportação expirou'}, status=status.HTTP_410_GONE)
+        if job.status != 'success':
+            return Response(
+                {'error': 'Exportação ainda não concluída', 'status': job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        try:
+            return file_download_response(
+                request,
+                job.file_path,
+                f"{job.query.name}_export.{export_file_extension(job)}",
+                export_content_type(job)
+            )
+        except OSError:
+            return Response({'error': 'Arquivo da exportação não encontrado'}, status=status.HTTP_410_GONE)
+
+
+@extend_schema_view(
+    list=extend_schema(
+        tags=['queries'],
+        summary='Listar artefatos de exportação',
+        description='Arquivos de exportação armazenados para reaproveitamento (apenas administradores)'
+    ),
+    destroy=extend_schema(
+        tags=['queries'],
+        summary='Remover artefato de exportação',
+        description='Remover um arquivo de exportação armazenado'
+    ),
+)
+class ExportArtifactViewSet(viewsets.ViewSet):
+    """
+    ViewSet de administração dos artefatos de exportação
+    """
+    permission_classes = [IsAdminUser]
+    lookup_value_regex = '[0-9a-f]{64}'
+    
+    def list(self, request):
+        """Listar artefatos (mais recentemente acessados primeiro) e o uso do disco"""
+        artifacts = list_artifacts()
+        query_id = request.query_params.get('query_id')
+        if query_id:
+            artifacts = [artifact for artifact in artifacts if str(artifact.meta['query_id']) == query_id]
+        
+        return Response({
+            'artifacts': [artifact.as_dict() for artifact in artifacts],
+            'count': len(artifacts),
+            'total_size': sum(artifact.size for artifact in artifacts),
+            'max_size': get_artifact_setting('ARTIFACT_DIR_MAX_BYTES')
+        })
+    
+    def destroy(self, request, pk=None):
+        """Remover um artefato"""
+        artifact = ExportArtifact.load(pk)
+        if artifact is None:
+            return Response({'error': 'Artefato não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        
+        artifact.delete()
+        log_user_action(
+            user=request.user,
+            action='delete',
+            details=f"Removido artefato de exportação {pk} ({artifact.meta['query_name']})"
+        )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @extend_schema(
+        tags=['queries'],
+        summary='Limpar artefatos de exportação',
+        description='Remover todos os artefatos, ou apenas os de uma consulta (query_id)'
+    )
+    @action(detail=False, methods=['post'])
+    def purge(self, request):
+        """Remover todos os artefatos (ou os de uma consulta)"""
+        query_id = request.data.get('query_id')
+        try:
+            query_id = int(query_id) if query_id not in (None, '') else None
+        except (TypeError, ValueError):
+            return Response({'error': 'query_id inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        removed = purge_artifacts(query_id)
+        log_user_action(
+            user=request.user,
+            action='delete',
+            details=f"Removidos {removed} artefatos de exportação" + (f" da consulta {query_id}" if query_id else '')
+        )
+        return Response({'removed': removed})
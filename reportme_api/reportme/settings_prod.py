@@ -156,8 +156,17 @@ INSTALLED_APPS += [
     'health_check.cache',
     'health_check.storage',
     'dbbackup',
+    'django_rq',
 ]
 
+# Filas do django-rq (exportações em segundo plano, serviço rqworker)
+RQ_QUEUES = {
+    'default': {
+        'URL': config('REDIS_URL', default='redis://localhost:6379/1'),
+        'DEFAULT_TIMEOUT': 3600,
+    },
+}
+
 # Health Check
 HEALTH_CHECK = {
     'DISK_USAGE_MAX': 90,  # percent
@@ -183,4 +192,62 @@ REPORTME_SETTINGS = {
     'MAX_EXPORT_ROWS': 100000,
     'ENABLE_QUERY_CACHE': True,
     'CACHE_TIMEOUT': 3600,  # 1 hora
+    'QUERY_CACHE_MAX_ROWS': 10000,  # resultados maiores não vão para o cache
+    'PAGINATION_COUNT_MODE': 'exact',  # exact, window ou estimated
+    'PAGINATION_TOTAL_TTL': 300,  # total da paginação reaproveitado entre páginas
+    # Snapshots de resultados para paginação (disco local)
+    'SNAPSHOT_DIR': config('SNAPSHOT_DIR', default='/tmp/reportme_snapshots'),
+    'SNAPSHOT_TTL': 1800,  # 30 minutos sem acesso
+    'SNAPSHOT_MAX_ROWS': 1000000,
+    'SNAPSHOT_MAX_BYTES': 256 * 1024 * 1024,  # 256 MB por snapshot
+    'SNAPSHOT_DIR_MAX_BYTES': 2 * 1024 * 1024 * 1024,  # 2 GB no total (LRU)
+    # Execução assíncrona (queries/execute-async/)
+    'ASYNC_EXECUTOR_THREADS': 64,  # consultas simultâneas por worker
+    'ASYNC_CONNECTION_CONCURRENCY': 5,  # por Connection (não exceder POOL_MAX_SIZE)
+    'ASYNC_QUEUE_TIMEOUT': 30,  # segundos aguardando vaga antes do 503
+    # Pool de conexões com os bancos de origem (por Connection, por worker)
+    'POOL_MIN_SIZE': 1,
+    'POOL_MAX_SIZE': 5,
+    'POOL_IDLE_TIMEOUT': 300,  # 5 minutos
+    'POOL_MAX_LIFETIME': 1800,  # 30 minutos
+    'POOL_ACQUIRE_TIMEOUT': 30,
+    'POOL_PING_ON_BORROW': True,
+    # Linhas lidas por lote nos cursores do lado do servidor
+    'STREAM_BATCH_SIZE': 1000,
+    # Exportações em segundo plano (export-jobs/)
+    'EXPORT_JOB_BACKEND': 'rq',  # inline, thread, rq ou caminho da classe
+    'EXPORT_JOB_QUEUE': 'default',
+    'EXPORT_JOB_TIMEOUT': 3600,  # jobs em execução há mais tempo são marcados como erro
+    'EXPORT_DIR': config('EXPORT_DIR', default='/tmp/reportme_exports'),
+    'EXPORT_FILE_TTL': 86400,  # 24 horas para download
+    'EXPORT_PROGRESS_INTERVAL': 1.0,
+    # Exportação em lote de pastas (project-nodes/<id>/export/)
+    'BULK_EXPORT_WORKERS': 8,  # relatórios executados em paralelo
+    'BULK_EXPORT_CONNECTION_CONCURRENCY': 5,  # por Connection (não exceder POOL_MAX_SIZE)
+    # Execução particionada (consultas com partition_column e partition_count > 1)
+    'ENABLE_PARTITIONED_EXECUTION': True,
+    'PARTITION_WORKERS': 4,  # partições em paralelo por execução (até POOL_MAX_SIZE)
+    'PARTITION_MAX_COUNT': 64,
+    # Compressão das exportações CSV (gzip; zstd requer zstandard)
+    'EXPORT_GZIP_LEVEL': 6,
+    'EXPORT_ZSTD_LEVEL': 3,
+    # Exportação Parquet (requer pyarrow)
+    'PARQUET_COMPRESSION': 'zstd',
+    'PARQUET_ROW_GROUP_SIZE': 65536,  # linhas por row group
+    # CSV do PostgreSQL gerado pelo servidor (COPY ... TO STDOUT)
+    'CSV_COPY_EXPORT': True,
+    # Limite de linhas de execute/export em NDJSON (respostas JSON: 10000)
+    'NDJSON_MAX_ROWS': 1000000,
+    # Artefatos de exportação reaproveitados (consultas com cache_duration)
+    'ENABLE_EXPORT_ARTIFACTS': True,
+    'ARTIFACT_DIR': config('ARTIFACT_DIR', default='/tmp/reportme_artifacts'),
+    'ARTIFACT_DIR_MAX_BYTES': 5 * 1024 * 1024 * 1024,  # 5 GB no total (LRU)
+    'ARTIFACT_DOWNLOAD_TTL': 3600,      # Exportação em vários formatos com bundle 'artifacts'
+    # Downloads de exportações enviados pelo nginx (X-Accel-Redirect); None = Django
+    'EXPORT_SENDFILE': config('EXPORT_SENDFILE', default=None),
+    'EXPORT_SENDFILE_ROOT': config('EXPORT_DIR', default='/tmp/reportme_exports'),
+    'EXPORT_SENDFILE_URL': '/protected-exports/',  # location internal do nginx.conf
+    # Árvores de projeto em cache por versão (ETag / 304 no portal de leitura)
+    'ENABLE_TREE_CACHE': True,
+    'TREE_CACHE_TTL': 24 * 3600,
 }
\ No newline at end of file
@@ -22,6 +22,7 @@ if __name__ == "__main__":
         "tests.test_projects", 
         "tests.test_connections",
         "tests.test_queries",
+        "tests.test_query_engine",
         "tests.test_integration"
     ])
     
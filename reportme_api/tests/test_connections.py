@@ -2,11 +2,14 @@
 Testes para o sistema de conexões do ReportMe
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APITestCase
 from core.models import Connection
+from core.connection_pool import (
+    PoolTimeoutError, close_all_pools, get_pool, get_pooled_connection
+)
 from tests import (
     BaseAPITestCase, 
     DatabaseTestCase,
@@ -18,6 +21,7 @@ from tests import (
 import json
 import tempfile
 import os
+import time
 
 User = get_user_model()
 
@@ -517,4 +521,106 @@ class ConnectionModelTestCase(TestCase):
         connections = Connection.objects.all()
         # Deve ser ordenado por nome
         self.assertEqual(connections.first().name, 'A Conexão')
-        self.assertEqual(connections.last().name, 'B Conexão')
\ No newline at end of file
+        self.assertEqual(connections.last().name, 'B Conexão')
+
+class ConnectionPoolTestCase(BaseAPITestCase):
+    """
+    Testes para a pool de conexões com os bancos de origem
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.db_path = tempfile.mktemp(suffix='.db')
+        self.connection = TestDataFactory.create_connection(
+            created_by=self.admin_user,
+            name='SQLite Pool',
+            database=self.db_path
+        )
+    
+    def tearDown(self):
+        close_all_pools()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        super().tearDown()
+    
+    def test_connection_reused_between_borrows(self):
+        """Testa que a mesma conexão do driver é reutilizada"""
+        with get_pooled_connection(self.connection) as first:
+            raw = first.raw
+        with get_pooled_connection(self.connection) as second:
+            self.assertIs(second.raw, raw)
+        
+        stats = get_pool(self.connection).stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 1)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 1)
+    
+    @override_settings(REPORTME_SETTINGS={'POOL_MAX_SIZE': 1, 'POOL_ACQUIRE_TIMEOUT': 0.1})
+    def test_pool_max_size_timeout(self):
+        """Testa que a pool não excede o tamanho máximo"""
+        with get_pooled_connection(self.connection):
+            with self.assertRaises(PoolTimeoutError):
+                get_pooled_connection(self.connection)
+    
+    @override_settings(REPORTME_SETTINGS={'POOL_MIN_SIZE': 2})
+    def test_pool_opens_min_size_connections(self):
+        """Testa que a pool abre min_size conexões ao ser criada"""
+        stats = get_pool(self.connection).stats()
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['idle'], 2)
+        
+        with get_pooled_connection(self.connection):
+            pass
+        self.assertEqual(get_pool(self.connection).stats()['created'], 2)
+    
+    @override_settings(REPORTME_SETTINGS={'POOL_MIN_SIZE': 2, 'POOL_MAX_LIFETIME': 0.05})
+    def test_pool_replenished_after_prune(self):
+        """Testa que conexões descartadas por tempo de vida são repostas até min_size"""
+        pool = get_pool(self.connection)
+        time.sleep(0.1)
+        
+        with get_pooled_connection(self.connection):
+            pass
+        
+        stats = pool.stats()
+        self.assertGreaterEqual(stats['discarded'], 2)
+        self.assertGreaterEqual(stats['idle'], 2)
+    
+    def test_pool_invalidated_when_connection_edited(self):
+        """Testa que editar a conexão descarta a pool antiga"""
+        pool = get_pool(self.connection)
+        with get_pooled_connection(self.connection):
+            pass
+        
+        self.connection.name = 'SQLite Pool Editada'
+        self.connection.save()
+        
+        self.assertIsNot(get_pool(self.connection), pool)
+        self.assertEqual(pool.stats()['idle'], 0)
+    
+    def test_dead_connection_discarded_on_borrow(self):
+        """Testa que o health check descarta conexões fechadas"""
+        with get_pooled_connection(self.connection) as pooled:
+            raw = pooled.raw
+        raw.close()
+        
+        with get_pooled_connection(self.connection) as pooled:
+            self.assertIsNot(pooled.raw, raw)
+        self.assertEqual(get_pool(self.connection).stats()['ping_failures'], 1)
+    
+    def test_pool_stats_endpoint(self):
+        """Testa endpoint de estatísticas das pools"""
+        with get_pooled_connection(self.connection):
+            pass
+        
+        response = self.client.get('/api/core/connections/pool-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pool_ids = [pool['connection_id'] for pool in response.data['pools']]
+        self.assertIn(self.connection.id, pool_ids)
+    
+    def test_pool_stats_endpoint_requires_admin(self):
+        """Testa que apenas administradores veem as pools"""
+        self.authenticate_readonly()
+        response = self.client.get('/api/core/connections/pool-stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -2,7 +2,13 @@
 Testes para o sistema de projetos do ReportMe
 """
 
+import importlib
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -545,4 +551,271 @@ class ProjectNodeModelTestCase(TestCase):
         self.assertEqual(descendants.count(), 3)
         self.assertIn(child1, descendants)
         self.assertIn(child2, descendants)
-        self.assertIn(grandchild, descendants)
\ No newline at end of file
+        self.assertIn(grandchild, descendants)
+
+class ProjectNodeAncestryTestCase(TestCase):
+    """
+    Testes para o índice de ancestrais de ProjectNode (ancestry/depth)
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.project = Project.objects.create(name='Projeto Ancestrais', owner=self.user)
+        self.root = ProjectNode.objects.create(project=self.project, name='Raiz')
+        self.folder = ProjectNode.objects.create(project=self.project, name='Pasta', parent=self.root)
+        self.subfolder = ProjectNode.objects.create(project=self.project, name='Subpasta', parent=self.folder)
+        self.leaf = ProjectNode.objects.create(project=self.project, name='Relatório', parent=self.subfolder)
+        self.other = ProjectNode.objects.create(project=self.project, name='Outra', parent=self.root)
+    
+    def test_ancestry_on_create(self):
+        """Testa o caminho e a profundidade gravados na criação"""
+        self.leaf.refresh_from_db()
+        self.assertEqual(
+            self.leaf.ancestry, f"{self.root.pk}/{self.folder.pk}/{self.subfolder.pk}/{self.leaf.pk}/"
+        )
+        self.assertEqual(self.leaf.level, 3)
+        self.assertEqual(self.leaf.ancestor_ids, [self.root.pk, self.folder.pk, self.subfolder.pk])
+    
+    def test_move_updates_subtree(self):
+        """Testa que mover um nó atualiza o caminho de todos os descendentes"""
+        self.subfolder.parent = self.other
+        self.subfolder.save()
+        
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.ancestor_ids, [self.root.pk, self.other.pk, self.subfolder.pk])
+        self.assertEqual(self.leaf.depth, 3)
+        self.assertTrue(self.leaf.is_descendant_of(self.other))
+        self.assertFalse(self.leaf.is_descendant_of(self.folder))
+        
+        self.subfolder.parent = self.root
+        self.subfolder.save()
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.depth, 2)
+        self.assertEqual(self.leaf.path, ['Raiz', 'Subpasta', 'Relatório'])
+    
+    def test_queries_do_not_walk_the_tree(self):
+        """Testa subárvore, contagem, caminho e ancestrais em uma consulta cada"""
+        parent = self.leaf
+        for index in range(30):
+            parent = ProjectNode.objects.create(project=self.project, name=f'Nível {index}', parent=parent)
+        deepest = ProjectNode.objects.get(pk=parent.pk)
+        root = ProjectNode.objects.get(pk=self.root.pk)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(root.get_descendants_count(), 34)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(root.get_descendants()), 34)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(deepest.path), 34)
+        with self.assertNumQueries(0):
+            self.assertEqual(deepest.level, 33)
+            self.assertTrue(deepest.is_descendant_of(root))
+        with self.assertNumQueries(1):
+            deepest.parent = deepest
+            with self.assertRaises(ValidationError):
+                deepest.clean()
+    
+    def test_cycle_detection(self):
+        """Testa que um nó não pode ser movido para dentro da própria subárvore"""
+        self.folder.parent = self.leaf
+        with self.assertRaisesMessage(ValidationError, 'circular'):
+            self.folder.clean()
+        
+        self.folder.parent = self.other
+        self.folder.clean()
+    
+    def test_backfill_migration(self):
+        """Testa o preenchimento do índice para árvores existentes"""
+        backfill = importlib.import_module('core.migrations.0009_projectnode_ancestry').backfill_ancestry
+        ProjectNode.objects.update(ancestry='', depth=0)
+        
+        backfill(apps, None)
+        
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.ancestor_ids, [self.root.pk, self.folder.pk, self.subfolder.pk])
+        self.assertEqual(self.leaf.depth, 3)
+        self.assertEqual(ProjectNode.objects.get(pk=self.root.pk).ancestry, f"{self.root.pk}/")
+
+
+class ProjectTreeQueryCountTestCase(BaseAPITestCase):
+    """
+    Testes para a montagem da árvore com número constante de consultas
+    """
+    
+    def _build_project(self, name, folders, reports_per_folder):
+        """Projeto com pastas, subpastas e relatórios (com consulta e conexão)"""
+        project = Project.objects.create(name=name, owner=self.admin_user)
+        query = TestDataFactory.create_query(
+            connection=self.test_connection, created_by=self.admin_user, name=f'Consulta {name}'
+        )
+        for folder_index in range(folders):
+            folder = ProjectNode.objects.create(project=project, name=f'Pasta {folder_index}', parent=project.first_node)
+            subfolder = ProjectNode.objects.create(project=project, name='Subpasta', parent=folder)
+            for report_index in range(reports_per_folder):
+                ProjectNode.objects.create(
+                    project=project, name=f'Relatório {report_index}', parent=subfolder, query=query
+                )
+        return project
+    
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries), response
+    
+    def test_tree_constant_query_count(self):
+        """Testa que tree, retrieve e a lista de nós não dependem do tamanho da árvore"""
+        self.authenticate_admin()
+        small = self._build_project('Pequeno', folders=1, reports_per_folder=1)
+        large = self._build_project('Grande', folders=10, reports_per_folder=10)
+        
+        for url_template in (
+            f"{TestConstants.PROJECTS_URL}{{id}}/tree/",
+            f"{TestConstants.PROJECTS_URL}{{id}}/",
+            f"{TestConstants.PROJECT_NODES_URL}?project={{id}}",
+        ):
+            small_queries, _ = self._count_queries(url_template.format(id=small.id))
+            large_queries, _ = self._count_queries(url_template.format(id=large.id))
+            self.assertEqual(small_queries, large_queries, url_template)
+    
+    def test_tree_structure(self):
+        """Testa a hierarquia montada em memória"""
+        self.authenticate_admin()
+        project = self._build_project('Estrutura', folders=2, reports_per_folder=2)
+        
+        _, response = self._count_queries(f"{TestConstants.PROJECTS_URL}{project.id}/")
+        root = response.data['root_node']
+        self.assertEqual(response.data['node_count'], 9)
+        self.assertEqual(response.data['query_count'], 4)
+        self.assertEqual(root['node_type'], 'folder')
+        self.assertEqual([child['name'] for child in root['children']], ['Pasta 0', 'Pasta 1'])
+        
+        report = root['children'][0]['children'][0]['children'][1]
+        self.assertEqual(report['name'], 'Relatório 1')
+        self.assertEqual(report['node_type'], 'query')
+        self.assertEqual(report['query_name'], 'Consulta Estrutura')
+        self.assertEqual(report['connection_name'], self.test_connection.name)
+        self.assertEqual(report['children'], [])
+        
+        _, response = self._count_queries(f"{TestConstants.PROJECTS_URL}{project.id}/tree/")
+        tree = response.data['tree']
+        self.assertEqual(len(tree), 9)
+        self.assertEqual(tree[0]['id'], project.first_node_id)
+        self.assertEqual(tree[0]['children'][0]['children'][0]['children'][0]['name'], 'Relatório 0')
+
+
+class ProjectTreeCacheTestCase(BaseAPITestCase):
+    """
+    Testes para o cache da árvore por versão (ETag / If-None-Match)
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.authenticate_admin()
+        self.project = Project.objects.create(name='Projeto Cache', owner=self.admin_user)
+        self.query = TestDataFactory.create_query(
+            connection=self.test_connection, created_by=self.admin_user, name='Consulta Cache'
+        )
+        self.report = ProjectNode.objects.create(
+            project=self.project, name='Relatório', parent=self.project.first_node, query=self.query
+        )
+        self.urls = (
+            f"{TestConstants.PROJECTS_URL}{self.project.id}/tree/",
+            f"{TestConstants.PROJECTS_URL}{self.project.id}/",
+            f"{TestConstants.PROJECT_NODES_URL}?project={self.project.id}",
+        )
+    
+    def _tree_queries(self, context):
+        """Consultas às tabelas de projetos (a autenticação consulta o usuário)"""
+        return [query['sql'] for query in context.captured_queries if 'core_project' in query['sql']]
+    
+    def _etags(self):
+        etags = []
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            etags.append(response['ETag'])
+        return etags
+    
+    def test_not_modified(self):
+        """Testa 304 sem consultas ao banco quando a árvore não mudou"""
+        for url, etag in zip(self.urls, self._etags()):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+            self.assertEqual(response['ETag'], etag)
+            self.assertFalse(self._tree_queries(context), url)
+    
+    def test_if_none_match_any(self):
+        """Testa que If-None-Match: * retorna 304 apenas para projetos existentes"""
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        missing = Project.objects.order_by('-id').first().id + 100
+        for url in (f"{TestConstants.PROJECTS_URL}{missing}/tree/", f"{TestConstants.PROJECTS_URL}{missing}/"):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, url)
+    
+    def test_cached_tree(self):
+        """Testa que a árvore em cache não é montada de novo"""
+        url = self.urls[0]
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(url)
+        self.assertEqual(second.data, first.data)
+        self.assertFalse(self._tree_queries(context))
+    
+    def test_etag_changes_on_node_change(self):
+        """Testa que alterar, criar ou excluir nós troca a versão"""
+        etags = self._etags()
+        self.report.name = 'Relatório renomeado'
+        self.report.save()
+        renamed = self._etags()
+        self.assertTrue(all(old != new for old, new in zip(etags, renamed)))
+        
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['tree'][1]['name'], 'Relatório renomeado')
+        
+        self.report.delete()
+        self.assertNotEqual(self._etags()[0], renamed[0])
+    
+    def test_etag_changes_on_project_and_query_change(self):
+        """Testa que alterar o projeto ou a consulta ligada troca a versão"""
+        etags = self._etags()
+        self.project.name = 'Projeto renomeado'
+        self.project.save()
+        renamed = self._etags()
+        self.assertNotEqual(renamed[1], etags[1])
+        
+        self.query.name = 'Consulta renomeada'
+        self.query.save()
+        response = self.client.get(self.urls[0])
+        self.assertNotEqual(response['ETag'], renamed[0])
+        self.assertEqual(response.data['tree'][1]['query_name'], 'Consulta renomeada')
+        
+        self.query.delete()
+        response = self.client.get(self.urls[0])
+        self.assertEqual(response.data['tree'][1]['node_type'], 'empty')
+    
+    def test_etag_changes_on_owner_rename(self):
+        """Testa que renomear o dono do projeto troca a versão"""
+        etags = self._etags()
+        self.admin_user.name = 'Administrador Renomeado'
+        self.admin_user.save()
+        
+        response = self.client.get(self.urls[1], HTTP_IF_NONE_MATCH=etags[1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created_by_name'], 'Administrador Renomeado')
+        self.assertTrue(all(old != new for old, new in zip(etags, self._etags())))
+    
+    def test_other_project_unaffected(self):
+        """Testa que alterar outro projeto não troca a versão"""
+        etags = self._etags()
+        other = Project.objects.create(name='Outro', owner=self.admin_user)
+        ProjectNode.objects.create(project=other, name='Pasta', parent=other.first_node)
+        self.assertEqual(self._etags(), etags)
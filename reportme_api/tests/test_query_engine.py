@@ -0,0 +1,2279 @@
+"""
+Testes para o motor de execução de consultas (pool, streaming, etc.)
+"""
+
+import asyncio
+import csv
+import datetime
+import gzip
+import importlib.util
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from decimal import Decimal
+from unittest import mock, skipIf, skipUnless
+
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.artifacts import list_artifacts, purge_artifacts
+from core.async_views import ConnectionBusyError, connection_limiter
+from core.bulk_export import BulkExport, BulkExportCancelled, collect_reports
+from core.connection_pool import close_all_pools
+from core.dialects import (
+    QueryTimeoutError, compile_sql, get_effective_timeout, parse_row_estimate, prepare_query,
+)
+from core.export_jobs import fail_stale_exports, purge_expired_exports, run_export_job
+from core.exporters import EXPORT_FORMATS, ExportFormat, negotiate_compression, write_parquet
+from core.fanout import fan_out
+from core.partitioning import split_bounds
+from core.models import ExportJob, QueryExecution
+from core.result_formats import describe_columns, to_columnar
+from core.snapshots import ResultSnapshot
+from core.streaming import StreamingQuery
+from tests import BaseAPITestCase, TestConstants, TestDataFactory
+
+
+class SourceDatabaseTestCase(BaseAPITestCase):
+    """
+    Classe base com um banco SQLite de origem real (tabela vendas)
+    """
+    
+    ROWS = 250
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.db_path = tempfile.mktemp(suffix='.db')
+        source = sqlite3.connect(self.db_path)
+        source.execute('CREATE TABLE vendas (id INTEGER PRIMARY KEY, vendedor TEXT, valor REAL)')
+        source.executemany(
+            'INSERT INTO vendas (id, vendedor, valor) VALUES (?, ?, ?)',
+            [(i, f'Vendedor {i % 7}', i * 10.5) for i in range(1, self.ROWS + 1)]
+        )
+        source.commit()
+        source.close()
+        
+        self.source_connection = TestDataFactory.create_connection(
+            created_by=self.admin_user,
+            name='SQLite Origem',
+            database=self.db_path
+        )
+        self.source_query = TestDataFactory.create_query(
+            connection=self.source_connection,
+            created_by=self.admin_user,
+            name='Vendas',
+            query='SELECT id, vendedor, valor FROM vendas ORDER BY id'
+        )
+        self.execute_url = f'{TestConstants.QUERIES_URL}execute/'
+    
+    def tearDown(self):
+        close_all_pools()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        super().tearDown()
+
+
+class StreamingExecutionTestCase(SourceDatabaseTestCase):
+    """Testa leitura em lotes e o modo streaming do endpoint execute"""
+    
+    def test_streaming_query_reads_in_batches(self):
+        """Testa que o cursor é lido em lotes do tamanho configurado"""
+        with StreamingQuery(self.source_connection, self.source_query.query, batch_size=100) as stream:
+            self.assertEqual(stream.columns, ['id', 'vendedor', 'valor'])
+            sizes = [len(batch) for batch in stream.batches()]
+        
+        self.assertEqual(sizes, [100, 100, 50])
+    
+    def test_execute_returns_all_rows(self):
+        """Testa execução padrão (não streaming) após a leitura em lotes"""
+        response = self.client.post(self.execute_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_records'], self.ROWS)
+        self.assertEqual(response.data['rows'][0], [1, 'Vendedor 1', 10.5])
+    
+    @override_settings(REPORTME_SETTINGS={'STREAM_BATCH_SIZE': 60})
+    def test_execute_streaming_response(self):
+        """Testa modo streaming: mesmo documento JSON, enviado em partes"""
+        response = self.client.post(self.execute_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000,
+            'stream': True
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 5)
+        
+        data = json.loads(b''.join(chunks))
+        self.assertTrue(data['success'])
+        self.assertEqual(data['columns'], ['id', 'vendedor', 'valor'])
+        self.assertEqual(data['total_records'], self.ROWS)
+        self.assertEqual(len(data['rows']), self.ROWS)
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertEqual(execution.status, 'success')
+        self.assertEqual(execution.rows_returned, self.ROWS)
+    
+    def test_execute_streaming_invalid_sql(self):
+        """Testa que erro de SQL no modo streaming ainda retorna 400"""
+        self.source_query.query = 'SELECT coluna_inexistente FROM vendas'
+        self.source_query.save()
+        
+        response = self.client.post(self.execute_url, {
+            'query_id': self.source_query.id,
+            'stream': True
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.data['success'])
+
+
+class StatementTimeoutTestCase(SourceDatabaseTestCase):
+    """Testa aplicação de Query.timeout como timeout de instrução"""
+    
+    RUNAWAY_SQL = (
+        'WITH RECURSIVE contador(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM contador) '
+        'SELECT COUNT(*) FROM contador'
+    )
+    
+    def test_effective_timeout_respects_global_limit(self):
+        """Testa que QUERY_TIMEOUT limita o timeout da consulta"""
+        self.source_query.timeout = 600
+        with override_settings(QUERY_TIMEOUT=300):
+            self.assertEqual(get_effective_timeout(self.source_query), 300)
+        with override_settings(QUERY_TIMEOUT=None):
+            self.assertEqual(get_effective_timeout(self.source_query), 600)
+    
+    def test_runaway_query_is_cancelled(self):
+        """Testa que a consulta é interrompida e registrada como timeout"""
+        self.source_query.query = self.RUNAWAY_SQL
+        self.source_query.timeout = 1
+        self.source_query.save()
+        
+        response = self.client.post(self.execute_url, {'query_id': self.source_query.id}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+        self.assertTrue(response.data['timeout'])
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertEqual(execution.status, 'timeout')
+    
+    def test_connection_reusable_after_timeout(self):
+        """Testa que a conexão devolvida à pool continua utilizável"""
+        with self.assertRaises(QueryTimeoutError):
+            with StreamingQuery(self.source_connection, self.RUNAWAY_SQL, timeout=0.2) as stream:
+                stream.fetch_all()
+        
+        with StreamingQuery(self.source_connection, 'SELECT COUNT(*) FROM vendas', timeout=5) as stream:
+            self.assertEqual(stream.fetch_all(), [[self.ROWS]])
+
+
+class ResultCacheTestCase(SourceDatabaseTestCase):
+    """Testa o cache de resultados controlado por Query.cache_duration"""
+    
+    def setUp(self):
+        super().setUp()
+        self.source_query.cache_duration = 60
+        self.source_query.save()
+    
+    def _execute(self, **data):
+        data.setdefault('query_id', self.source_query.id)
+        return self.client.post(self.execute_url, data, format='json')
+    
+    def _add_row(self):
+        source = sqlite3.connect(self.db_path)
+        source.execute("INSERT INTO vendas (id, vendedor, valor) VALUES (999, 'Novo', 1.0)")
+        source.commit()
+        source.close()
+    
+    def test_second_execution_served_from_cache(self):
+        """Testa que a segunda execução não consulta o banco de origem"""
+        first = self._execute(limit=1000)
+        self.assertFalse(first.data['cache_hit'])
+        
+        self._add_row()
+        second = self._execute(limit=1000)
+        
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertTrue(second.data['cache_hit'])
+        self.assertEqual(second.data['total_records'], self.ROWS)
+        self.assertEqual(second.data['rows'], first.data['rows'])
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertTrue(execution.cache_hit)
+        self.assertEqual(execution.rows_returned, self.ROWS)
+    
+    def test_cache_key_includes_limit_and_page(self):
+        """Testa que limite e página diferentes não compartilham entrada"""
+        self._execute(limit=1000)
+        response = self._execute(limit=10)
+        self.assertFalse(response.data['cache_hit'])
+        self.assertEqual(len(response.data['rows']), 10)
+        
+        paginated_url = f'{TestConstants.QUERIES_URL}execute-paginated/'
+        page_1 = self.client.post(paginated_url, {'query_id': self.source_query.id, 'page': 1, 'page_size': 50}, format='json')
+        page_2 = self.client.post(paginated_url, {'query_id': self.source_query.id, 'page': 2, 'page_size': 50}, format='json')
+        self.assertFalse(page_2.data['cache_hit'])
+        self.assertNotEqual(page_1.data['rows'], page_2.data['rows'])
+        
+        page_2_again = self.client.post(paginated_url, {'query_id': self.source_query.id, 'page': 2, 'page_size': 50}, format='json')
+        self.assertTrue(page_2_again.data['cache_hit'])
+    
+    def test_cache_disabled_without_duration(self):
+        """Testa que cache_duration = 0 sempre executa a consulta"""
+        self.source_query.cache_duration = 0
+        self.source_query.save()
+        
+        self._execute(limit=1000)
+        self._add_row()
+        response = self._execute(limit=1000)
+        
+        self.assertFalse(response.data['cache_hit'])
+        self.assertEqual(response.data['total_records'], self.ROWS + 1)
+    
+    def test_cache_invalidated_when_query_changes(self):
+        """Testa invalidação ao salvar a consulta ou seus parâmetros"""
+        self._execute(limit=1000)
+        self._add_row()
+        
+        self.source_query.description = 'Alterada'
+        self.source_query.save()
+        response = self._execute(limit=1000)
+        self.assertFalse(response.data['cache_hit'])
+        self.assertEqual(response.data['total_records'], self.ROWS + 1)
+        
+        self.assertTrue(self._execute(limit=1000).data['cache_hit'])
+        TestDataFactory.create_parameter(self.source_query, name='vendedor')
+        self.assertFalse(self._execute(limit=1000).data['cache_hit'])
+    
+    def test_cache_invalidated_when_connection_changes(self):
+        """Testa invalidação ao salvar a conexão de origem"""
+        self._execute(limit=1000)
+        
+        self.source_connection.name = 'SQLite Origem Alterada'
+        self.source_connection.save()
+        
+        self.assertFalse(self._execute(limit=1000).data['cache_hit'])
+
+
+class BoundParameterTestCase(SourceDatabaseTestCase):
+    """Testa a compilação de :nome para o paramstyle do driver e o bind dos valores"""
+    
+    FILTER_SQL = 'SELECT id, vendedor FROM vendas WHERE vendedor = :vendedor AND valor > :minimo ORDER BY id'
+    
+    def test_compile_to_driver_paramstyle(self):
+        """Testa placeholders gerados para cada SGBD"""
+        sql = 'SELECT * FROM t WHERE a = :a AND b = :b AND c = :a'
+        
+        self.assertEqual(
+            prepare_query(sql, 'postgresql', {'a': 1, 'b': 'x'}),
+            ('SELECT * FROM t WHERE a = %(a)s AND b = %(b)s AND c = %(a)s', {'a': 1, 'b': 'x'})
+        )
+        self.assertEqual(
+            prepare_query(sql, 'sqlserver', {'a': 1, 'b': 'x'}),
+            ('SELECT * FROM t WHERE a = ? AND b = ? AND c = ?', [1, 'x', 1])
+        )
+        self.assertEqual(
+            prepare_query(sql, 'oracle', {'a': 1}),
+            ('SELECT * FROM t WHERE a = :a AND b = :b AND c = :a', {'a': 1, 'b': None})
+        )
+    
+    def test_literals_comments_and_casts_are_not_parameters(self):
+        """Testa que :nome dentro de literais, comentários e casts é preservado"""
+        sql = "SELECT '10:30', id::text, '100%' FROM t -- :comentario\nWHERE a = :a"
+        
+        compiled = compile_sql(sql, 'postgresql')
+        
+        self.assertEqual(compiled.names, ('a',))
+        self.assertEqual(
+            compiled.sql,
+            "SELECT '10:30', id::text, '100%%' FROM t -- :comentario\nWHERE a = %(a)s"
+        )
+    
+    def test_list_parameter_expanded(self):
+        """Testa expansão de parâmetro com múltiplos valores em IN (...)"""
+        sql, params = prepare_query('SELECT * FROM t WHERE id IN (:ids)', 'sqlserver', {'ids': [1, 2, 3]})
+        
+        self.assertEqual(sql, 'SELECT * FROM t WHERE id IN (?, ?, ?)')
+        self.assertEqual(params, [1, 2, 3])
+    
+    def test_execute_binds_values(self):
+        """Testa execução com valores enviados separadamente do SQL"""
+        self.source_query.query = self.FILTER_SQL
+        self.source_query.save()
+        
+        response = self.client.post(self.execute_url, {
+            'query_id': self.source_query.id,
+            'parameters': {'vendedor': 'Vendedor 3', 'minimo': 2000}
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = [[i, 'Vendedor 3'] for i in range(1, self.ROWS + 1) if i % 7 == 3 and i * 10.5 > 2000]
+        self.assertEqual(response.data['rows'], expected)
+    
+    def test_values_are_not_interpolated(self):
+        """Testa que aspas no valor não alteram o SQL executado"""
+        self.source_query.query = self.FILTER_SQL
+        self.source_query.save()
+        
+        response = self.client.post(self.execute_url, {
+            'query_id': self.source_query.id,
+            'parameters': {'vendedor': "x' OR '1'='1", 'minimo': 0}
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_records'], 0)
+    
+    def test_compiled_query_reused_across_values(self):
+        """Testa que valores diferentes reutilizam a mesma consulta compilada"""
+        self.source_query.query = self.FILTER_SQL
+        self.source_query.save()
+        compile_sql.cache_clear()
+        
+        for vendedor in ['Vendedor 1', 'Vendedor 2', 'Vendedor 3']:
+            response = self.client.post(self.execute_url, {
+                'query_id': self.source_query.id,
+                'parameters': {'vendedor': vendedor, 'minimo': 0}
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        cache_info = compile_sql.cache_info()
+        self.assertEqual(cache_info.misses, 1)
+        self.assertEqual(cache_info.hits, 2)
+
+
+class PaginationTotalTestCase(SourceDatabaseTestCase):
+    """Testa o cálculo do total em execute-paginated"""
+    
+    def setUp(self):
+        super().setUp()
+        self.paginated_url = f'{TestConstants.QUERIES_URL}execute-paginated/'
+    
+    def _page(self, page, **data):
+        data.update({'query_id': self.source_query.id, 'page': page, 'page_size': 100})
+        return self.client.post(self.paginated_url, data, format='json')
+    
+    def _add_rows(self, count):
+        source = sqlite3.connect(self.db_path)
+        source.executemany(
+            'INSERT INTO vendas (id, vendedor, valor) VALUES (?, ?, ?)',
+            [(1000 + i, 'Novo', 1.0) for i in range(count)]
+        )
+        source.commit()
+        source.close()
+    
+    def test_total_reused_across_pages(self):
+        """Testa que as páginas seguintes não recontam o resultado"""
+        first = self._page(1)
+        self.assertEqual(first.data['pagination']['total_records'], self.ROWS)
+        self.assertEqual(first.data['pagination']['total_pages'], 3)
+        
+        with mock.patch.object(StreamingQuery, 'execute_scalar', side_effect=AssertionError('COUNT executado')):
+            second = self._page(2)
+        
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['pagination']['total_records'], self.ROWS)
+        self.assertEqual(second.data['rows'][0][0], 101)
+    
+    def test_total_recounted_after_query_change(self):
+        """Testa que alterar a consulta invalida o total calculado"""
+        self._page(1)
+        self._add_rows(10)
+        self.source_query.save()
+        
+        response = self._page(1)
+        
+        self.assertEqual(response.data['pagination']['total_records'], self.ROWS + 10)
+    
+    def test_window_count_single_round_trip(self):
+        """Testa COUNT(*) OVER() na própria consulta da página"""
+        with mock.patch.object(StreamingQuery, 'execute_scalar', side_effect=AssertionError('COUNT executado')):
+            response = self._page(3, count_mode='window')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['columns'], ['id', 'vendedor', 'valor'])
+        self.assertEqual(response.data['rows'][0], [201, 'Vendedor 5', 2110.5])
+        self.assertEqual(response.data['pagination']['total_records'], self.ROWS)
+        self.assertEqual(response.data['pagination']['records_in_page'], 50)
+    
+    def test_window_count_past_last_page(self):
+        """Testa que uma página vazia ainda retorna o total correto"""
+        response = self._page(5, count_mode='window')
+        
+        self.assertEqual(response.data['rows'], [])
+        self.assertEqual(response.data['pagination']['total_records'], self.ROWS)
+    
+    def test_estimated_falls_back_to_exact(self):
+        """Testa que SGBDs sem estimativa do otimizador usam a contagem exata"""
+        response = self._page(1, count_mode='estimated')
+        
+        self.assertEqual(response.data['pagination']['total_records'], self.ROWS)
+        self.assertFalse(response.data['pagination']['total_is_estimate'])
+    
+    def test_parse_planner_estimates(self):
+        """Testa leitura da estimativa nos planos do PostgreSQL e MySQL"""
+        postgres_plan = [{'Plan': {'Node Type': 'Seq Scan', 'Plan Rows': 1520}}]
+        self.assertEqual(parse_row_estimate('postgresql', postgres_plan), 1520)
+        self.assertEqual(parse_row_estimate('postgresql', json.dumps(postgres_plan)), 1520)
+        
+        mysql_plan = '-> Filter: (vendas.valor > 10)  (cost=25.2 rows=83.3)\n    -> Table scan on vendas'
+        self.assertEqual(parse_row_estimate('mysql', mysql_plan), 83)
+
+
+class KeysetPaginationTestCase(SourceDatabaseTestCase):
+    """Testa a paginação por keyset (cursor de continuação)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.paginated_url = f'{TestConstants.QUERIES_URL}execute-paginated/'
+    
+    def _page(self, cursor=None, order_by=None, **data):
+        data.update({
+            'query_id': self.source_query.id,
+            'pagination_mode': 'keyset',
+            'order_by': order_by or ['id'],
+            'page_size': 100
+        })
+        if cursor:
+            data['cursor'] = cursor
+        return self.client.post(self.paginated_url, data, format='json')
+    
+    def test_walk_all_pages(self):
+        """Testa que os cursores percorrem todo o resultado sem repetir linhas"""
+        ids = []
+        cursor = None
+        pages = 0
+        while True:
+            response = self._page(cursor)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(row[0] for row in response.data['rows'])
+            pages += 1
+            cursor = response.data['pagination']['next_cursor']
+            if not response.data['pagination']['has_next']:
+                break
+        
+        self.assertEqual(pages, 3)
+        self.assertIsNone(cursor)
+        self.assertEqual(ids, list(range(1, self.ROWS + 1)))
+    
+    def test_composite_descending_key(self):
+        """Testa ordenação por várias colunas com direção decrescente"""
+        first = self._page(order_by=['vendedor', '-id'])
+        second = self._page(first.data['pagination']['next_cursor'], order_by=['vendedor', '-id'])
+        
+        expected = sorted(
+            [(f'Vendedor {i % 7}', i) for i in range(1, self.ROWS + 1)],
+            key=lambda row: (row[0], -row[1])
+        )
+        received = [(row[1], row[0]) for row in first.data['rows'] + second.data['rows']]
+        self.assertEqual(received, expected[:200])
+    
+    def test_seek_predicate_instead_of_offset(self):
+        """Testa que a página seguinte filtra pela última chave, sem OFFSET"""
+        first = self._page()
+        
+        with mock.patch('core.views.StreamingQuery', wraps=StreamingQuery) as streaming_query:
+            self._page(first.data['pagination']['next_cursor'])
+        
+        sql, params = streaming_query.call_args[0][1:3]
+        self.assertNotIn('OFFSET', sql.upper())
+        self.assertIn('id > :reportme_key_0', sql)
+        self.assertEqual(params['reportme_key_0'], 100)
+    
+    def test_cursor_bound_to_query_and_parameters(self):
+        """Testa que o cursor não pode ser usado com outra ordenação ou adulterado"""
+        cursor = self._page().data['pagination']['next_cursor']
+        
+        response = self._page(cursor, order_by=['valor'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self._page(cursor[:-2] + 'xx')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_invalid_order_by_rejected(self):
+        """Testa que order_by aceita apenas nomes de coluna"""
+        response = self._page(order_by=['id; DROP TABLE vendas'])
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SnapshotPaginationTestCase(SourceDatabaseTestCase):
+    """Testa a paginação a partir de snapshots locais do resultado"""
+    
+    def setUp(self):
+        super().setUp()
+        self.paginated_url = f'{TestConstants.QUERIES_URL}execute-paginated/'
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.snapshot_settings = {'SNAPSHOT_DIR': self.snapshot_dir}
+    
+    def tearDown(self):
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+        super().tearDown()
+    
+    def _page(self, page, snapshot_id=None, **extra_settings):
+        data = {'query_id': self.source_query.id, 'page': page, 'page_size': 100, 'snapshot': True}
+        if snapshot_id:
+            data['snapshot_id'] = snapshot_id
+        with override_settings(REPORTME_SETTINGS={**self.snapshot_settings, **extra_settings}):
+            return self.client.post(self.paginated_url, data, format='json')
+    
+    def test_pages_served_from_snapshot(self):
+        """Testa que as páginas seguintes não consultam o banco de origem"""
+        first = self._page(1)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertFalse(first.data['cache_hit'])
+        self.assertEqual(first.data['pagination']['total_records'], self.ROWS)
+        snapshot_id = first.data['snapshot']['id']
+        
+        with mock.patch.object(StreamingQuery, 'open', side_effect=AssertionError('Banco de origem consultado')):
+            third = self._page(3, snapshot_id)
+        
+        self.assertTrue(third.data['cache_hit'])
+        self.assertEqual(third.data['snapshot']['id'], snapshot_id)
+        self.assertEqual(third.data['columns'], ['id', 'vendedor', 'valor'])
+        self.assertEqual(third.data['rows'][0], [201, 'Vendedor 5', 2110.5])
+        self.assertEqual(third.data['pagination']['records_in_page'], 50)
+        self.assertFalse(third.data['pagination']['has_next'])
+    
+    def test_snapshot_bound_to_user_and_parameters(self):
+        """Testa que o snapshot só é reaproveitado pelo mesmo usuário e parâmetros"""
+        snapshot_id = self._page(1).data['snapshot']['id']
+        
+        with override_settings(REPORTME_SETTINGS=self.snapshot_settings):
+            self.assertIsNotNone(ResultSnapshot.open(snapshot_id, self.source_query, {}, self.admin_user))
+            self.assertIsNone(ResultSnapshot.open(snapshot_id, self.source_query, {}, self.editor_user))
+            self.assertIsNone(ResultSnapshot.open(snapshot_id, self.source_query, {'x': 1}, self.admin_user))
+            self.assertIsNone(ResultSnapshot.open('../' + snapshot_id, self.source_query, {}, self.admin_user))
+    
+    def test_snapshot_bound_to_connection(self):
+        """Testa que editar a conexão ou trocar a conexão da consulta invalida o snapshot"""
+        snapshot_id = self._page(1).data['snapshot']['id']
+        
+        with override_settings(REPORTME_SETTINGS=self.snapshot_settings):
+            self.source_connection.host = 'outro-host'
+            self.source_connection.save()
+            self.source_query.refresh_from_db()
+            self.assertIsNone(ResultSnapshot.open(snapshot_id, self.source_query, {}, self.admin_user))
+            
+            snapshot_id = self._page(1).data['snapshot']['id']
+            self.source_query.connection = TestDataFactory.create_connection(
+                created_by=self.admin_user, name='Outra origem', database=self.source_connection.database
+            )
+            self.assertIsNone(ResultSnapshot.open(snapshot_id, self.source_query, {}, self.admin_user))
+    
+    def test_expired_snapshot_recreated(self):
+        """Testa que um snapshot expirado é executado novamente"""
+        snapshot_id = self._page(1).data['snapshot']['id']
+        old = os.path.getmtime(os.path.join(self.snapshot_dir, snapshot_id, 'meta.json')) - 3600
+        os.utime(os.path.join(self.snapshot_dir, snapshot_id, 'meta.json'), (old, old))
+        
+        response = self._page(2, snapshot_id)
+        
+        self.assertFalse(response.data['cache_hit'])
+        self.assertNotEqual(response.data['snapshot']['id'], snapshot_id)
+        self.assertFalse(os.path.exists(os.path.join(self.snapshot_dir, snapshot_id)))
+    
+    def test_large_result_falls_back_to_paginated_query(self):
+        """Testa que resultados acima do limite usam a paginação normal"""
+        response = self._page(2, SNAPSHOT_MAX_ROWS=100)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('snapshot', response.data)
+        self.assertEqual(response.data['rows'][0][0], 101)
+        self.assertEqual(os.listdir(self.snapshot_dir), [])
+    
+    def test_least_recently_used_snapshot_evicted(self):
+        """Testa remoção LRU quando o diretório excede o limite em disco"""
+        first_id = self._page(1).data['snapshot']['id']
+        size = sum(
+            os.path.getsize(os.path.join(self.snapshot_dir, first_id, name))
+            for name in os.listdir(os.path.join(self.snapshot_dir, first_id))
+        )
+        old = os.path.getmtime(os.path.join(self.snapshot_dir, first_id, 'meta.json')) - 60
+        os.utime(os.path.join(self.snapshot_dir, first_id, 'meta.json'), (old, old))
+        
+        self.source_query.save()
+        second_id = self._page(1, SNAPSHOT_DIR_MAX_BYTES=int(size * 1.5)).data['snapshot']['id']
+        
+        self.assertEqual(os.listdir(self.snapshot_dir), [second_id])
+
+
+class ColumnarFormatTestCase(SourceDatabaseTestCase):
+    """Testa o formato colunar (?format=columnar) dos resultados"""
+    
+    def test_execute_columnar(self):
+        """Testa um array por coluna com o tipo de cada coluna"""
+        response = self.client.post(f'{self.execute_url}?format=columnar', {
+            'query_id': self.source_query.id,
+            'limit': 1000
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data['format'], 'columnar')
+        self.assertNotIn('rows', data)
+        self.assertEqual(data['columns'], ['id', 'vendedor', 'valor'])
+        self.assertEqual(data['column_types'], ['integer', 'string', 'number'])
+        self.assertEqual(data['data'][0], list(range(1, self.ROWS + 1)))
+        self.assertEqual(data['data'][1][:2], ['Vendedor 1', 'Vendedor 2'])
+        self.assertEqual(data['total_records'], self.ROWS)
+    
+    def test_columnar_only_on_execution_actions(self):
+        """Testa que list e retrieve não aceitam ?format=columnar"""
+        for url in (TestConstants.QUERIES_URL, f'{TestConstants.QUERIES_URL}{self.source_query.id}/'):
+            response = self.client.get(f'{url}?format=columnar')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, url)
+    
+    def test_execute_paginated_columnar(self):
+        """Testa o formato colunar em execute-paginated"""
+        response = self.client.post(f'{TestConstants.QUERIES_URL}execute-paginated/?format=columnar', {
+            'query_id': self.source_query.id,
+            'page': 2,
+            'page_size': 10
+        }, format='json')
+        
+        data = json.loads(response.content)
+        self.assertEqual(data['data'][0], list(range(11, 21)))
+        self.assertEqual(data['pagination']['total_records'], self.ROWS)
+    
+    def test_default_format_unchanged(self):
+        """Testa que sem ?format=columnar o resultado continua em linhas"""
+        response = self.client.post(self.execute_url, {'query_id': self.source_query.id}, format='json')
+        
+        self.assertIn('rows', response.data)
+        self.assertEqual(response.data['column_types'], ['integer', 'string', 'number'])
+    
+    def test_typed_columns_converted(self):
+        """Testa conversão de colunas Decimal, date e datetime"""
+        description = [('valor', 1700), ('dia', 1082), ('momento', 1114), ('nome', 25)]
+        column_types = describe_columns(description, 'postgresql')
+        self.assertEqual(column_types, ['decimal', 'date', 'datetime', 'string'])
+        
+        result = to_columnar({
+            'columns': ['valor', 'dia', 'momento', 'nome'],
+            'column_types': column_types,
+            'rows': [
+                [Decimal('10.50'), datetime.date(2024, 1, 31), datetime.datetime(2024, 1, 31, 8, 30), 'a'],
+                [None, None, None, None],
+            ]
+        })
+        
+        self.assertEqual(result['data'], [
+            [10.5, None],
+            ['2024-01-31', None],
+            ['2024-01-31T08:30:00', None],
+            ['a', None],
+        ])
+    
+    def test_types_inferred_without_description_types(self):
+        """Testa inferência pelos valores quando o driver não informa o tipo"""
+        description = [('a', None), ('b', None), ('c', None)]
+        rows = [[None, 1.5, True], [Decimal('1'), 2.0, False]]
+        
+        self.assertEqual(describe_columns(description, 'sqlite', rows), ['decimal', 'number', 'boolean'])
+
+
+class AsyncExecutionTestCase(SourceDatabaseTestCase):
+    """Testa a execução assíncrona (queries/execute-async/)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.async_url = f'{TestConstants.QUERIES_URL}execute-async/'
+        token = RefreshToken.for_user(self.admin_user).access_token
+        self.auth_headers = {'Authorization': f'Bearer {token}'}
+    
+    def test_execute_async(self):
+        """Testa que a rota assíncrona retorna o mesmo resultado de execute"""
+        response = self.client.post(self.async_url, {'query_id': self.source_query.id, 'limit': 1000}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['columns'], ['id', 'vendedor', 'valor'])
+        self.assertEqual(data['total_records'], self.ROWS)
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertEqual(execution.status, 'success')
+        self.assertEqual(execution.rows_returned, self.ROWS)
+    
+    def test_requires_authentication(self):
+        """Testa que a rota exige o token JWT"""
+        self.logout()
+        
+        response = self.client.post(self.async_url, {'query_id': self.source_query.id}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_invalid_sql_returns_400(self):
+        """Testa erro de SQL na rota assíncrona"""
+        self.source_query.query = 'SELECT coluna_inexistente FROM vendas'
+        self.source_query.save()
+        
+        response = self.client.post(self.async_url, {'query_id': self.source_query.id}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.json()['success'])
+    
+    async def test_concurrent_executions(self):
+        """Testa várias execuções simultâneas no mesmo event loop"""
+        responses = await asyncio.gather(*[
+            self.async_client.post(
+                self.async_url, {'query_id': self.source_query.id, 'limit': 10},
+                content_type='application/json', headers=self.auth_headers
+            )
+            for _ in range(8)
+        ])
+        
+        self.assertEqual([response.status_code for response in responses], [200] * 8)
+        self.assertTrue(all(len(response.json()['rows']) == 10 for response in responses))
+    
+    async def test_connection_concurrency_limit(self):
+        """Testa 503 quando a conexão está no limite de execuções simultâneas"""
+        limits = {'ASYNC_CONNECTION_CONCURRENCY': 1, 'ASYNC_QUEUE_TIMEOUT': 0.1}
+        with override_settings(REPORTME_SETTINGS=limits):
+            async with connection_limiter.slot(self.source_connection.id):
+                response = await self.async_client.post(
+                    self.async_url, {'query_id': self.source_query.id},
+                    content_type='application/json', headers=self.auth_headers
+                )
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertTrue(response.json()['busy'])
+        self.assertEqual(response['Retry-After'], '5')
+    
+    async def test_limiter_releases_slot(self):
+        """Testa que a vaga é liberada ao final (inclusive com erro)"""
+        with override_settings(REPORTME_SETTINGS={'ASYNC_CONNECTION_CONCURRENCY': 1}):
+            with self.assertRaises(ValueError):
+                async with connection_limiter.slot('liberacao'):
+                    raise ValueError('erro na execução')
+            
+            async with connection_limiter.slot('liberacao', timeout=0.1):
+                pass
+            
+            async with connection_limiter.slot('liberacao'):
+                with self.assertRaises(ConnectionBusyError):
+                    async with connection_limiter.slot('liberacao', timeout=0.05):
+                        pass
+
+
+class CSVExportTestCase(SourceDatabaseTestCase):
+    """Testa a exportação CSV em streaming (queries/export/)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.export_url = f'{TestConstants.QUERIES_URL}export/'
+    
+    def _export(self, **data):
+        return self.client.post(self.export_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000,
+            'format': 'csv',
+            **data
+        }, format='json')
+    
+    @override_settings(REPORTME_SETTINGS={'STREAM_BATCH_SIZE': 60})
+    def test_export_csv_streaming(self):
+        """Testa que o CSV é enviado em partes, um bloco por lote do cursor"""
+        with mock.patch.object(StreamingQuery, 'fetch_all') as fetch_all:
+            response = self._export()
+            chunks = list(response.streaming_content)
+        
+        fetch_all.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="Vendas_export.csv"', response['Content-Disposition'])
+        # Cabeçalho + 5 lotes
+        self.assertEqual(len(chunks), 6)
+        
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+        self.assertEqual(rows[0], ['id', 'vendedor', 'valor'])
+        self.assertEqual(rows[1], ['1', 'Vendedor 1', '10.5'])
+        self.assertEqual(len(rows), self.ROWS + 1)
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertEqual(execution.status, 'success')
+        self.assertEqual(execution.rows_returned, self.ROWS)
+    
+    def test_export_csv_quoting(self):
+        """Testa valores com separador, aspas, quebra de linha e nulos"""
+        self.source_query.query = (
+            "SELECT 'a,b' AS texto, 'diz \"oi\"' AS aspas, 'linha 1' || char(10) || 'linha 2' AS quebra, NULL AS nulo"
+        )
+        self.source_query.save()
+        
+        response = self._export()
+        content = b''.join(response.streaming_content).decode('utf-8')
+        
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[1], ['a,b', 'diz "oi"', 'linha 1\nlinha 2', ''])
+    
+    def test_export_csv_respects_limit(self):
+        """Testa que o limite da exportação é aplicado no SQL"""
+        response = self._export(limit=10)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        
+        self.assertEqual(len(list(csv.reader(io.StringIO(content)))), 11)
+    
+    def test_export_csv_invalid_sql(self):
+        """Testa que erro de SQL ainda retorna 400 antes do download começar"""
+        self.source_query.query = 'SELECT coluna_inexistente FROM vendas'
+        self.source_query.save()
+        
+        response = self._export()
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('coluna_inexistente', response.data['error'])
+
+
+class XLSXExportTestCase(SourceDatabaseTestCase):
+    """Testa a exportação Excel sem pandas (openpyxl write-only)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.export_url = f'{TestConstants.QUERIES_URL}export/'
+    
+    def _export(self, **data):
+        return self.client.post(self.export_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000,
+            'format': 'excel',
+            **data
+        }, format='json')
+    
+    def _workbook(self, response):
+        return load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+    
+    @override_settings(REPORTME_SETTINGS={'STREAM_BATCH_SIZE': 60})
+    def test_export_xlsx(self):
+        """Testa as abas Dados e Metadados, lidas do cursor em lotes"""
+        with mock.patch.object(StreamingQuery, 'fetch_all') as fetch_all:
+            response = self._export()
+            workbook = self._workbook(response)
+        
+        fetch_all.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        self.assertIn('filename="Vendas_export.xlsx"', response['Content-Disposition'])
+        self.assertEqual(workbook.sheetnames, ['Dados', 'Metadados'])
+        
+        rows = list(workbook['Dados'].values)
+        self.assertEqual(rows[0], ('id', 'vendedor', 'valor'))
+        self.assertEqual(rows[1], (1, 'Vendedor 1', 10.5))
+        self.assertEqual(len(rows), self.ROWS + 1)
+        
+        metadata = dict(list(workbook['Metadados'].values)[1:])
+        self.assertEqual(metadata['Consulta'], 'Vendas')
+        self.assertEqual(metadata['Registros'], self.ROWS)
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertEqual(execution.status, 'success')
+        self.assertEqual(execution.rows_returned, self.ROWS)
+    
+    def test_export_xlsx_converts_values(self):
+        """Testa valores que o Excel não aceita diretamente"""
+        self.source_query.query = "SELECT 'ab' || char(1) AS controle, NULL AS nulo, x'6f69' AS binario"
+        self.source_query.save()
+        
+        rows = list(self._workbook(self._export())['Dados'].values)
+        
+        self.assertEqual(rows[1], ('ab', None, 'oi'))
+    
+    def test_export_xlsx_invalid_sql(self):
+        """Testa que erro de SQL retorna 400"""
+        self.source_query.query = 'SELECT coluna_inexistente FROM vendas'
+        self.source_query.save()
+        
+        response = self._export()
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('coluna_inexistente', response.data['error'])
+
+
+class ExportJobTestCase(SourceDatabaseTestCase):
+    """Testa as exportações em segundo plano (export-jobs/)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.export_dir = tempfile.mkdtemp()
+        self.jobs_url = '/api/core/export-jobs/'
+        self.job_settings = {'EXPORT_JOB_BACKEND': 'inline', 'EXPORT_DIR': self.export_dir}
+    
+    def tearDown(self):
+        shutil.rmtree(self.export_dir, ignore_errors=True)
+        super().tearDown()
+    
+    def _submit(self, **data):
+        with override_settings(REPORTME_SETTINGS=self.job_settings):
+            return self.client.post(self.jobs_url, {
+                'query_id': self.source_query.id,
+                'format': 'csv',
+                **data
+            }, format='json')
+    
+    def test_submit_status_and_download(self):
+        """Testa o ciclo completo: enfileirar, acompanhar e baixar"""
+        response = self._submit()
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['id']
+        
+        response = self.client.get(f'{self.jobs_url}{job_id}/')
+        self.assertEqual(response.data['status'], 'success')
+        self.assertEqual(response.data['rows_written'], self.ROWS)
+        self.assertTrue(response.data['download_url'].endswith(f'/export-jobs/{job_id}/download/'))
+        
+        response = self.client.get(f'{self.jobs_url}{job_id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('filename="Vendas_export.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rows), self.ROWS + 1)
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertEqual(execution.status, 'success')
+        self.assertEqual(execution.rows_returned, self.ROWS)
+    
+    def test_progress_updated_per_batch(self):
+        """Testa que rows_written é atualizado durante a gravação"""
+        progress = []
+        original_update = QuerySet.update
+        
+        def record_update(queryset, **kwargs):
+            if set(kwargs) == {'rows_written'}:
+                progress.append(kwargs['rows_written'])
+            return original_update(queryset, **kwargs)
+        
+        self.job_settings.update({'STREAM_BATCH_SIZE': 100, 'EXPORT_PROGRESS_INTERVAL': 0})
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=record_update):
+            response = self._submit(format='excel')
+        
+        self.assertEqual(progress, [100, 200, 250])
+        job = ExportJob.objects.get(pk=response.data['id'])
+        self.assertEqual(job.rows_written, self.ROWS)
+        self.assertTrue(job.file_path.endswith('.xlsx'))
+    
+    def test_job_error_recorded(self):
+        """Testa que erro de SQL é registrado no job"""
+        self.source_query.query = 'SELECT coluna_inexistente FROM vendas'
+        self.source_query.save()
+        
+        response = self._submit()
+        job_id = response.data['id']
+        
+        self.assertEqual(response.data['status'], 'error')
+        self.assertIn('coluna_inexistente', response.data['error_message'])
+        response = self.client.get(f'{self.jobs_url}{job_id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(os.listdir(self.export_dir), [])
+    
+    def test_job_runs_once(self):
+        """Testa que um job entregue duas vezes é executado apenas uma"""
+        with override_settings(REPORTME_SETTINGS=self.job_settings):
+            job = ExportJob.objects.create(query=self.source_query, user=self.admin_user, format='csv', limit=10)
+            run_export_job(job.pk)
+            run_export_job(job.pk)
+        
+        self.assertEqual(QueryExecution.objects.filter(query=self.source_query).count(), 1)
+    
+    def test_limit_above_max_export_rows(self):
+        """Testa o limite máximo de registros (MAX_EXPORT_ROWS)"""
+        self.job_settings['MAX_EXPORT_ROWS'] = 100
+        
+        response = self._submit(limit=101)
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('limit', response.data)
+    
+    def test_jobs_visible_only_to_owner(self):
+        """Testa que usuários comuns não veem exportações de outros usuários"""
+        job_id = self._submit().data['id']
+        
+        self.authenticate_readonly()
+        response = self.client.get(f'{self.jobs_url}{job_id}/')
+        
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_expired_files_removed(self):
+        """Testa a remoção de arquivos de exportações expiradas"""
+        job_id = self._submit().data['id']
+        ExportJob.objects.filter(pk=job_id).update(finished_at=timezone.now() - datetime.timedelta(days=2))
+        
+        with override_settings(REPORTME_SETTINGS=self.job_settings):
+            purge_expired_exports()
+        
+        self.assertEqual(ExportJob.objects.get(pk=job_id).status, 'expired')
+        self.assertEqual(os.listdir(self.export_dir), [])
+        response = self.client.get(f'{self.jobs_url}{job_id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    
+    def test_stale_running_job_marked_as_error(self):
+        """Testa que um job preso em execução (worker encerrado) vira erro e o .tmp é removido"""
+        job = ExportJob.objects.create(
+            query=self.source_query, user=self.admin_user, format='csv', status='running',
+            started_at=timezone.now() - datetime.timedelta(hours=2)
+        )
+        recent = ExportJob.objects.create(
+            query=self.source_query, user=self.admin_user, format='csv', status='running',
+            started_at=timezone.now()
+        )
+        temp_path = os.path.join(self.export_dir, f'{job.pk}.csv.tmp')
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(b'id\n1\n')
+        
+        with override_settings(REPORTME_SETTINGS=self.job_settings):
+            fail_stale_exports()
+        
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'error')
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(os.path.exists(temp_path))
+        self.assertEqual(ExportJob.objects.get(pk=recent.pk).status, 'running')
+
+
+PYARROW_INSTALLED = importlib.util.find_spec('pyarrow') is not None
+
+
+class ColumnarExportTestCase(SourceDatabaseTestCase):
+    """Testa as exportações Parquet e Arrow IPC"""
+    
+    def setUp(self):
+        super().setUp()
+        self.export_url = f'{TestConstants.QUERIES_URL}export/'
+    
+    def _export(self, export_format, **data):
+        return self.client.post(self.export_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000,
+            'format': export_format,
+            **data
+        }, format='json')
+    
+    @skipIf(PYARROW_INSTALLED, 'pyarrow instalado')
+    def test_unavailable_without_pyarrow(self):
+        """Testa erro claro (sem executar a consulta) quando pyarrow não está instalado"""
+        response = self._export('parquet')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pyarrow', response.data['error'])
+        self.assertFalse(QueryExecution.objects.filter(query=self.source_query).exists())
+    
+    @skipUnless(PYARROW_INSTALLED, 'pyarrow não instalado')
+    @override_settings(REPORTME_SETTINGS={'STREAM_BATCH_SIZE': 60, 'PARQUET_ROW_GROUP_SIZE': 100})
+    def test_export_parquet(self):
+        """Testa Parquet tipado a partir do cursor, em row groups"""
+        import pyarrow.parquet
+        
+        response = self._export('parquet')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('filename="Vendas_export.parquet"', response['Content-Disposition'])
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(parquet_file.metadata.num_rows, self.ROWS)
+        self.assertGreater(parquet_file.metadata.num_row_groups, 1)
+        table = parquet_file.read()
+        self.assertEqual([str(field.type) for field in table.schema], ['int64', 'string', 'double'])
+        self.assertEqual(table.slice(0, 1).to_pylist(), [{'id': 1, 'vendedor': 'Vendedor 1', 'valor': 10.5}])
+    
+    @skipUnless(PYARROW_INSTALLED, 'pyarrow não instalado')
+    def test_export_arrow_stream(self):
+        """Testa Arrow IPC (stream), um RecordBatch por lote"""
+        import pyarrow.ipc
+        
+        response = self._export('arrow')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table = pyarrow.ipc.open_stream(b''.join(response.streaming_content)).read_all()
+        self.assertEqual(table.num_rows, self.ROWS)
+        self.assertEqual(table.column_names, ['id', 'vendedor', 'valor'])
+    
+    @skipUnless(PYARROW_INSTALLED, 'pyarrow não instalado')
+    def test_schema_from_description(self):
+        """Testa que lotes posteriores com valores nulos, Decimal ou fuso diferentes do primeiro não quebram o arquivo"""
+        import pyarrow.parquet
+        
+        class MixedStream:
+            columns = ['id', 'total', 'criado_em', 'valor']
+            column_types = ['integer', 'integer', 'datetime', 'decimal']
+            description = [
+                ('id', int), ('total', int), ('criado_em', datetime.datetime),
+                ('valor', Decimal, None, None, 10, 2, None),
+            ]
+            
+            def batches(self):
+                yield [[1, None, None, Decimal('1.50')]]
+                yield [[2, Decimal('7'), datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc), Decimal('2.345')]]
+            
+            def close(self):
+                pass
+        
+        output = io.BytesIO()
+        self.assertEqual(write_parquet(MixedStream(), output), 2)
+        
+        table = pyarrow.parquet.read_table(io.BytesIO(output.getvalue()))
+        self.assertEqual([str(field.type) for field in table.schema], ['int64', 'int64', 'timestamp[us]', 'decimal128(10, 2)'])
+        self.assertEqual(table.column('total').to_pylist(), [None, 7])
+        self.assertEqual(table.column('criado_em').to_pylist(), [None, datetime.datetime(2024, 1, 1, 12)])
+        self.assertEqual(table.column('valor').to_pylist(), [Decimal('1.50'), Decimal('2.34')])
+
+
+class CompressedExportTestCase(SourceDatabaseTestCase):
+    """Testa a compressão em streaming das exportações CSV (gzip / zstd)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.export_url = f'{TestConstants.QUERIES_URL}export/'
+    
+    def _export(self, headers=None, **data):
+        return self.client.post(self.export_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000,
+            'format': 'csv',
+            **data
+        }, format='json', headers=headers)
+    
+    def _rows(self, content):
+        return list(csv.reader(io.StringIO(content.decode('utf-8'))))
+    
+    @override_settings(REPORTME_SETTINGS={'STREAM_BATCH_SIZE': 60})
+    def test_gzip_file_by_parameter(self):
+        """Testa compression=gzip: arquivo .csv.gz comprimido lote a lote"""
+        response = self._export(compression='gzip')
+        chunks = list(response.streaming_content)
+        
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('filename="Vendas_export.csv.gz"', response['Content-Disposition'])
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertGreater(len(chunks), 5)
+        
+        rows = self._rows(gzip.decompress(b''.join(chunks)))
+        self.assertEqual(len(rows), self.ROWS + 1)
+        self.assertEqual(rows[1], ['1', 'Vendedor 1', '10.5'])
+    
+    def test_gzip_negotiated_by_accept_encoding(self):
+        """Testa Content-Encoding negociado pelo Accept-Encoding (arquivo continua .csv)"""
+        response = self._export(headers={'Accept-Encoding': 'br, gzip;q=0.8'})
+        
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('filename="Vendas_export.csv"', response['Content-Disposition'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        rows = self._rows(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(len(rows), self.ROWS + 1)
+    
+    def test_uncompressed_when_refused(self):
+        """Testa CSV sem compressão com gzip;q=0 ou compression=none"""
+        response = self._export(headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        
+        response = self._export(headers={'Accept-Encoding': 'gzip'}, compression='none')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(self._rows(b''.join(response.streaming_content))), self.ROWS + 1)
+    
+    @skipIf(importlib.util.find_spec('zstandard') is not None, 'zstandard instalado')
+    def test_zstd_unavailable(self):
+        """Testa erro claro quando zstandard não está instalado"""
+        response = self._export(compression='zstd')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('zstandard', response.data['error'])
+        self.assertEqual(negotiate_compression('zstd, gzip'), 'gzip')
+    
+    @override_settings(REPORTME_SETTINGS={'STREAM_BATCH_SIZE': 60})
+    def test_interrupted_download_releases_stream(self):
+        """Testa que interromper o download comprimido encerra a leitura e registra a execução"""
+        response = self._export(compression='gzip')
+        next(iter(response.streaming_content))
+        response.close()
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertLess(execution.rows_returned, self.ROWS)
+    
+    def test_export_job_compressed(self):
+        """Testa exportação em segundo plano com compressão gzip"""
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir, ignore_errors=True)
+        job_settings = {'EXPORT_JOB_BACKEND': 'inline', 'EXPORT_DIR': export_dir}
+        
+        with override_settings(REPORTME_SETTINGS=job_settings):
+            response = self.client.post('/api/core/export-jobs/', {
+                'query_id': self.source_query.id, 'format': 'csv', 'compression': 'gzip'
+            }, format='json')
+        
+        self.assertEqual(response.data['compression'], 'gzip')
+        response = self.client.get(f"/api/core/export-jobs/{response.data['id']}/download/")
+        self.assertIn('filename="Vendas_export.csv.gz"', response['Content-Disposition'])
+        rows = self._rows(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(len(rows), self.ROWS + 1)
+    
+    def test_export_job_compression_only_for_csv(self):
+        """Testa que a compressão é recusada para formatos binários"""
+        response = self.client.post('/api/core/export-jobs/', {
+            'query_id': self.source_query.id, 'format': 'excel', 'compression': 'gzip'
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('compression', response.data)
+
+
+class BulkExportTestCase(SourceDatabaseTestCase):
+    """Testa a exportação em lote de uma pasta (project-nodes/<id>/export/)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.folder = TestDataFactory.create_project_node(self.test_project, self.root_node, name='Fechamento')
+        TestDataFactory.create_project_node(self.test_project, self.folder, name='Vendas', order=1, query=self.source_query)
+        detail = TestDataFactory.create_project_node(self.test_project, self.folder, name='Detalhe', order=2)
+        TestDataFactory.create_project_node(
+            self.test_project, detail, name='Maiores vendas', order=1,
+            query=self._create_query('Maiores', 'SELECT id, valor FROM vendas WHERE valor > 2500 ORDER BY valor DESC')
+        )
+        TestDataFactory.create_project_node(
+            self.test_project, detail, name='Resumo: vendedores', order=2,
+            query=self._create_query('Resumo', 'SELECT vendedor, COUNT(*) AS total FROM vendas GROUP BY vendedor')
+        )
+        TestDataFactory.create_project_node(
+            self.test_project, self.folder, name='Quebrado', order=3,
+            query=self._create_query('Quebrado', 'SELECT coluna_inexistente FROM vendas')
+        )
+        self.export_url = f'{TestConstants.PROJECT_NODES_URL}{self.folder.id}/export/'
+    
+    def _create_query(self, name, sql):
+        return TestDataFactory.create_query(
+            connection=self.source_connection, created_by=self.admin_user, name=name, query=sql
+        )
+    
+    def test_export_workbook(self):
+        """Testa a pasta de trabalho: índice + uma aba por relatório, na ordem da árvore"""
+        response = self.client.post(self.export_url, {'format': 'excel'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('filename="Fechamento_export.xlsx"', response['Content-Disposition'])
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        self.assertEqual(workbook.sheetnames, ['Índice', 'Vendas', 'Maiores vendas', 'Resumo_ vendedores'])
+        self.assertEqual(len(list(workbook['Vendas'].values)), self.ROWS + 1)
+        self.assertEqual(list(workbook['Resumo_ vendedores'].values)[0], ('vendedor', 'total'))
+        
+        index = list(workbook['Índice'].values)
+        self.assertEqual([row[0] for row in index[1:]], ['Vendas', 'Maiores vendas', 'Resumo: vendedores', 'Quebrado'])
+        self.assertEqual(index[1][1], 'Fechamento / Vendas')
+        self.assertEqual(index[1][2], self.ROWS)
+        self.assertEqual(index[4][4], 'error')
+        self.assertIn('coluna_inexistente', index[4][5])
+        
+        self.assertEqual(QueryExecution.objects.filter(status='success').count(), 3)
+        self.assertEqual(QueryExecution.objects.filter(status='error').count(), 1)
+    
+    def test_export_zip(self):
+        """Testa o ZIP com um CSV por relatório e o índice"""
+        response = self.client.post(self.export_url, {'format': 'zip'}, format='json')
+        
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(
+            sorted(archive.namelist()),
+            ['1 - Vendas.csv', '2 - Maiores vendas.csv', '3 - Resumo_ vendedores.csv', 'indice.csv']
+        )
+        rows = list(csv.reader(io.StringIO(archive.read('1 - Vendas.csv').decode('utf-8'))))
+        self.assertEqual(len(rows), self.ROWS + 1)
+        index = list(csv.reader(io.StringIO(archive.read('indice.csv').decode('utf-8'))))
+        self.assertEqual(index[4][4], 'error')
+        self.assertEqual(QueryExecution.objects.count(), 4)
+    
+    def test_reports_run_in_parallel(self):
+        """Testa que o tempo total é próximo ao do relatório mais lento"""
+        original_open = StreamingQuery.open
+        
+        def slow_open(stream):
+            time.sleep(0.3)
+            return original_open(stream)
+        
+        with mock.patch.object(StreamingQuery, 'open', autospec=True, side_effect=slow_open):
+            start = time.time()
+            response = self.client.post(self.export_url, {'format': 'excel'}, format='json')
+            elapsed = time.time() - start
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLess(elapsed, 0.9)
+    
+    def test_connection_concurrency_limit(self):
+        """Testa o limite de consultas simultâneas por conexão"""
+        running = []
+        peak = []
+        lock = threading.Lock()
+        original_open = StreamingQuery.open
+        
+        def tracked_open(stream):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            return original_open(stream)
+        
+        with override_settings(REPORTME_SETTINGS={'BULK_EXPORT_CONNECTION_CONCURRENCY': 1}):
+            with mock.patch.object(StreamingQuery, 'open', autospec=True, side_effect=tracked_open):
+                self.client.post(self.export_url, {'format': 'excel'}, format='json')
+        
+        self.assertEqual(max(peak), 1)
+        self.assertEqual(len(peak), 4)
+    
+    def test_connection_limit_shared_between_exports(self):
+        """Testa que o limite por conexão vale para exportações simultâneas"""
+        running = []
+        peak = []
+        lock = threading.Lock()
+        original_open = StreamingQuery.open
+        
+        def tracked_open(stream):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            return original_open(stream)
+        
+        exports = [BulkExport(collect_reports(self.folder)) for _ in range(2)]
+        with override_settings(REPORTME_SETTINGS={'BULK_EXPORT_CONNECTION_CONCURRENCY': 1}):
+            with mock.patch.object(StreamingQuery, 'open', autospec=True, side_effect=tracked_open):
+                threads = [threading.Thread(target=export.write_xlsx, args=(io.BytesIO(),)) for export in exports]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        
+        self.assertEqual(max(peak), 1)
+        self.assertEqual(len(peak), 8)
+    
+    def test_interrupted_zip_stops_reports(self):
+        """Testa que interromper o ZIP encerra as consultas antes de descartar os arquivos"""
+        original_open = StreamingQuery.open
+        
+        def slow_open(stream):
+            time.sleep(0.2)
+            return original_open(stream)
+        
+        export = BulkExport(collect_reports(self.folder))
+        with override_settings(REPORTME_SETTINGS={'BULK_EXPORT_CONNECTION_CONCURRENCY': 1}):
+            with mock.patch.object(StreamingQuery, 'open', autospec=True, side_effect=slow_open):
+                chunks = export.stream_zip()
+                next(chunks)
+                chunks.close()
+        
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith('reportme-bulk')])
+        self.assertTrue(all(report.spool is None for report in export.reports))
+        self.assertTrue(any(isinstance(report.error, BulkExportCancelled) for report in export.reports))
+    
+    def test_folder_without_reports(self):
+        """Testa pasta sem relatórios"""
+        empty = TestDataFactory.create_project_node(self.test_project, self.root_node, name='Vazia')
+        
+        response = self.client.post(f'{TestConstants.PROJECT_NODES_URL}{empty.id}/export/', {}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportArtifactTestCase(SourceDatabaseTestCase):
+    """Testa o reaproveitamento de arquivos exportados (artefatos)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.artifact_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(REPORTME_SETTINGS={'ARTIFACT_DIR': self.artifact_dir})
+        self.settings_override.enable()
+        self.source_query.cache_duration = 60
+        self.source_query.save()
+        self.export_url = f'{TestConstants.QUERIES_URL}export/'
+        self.artifacts_url = '/api/core/export-artifacts/'
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.artifact_dir, ignore_errors=True)
+        super().tearDown()
+    
+    def _export(self, **data):
+        response = self.client.post(self.export_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000,
+            'format': 'excel',
+            **data
+        }, format='json')
+        content = b''.join(response.streaming_content) if response.status_code == 200 else b''
+        return response, content
+    
+    def _add_row(self):
+        source = sqlite3.connect(self.db_path)
+        source.execute("INSERT INTO vendas (id, vendedor, valor) VALUES (999, 'Novo', 1.0)")
+        source.commit()
+        source.close()
+    
+    def test_second_export_served_from_artifact(self):
+        """Testa que a segunda exportação reutiliza o arquivo sem consultar a origem"""
+        first, first_content = self._export()
+        self._add_row()
+        
+        with mock.patch.object(StreamingQuery, 'open') as stream_open:
+            second, second_content = self._export()
+        
+        stream_open.assert_not_called()
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second_content, first_content)
+        self.assertIn('filename="Vendas_export.xlsx"', second['Content-Disposition'])
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertTrue(execution.cache_hit)
+        self.assertEqual(execution.rows_returned, self.ROWS)
+    
+    def test_artifact_key_includes_parameters_format_and_limit(self):
+        """Testa que formato, limite e parâmetros diferentes geram novos arquivos"""
+        self._export()
+        self._export(limit=10)
+        self._export(format='csv')
+        self._export(parameters={'x': 1})
+        self._export(parameters={'x': 1, 'vazio': ''})
+        
+        self.assertEqual(
+            QueryExecution.objects.filter(query=self.source_query, cache_hit=False).count(), 4
+        )
+        self.assertEqual(len(list_artifacts()), 4)
+    
+    def test_csv_artifact_serves_compressed_downloads(self):
+        """Testa que o CSV armazenado atende downloads com e sem compressão"""
+        _, plain = self._export(format='csv')
+        self._add_row()
+        
+        response, content = self._export(format='csv', compression='gzip')
+        
+        self.assertIn('filename="Vendas_export.csv.gz"', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(content), plain)
+        self.assertEqual(len(plain.decode('utf-8').splitlines()), self.ROWS + 1)
+    
+    def test_interrupted_csv_download_not_stored(self):
+        """Testa que um download interrompido não publica um artefato incompleto"""
+        with override_settings(REPORTME_SETTINGS={'ARTIFACT_DIR': self.artifact_dir, 'STREAM_BATCH_SIZE': 50}):
+            response = self.client.post(self.export_url, {
+                'query_id': self.source_query.id, 'limit': 1000, 'format': 'csv'
+            }, format='json')
+            chunks = iter(response.streaming_content)
+            next(chunks)
+            next(chunks)
+            response.close()
+        
+        self.assertEqual(list_artifacts(), [])
+        self.assertEqual(os.listdir(self.artifact_dir), [])
+    
+    def test_query_change_invalidates_artifact(self):
+        """Testa que alterar a consulta deixa de usar o arquivo anterior"""
+        self._export()
+        self.source_query.query = 'SELECT id, vendedor FROM vendas ORDER BY id'
+        self.source_query.save()
+        
+        response, content = self._export()
+        
+        workbook = load_workbook(io.BytesIO(content), read_only=True)
+        self.assertEqual(list(workbook['Dados'].values)[0], ('id', 'vendedor'))
+    
+    def test_expired_artifact_not_used(self):
+        """Testa que o arquivo vale apenas por cache_duration"""
+        self._export()
+        
+        with mock.patch('core.artifacts.time.time', return_value=time.time() + 61):
+            self._export()
+        
+        self.assertEqual(QueryExecution.objects.filter(query=self.source_query, cache_hit=True).count(), 0)
+    
+    def test_without_cache_duration_nothing_stored(self):
+        """Testa que consultas sem cache não guardam arquivos"""
+        self.source_query.cache_duration = 0
+        self.source_query.save()
+        
+        self._export()
+        self._export(format='csv')
+        
+        self.assertEqual(os.listdir(self.artifact_dir), [])
+    
+    def test_lru_eviction(self):
+        """Testa que, acima do limite em disco, os menos acessados são removidos"""
+        self._export(limit=10)
+        self._export(limit=20)
+        artifacts = {artifact.meta['limit']: artifact for artifact in list_artifacts()}
+        past = time.time() - 30
+        os.utime(artifacts[10].meta_path, (past, past))
+        os.utime(artifacts[20].meta_path, (past - 10, past - 10))
+        
+        # Acesso renova o artefato de limite 20
+        self._export(limit=20)
+        max_bytes = artifacts[10].size + artifacts[20].size + 1000
+        with override_settings(REPORTME_SETTINGS={'ARTIFACT_DIR': self.artifact_dir, 'ARTIFACT_DIR_MAX_BYTES': max_bytes}):
+            self._export(limit=30)
+        
+        self.assertEqual(sorted(artifact.meta['limit'] for artifact in list_artifacts()), [20, 30])
+    
+    def test_admin_list_and_purge(self):
+        """Testa o endpoint de administração dos artefatos"""
+        self._export()
+        self._export(format='csv')
+        
+        response = self.client.get(self.artifacts_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['artifacts'][0]['format'], 'csv')
+        self.assertEqual(response.data['artifacts'][0]['rows'], self.ROWS)
+        
+        key = response.data['artifacts'][0]['key']
+        self.assertEqual(self.client.delete(f'{self.artifacts_url}{key}/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(f'{self.artifacts_url}{key}/').status_code, status.HTTP_404_NOT_FOUND)
+        
+        response = self.client.post(f'{self.artifacts_url}purge/', {'query_id': self.source_query.id}, format='json')
+        self.assertEqual(response.data['removed'], 1)
+        self.assertEqual(os.listdir(self.artifact_dir), [])
+    
+    def test_admin_endpoint_requires_admin(self):
+        """Testa que usuários comuns não acessam os artefatos"""
+        self.authenticate_readonly()
+        
+        self.assertEqual(self.client.get(self.artifacts_url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.post(f'{self.artifacts_url}purge/', {}, format='json').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ResumableDownloadTestCase(SourceDatabaseTestCase):
+    """Testa Range, If-Range e ETag nos downloads de arquivos exportados"""
+    
+    def setUp(self):
+        super().setUp()
+        self.export_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(REPORTME_SETTINGS={
+            'EXPORT_JOB_BACKEND': 'inline', 'EXPORT_DIR': self.export_dir,
+            'ARTIFACT_DIR': os.path.join(self.export_dir, 'artifacts'),
+        })
+        self.settings_override.enable()
+        self.source_query.cache_duration = 60
+        self.source_query.save()
+        
+        response = self.client.post('/api/core/export-jobs/', {
+            'query_id': self.source_query.id, 'format': 'csv'
+        }, format='json')
+        self.download_url = f"/api/core/export-jobs/{response.data['id']}/download/"
+        self.full = self.client.get(self.download_url)
+        self.content = b''.join(self.full.streaming_content)
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.export_dir, ignore_errors=True)
+        super().tearDown()
+    
+    def _get(self, url=None, **headers):
+        response = self.client.get(url or self.download_url, **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+    
+    def test_full_download_headers(self):
+        """Testa ETag, Content-Length e Accept-Ranges no download completo"""
+        self.assertEqual(self.full.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.full['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(self.full['Content-Length']), len(self.content))
+        self.assertTrue(self.full['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', self.full)
+    
+    def test_resume_with_range(self):
+        """Testa a retomada do download a partir de um byte"""
+        response, content = self._get(HTTP_RANGE='bytes=100-', HTTP_IF_RANGE=self.full['ETag'])
+        
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(content, self.content[100:])
+        self.assertEqual(response['Content-Range'], f'bytes 100-{len(self.content) - 1}/{len(self.content)}')
+        self.assertEqual(int(response['Content-Length']), len(self.content) - 100)
+        
+        response, content = self._get(HTTP_RANGE='bytes=-10')
+        self.assertEqual(content, self.content[-10:])
+        response, content = self._get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(content, self.content[:10])
+    
+    def test_if_range_mismatch_sends_full_file(self):
+        """Testa que If-Range de outra versão do arquivo envia o arquivo inteiro"""
+        response, content = self._get(HTTP_RANGE='bytes=100-', HTTP_IF_RANGE='"outra-versao"')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content, self.content)
+    
+    def test_unsatisfiable_and_multiple_ranges(self):
+        """Testa intervalo fora do arquivo (416) e vários intervalos (arquivo inteiro)"""
+        response, _ = self._get(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+        
+        response, content = self._get(HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content, self.content)
+    
+    def test_if_none_match(self):
+        """Testa 304 quando o cliente já possui o arquivo"""
+        response, _ = self._get(HTTP_IF_NONE_MATCH=self.full['ETag'])
+        
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_artifact_download_resumable(self):
+        """Testa que a exportação informa um endereço GET que aceita Range"""
+        response = self.client.post(f'{TestConstants.QUERIES_URL}export/', {
+            'query_id': self.source_query.id, 'limit': 1000, 'format': 'excel'
+        }, format='json')
+        content = b''.join(response.streaming_content)
+        location = response['Content-Location']
+        self.assertEqual(int(response['Content-Length']), len(content))
+        
+        partial, partial_content = self._get(location, HTTP_RANGE='bytes=50-', HTTP_IF_RANGE=response['ETag'])
+        
+        self.assertEqual(partial.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(partial_content, content[50:])
+        
+        purge_artifacts()
+        gone, _ = self._get(location)
+        self.assertEqual(gone.status_code, status.HTTP_410_GONE)
+    
+    def test_artifact_download_requires_permission(self):
+        """Testa que o download do artefato respeita a permissão na conexão"""
+        response = self.client.post(f'{TestConstants.QUERIES_URL}export/', {
+            'query_id': self.source_query.id, 'limit': 1000, 'format': 'excel'
+        }, format='json')
+        self.authenticate_readonly()
+        
+        forbidden, _ = self._get(response['Content-Location'])
+        
+        self.assertEqual(forbidden.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_nginx_sendfile(self):
+        """Testa o envio pelo nginx (X-Accel-Redirect) sem ler o arquivo no Django"""
+        with override_settings(REPORTME_SETTINGS={
+            'EXPORT_DIR': self.export_dir, 'EXPORT_SENDFILE': 'nginx', 'EXPORT_SENDFILE_URL': '/protected-exports/'
+        }):
+            response = self.client.get(self.download_url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'')
+        self.assertRegex(response['X-Accel-Redirect'], r'^/protected-exports/\d+\.csv$')
+        self.assertIn('filename="Vendas_export.csv"', response['Content-Disposition'])
+
+
+class _FakeCopyCursor:
+    """Cursor no estilo do psycopg2: COPY executado no banco SQLite de origem"""
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.rowcount = -1
+    
+    def mogrify(self, sql, params=None):
+        literals = {name: str(value) if isinstance(value, (int, float)) else f"'{value}'" for name, value in (params or {}).items()}
+        return (sql % literals).encode('utf-8')
+    
+    def copy_expert(self, sql, output):
+        self.raw.copy_sql = sql
+        if self.raw.delay:
+            deadline = time.time() + self.raw.delay
+            while time.time() < deadline:
+                if self.raw.cancelled:
+                    raise Exception('canceling statement due to user request')
+                time.sleep(0.01)
+        inner = sql[len('COPY ('):sql.rindex(') TO STDOUT')]
+        source = sqlite3.connect(self.raw.db_path)
+        try:
+            cursor = source.execute(inner)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator='\n')
+            writer.writerow([column[0] for column in cursor.description])
+            self.rowcount = 0
+            for row in cursor:
+                writer.writerow(row)
+                self.rowcount += 1
+                output.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+            output.write(buffer.getvalue())
+        except sqlite3.Error as e:
+            raise Exception(str(e))
+        finally:
+            source.close()
+    
+    def close(self):
+        pass
+
+
+class _FakeCopyConnection:
+    """Conexão emprestada da pool (PooledConnection) com um driver no estilo do psycopg2"""
+    
+    def __init__(self, db_path, delay=0):
+        self.db_path = db_path
+        self.delay = delay
+        self.copy_sql = None
+        self.cancelled = False
+        self.invalidated = False
+        self.returned = False
+        self.raw = self
+    
+    def cursor(self):
+        return _FakeCopyCursor(self)
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def invalidate(self):
+        self.invalidated = True
+    
+    def close(self):
+        self.returned = True
+
+
+class CopyCSVExportTestCase(SourceDatabaseTestCase):
+    """Testa a exportação CSV do PostgreSQL gerada pelo COPY"""
+    
+    def setUp(self):
+        super().setUp()
+        self.pg_connection = TestDataFactory.create_connection(
+            created_by=self.admin_user, name='PostgreSQL', sgbd='postgresql', host='localhost', database='vendas'
+        )
+        self.pg_query = TestDataFactory.create_query(
+            connection=self.pg_connection, created_by=self.admin_user, name='Vendas PG',
+            query='SELECT id, vendedor, valor FROM vendas WHERE id > :minimo ORDER BY id'
+        )
+        self.export_url = f'{TestConstants.QUERIES_URL}export/'
+    
+    def _export(self, fake, **data):
+        with mock.patch('core.streaming.get_pooled_connection', return_value=fake):
+            response = self.client.post(self.export_url, {
+                'query_id': self.pg_query.id,
+                'parameters': {'minimo': 10},
+                'limit': 1000,
+                'format': 'csv',
+                **data
+            }, format='json')
+            content = b''.join(response.streaming_content) if response.streaming else b''
+        return response, content
+    
+    def test_export_uses_copy(self):
+        """Testa que o CSV vem do COPY, com os parâmetros incorporados ao SQL"""
+        fake = _FakeCopyConnection(self.db_path)
+        
+        with mock.patch.object(StreamingQuery, 'open', side_effect=AssertionError('Cursor usado')):
+            response, content = self._export(fake)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            fake.copy_sql,
+            'COPY (SELECT id, vendedor, valor FROM vendas WHERE id > 10 ORDER BY id LIMIT 1000) '
+            'TO STDOUT WITH (FORMAT csv, HEADER true)'
+        )
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8'))))
+        self.assertEqual(rows[0], ['id', 'vendedor', 'valor'])
+        self.assertEqual(rows[1], ['11', 'Vendedor 4', '115.5'])
+        self.assertEqual(len(rows), self.ROWS - 10 + 1)
+        self.assertTrue(fake.returned)
+        self.assertFalse(fake.invalidated)
+        
+        execution = QueryExecution.objects.filter(query=self.pg_query).latest('executed_at')
+        self.assertEqual(execution.status, 'success')
+        self.assertEqual(execution.rows_returned, self.ROWS - 10)
+    
+    def test_copy_error_before_download(self):
+        """Testa que erro de SQL no COPY ainda retorna 400"""
+        self.pg_query.query = 'SELECT coluna_inexistente FROM vendas'
+        self.pg_query.save()
+        fake = _FakeCopyConnection(self.db_path)
+        
+        response, _ = self._export(fake, parameters={})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('coluna_inexistente', response.data['error'])
+        self.assertTrue(fake.invalidated)
+        self.assertEqual(QueryExecution.objects.filter(query=self.pg_query).latest('executed_at').status, 'error')
+    
+    def test_copy_timeout_cancels_on_server(self):
+        """Testa que o COPY sem dados por mais que o timeout é cancelado"""
+        self.pg_query.timeout = 1
+        self.pg_query.save()
+        fake = _FakeCopyConnection(self.db_path, delay=5)
+        
+        response, _ = self._export(fake)
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tempo limite', response.data['error'])
+        self.assertTrue(fake.cancelled)
+        self.assertTrue(fake.invalidated)
+    
+    def test_interrupted_download_cancels_copy(self):
+        """Testa que o download interrompido cancela o COPY e descarta a conexão"""
+        fake = _FakeCopyConnection(self.db_path)
+        
+        with mock.patch('core.streaming.COPY_CHUNK_SIZE', 100), mock.patch('core.streaming.COPY_QUEUE_SIZE', 1):
+            with mock.patch('core.streaming.get_pooled_connection', return_value=fake):
+                response = self.client.post(self.export_url, {
+                    'query_id': self.pg_query.id, 'parameters': {'minimo': 0}, 'format': 'csv'
+                }, format='json')
+                next(iter(response.streaming_content))
+                response.close()
+        
+        self.assertTrue(fake.invalidated)
+        self.assertTrue(fake.returned)
+    
+    def test_copy_disabled_uses_cursor(self):
+        """Testa que CSV_COPY_EXPORT=False volta para a leitura pelo cursor"""
+        with override_settings(REPORTME_SETTINGS={'CSV_COPY_EXPORT': False}):
+            with mock.patch.object(StreamingQuery, 'open', side_effect=Exception('cursor')) as stream_open:
+                response, _ = self._export(_FakeCopyConnection(self.db_path))
+        
+        stream_open.assert_called_once()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NDJSONOutputTestCase(SourceDatabaseTestCase):
+    """Testa o envio em NDJSON (execute e export)"""
+    
+    def _lines(self, response):
+        content = b''.join(response.streaming_content)
+        return [json.loads(line) for line in content.decode('utf-8').splitlines()]
+    
+    @override_settings(REPORTME_SETTINGS={'STREAM_BATCH_SIZE': 100})
+    def test_execute_ndjson(self):
+        """Testa um objeto por linha, enviado em um bloco por lote"""
+        response = self.client.post(f'{self.execute_url}?format=ndjson', {
+            'query_id': self.source_query.id,
+            'limit': 1000
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        
+        rows = [json.loads(line) for line in b''.join(chunks).decode('utf-8').splitlines()]
+        self.assertEqual(len(rows), self.ROWS)
+        self.assertEqual(rows[0], {'id': 1, 'vendedor': 'Vendedor 1', 'valor': 10.5})
+        
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertEqual(execution.rows_returned, self.ROWS)
+    
+    def test_execute_ndjson_accept_header(self):
+        """Testa a seleção do NDJSON pelo cabeçalho Accept"""
+        response = self.client.post(self.execute_url, {
+            'query_id': self.source_query.id
+        }, format='json', HTTP_ACCEPT='application/x-ndjson')
+        
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(self._lines(response)), 100)
+    
+    def test_ndjson_lifts_row_cap(self):
+        """Testa que o limite de 10000 linhas vale apenas para respostas JSON"""
+        response = self.client.post(self.execute_url, {
+            'query_id': self.source_query.id,
+            'limit': 50000
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('limit', response.data)
+        
+        response = self.client.post(f'{self.execute_url}?format=ndjson', {
+            'query_id': self.source_query.id,
+            'limit': 50000
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self._lines(response)), self.ROWS)
+        
+        with override_settings(REPORTME_SETTINGS={'NDJSON_MAX_ROWS': 20000}):
+            response = self.client.post(f'{self.execute_url}?format=ndjson', {
+                'query_id': self.source_query.id,
+                'limit': 50000
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(b'20000', response.content)
+    
+    def test_ndjson_only_on_execution_actions(self):
+        """Testa que list e retrieve não respondem em NDJSON"""
+        response = self.client.get(f'{TestConstants.QUERIES_URL}?format=ndjson')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        response = self.client.get(
+            f'{TestConstants.QUERIES_URL}{self.source_query.id}/', HTTP_ACCEPT='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+    
+    def test_execute_ndjson_error(self):
+        """Testa que erro de SQL retorna um objeto de erro (400)"""
+        self.source_query.query = 'SELECT coluna_inexistente FROM vendas'
+        self.source_query.save()
+        
+        response = self.client.post(f'{self.execute_url}?format=ndjson', {
+            'query_id': self.source_query.id
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        error = json.loads(response.content.decode('utf-8').strip())
+        self.assertFalse(error['success'])
+        self.assertIn('coluna_inexistente', error['error'])
+    
+    def test_export_ndjson(self):
+        """Testa a exportação NDJSON, inclusive comprimida"""
+        export_url = f'{TestConstants.QUERIES_URL}export/'
+        response = self.client.post(export_url, {
+            'query_id': self.source_query.id, 'format': 'ndjson', 'limit': 50000
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('filename="Vendas_export.ndjson"', response['Content-Disposition'])
+        self.assertEqual(len(self._lines(response)), self.ROWS)
+        
+        response = self.client.post(export_url, {
+            'query_id': self.source_query.id, 'format': 'ndjson', 'compression': 'gzip', 'limit': 1000
+        }, format='json')
+        self.assertIn('filename="Vendas_export.ndjson.gz"', response['Content-Disposition'])
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(json.loads(content.splitlines()[-1])['id'], self.ROWS)
+    
+    def test_export_job_ndjson(self):
+        """Testa NDJSON nas exportações em segundo plano"""
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir, ignore_errors=True)
+        
+        with override_settings(REPORTME_SETTINGS={'EXPORT_JOB_BACKEND': 'inline', 'EXPORT_DIR': export_dir}):
+            response = self.client.post('/api/core/export-jobs/', {
+                'query_id': self.source_query.id, 'format': 'ndjson', 'compression': 'gzip'
+            }, format='json')
+        
+        self.assertEqual(response.data['status'], 'success')
+        job = ExportJob.objects.get(pk=response.data['id'])
+        self.assertTrue(job.file_path.endswith('.ndjson.gz'))
+        with gzip.open(job.file_path, 'rt', encoding='utf-8') as job_file:
+            self.assertEqual(len(job_file.readlines()), self.ROWS)
+
+
+class FanOutExportTestCase(SourceDatabaseTestCase):
+    """Testa a exportação em vários formatos com uma única execução da consulta"""
+    
+    def setUp(self):
+        super().setUp()
+        self.artifact_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(REPORTME_SETTINGS={'ARTIFACT_DIR': self.artifact_dir})
+        self.settings_override.enable()
+        self.export_url = f'{TestConstants.QUERIES_URL}export/'
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.artifact_dir, ignore_errors=True)
+        super().tearDown()
+    
+    def _export(self, formats, **data):
+        return self.client.post(self.export_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000,
+            'formats': formats,
+            **data
+        }, format='json')
+    
+    def _count_opens(self):
+        original_open = StreamingQuery.open
+        opens = []
+        
+        def counting_open(stream):
+            opens.append(stream.sql)
+            return original_open(stream)
+        
+        return mock.patch.object(StreamingQuery, 'open', autospec=True, side_effect=counting_open), opens
+    
+    def test_zip_bundle_single_execution(self):
+        """Testa CSV, XLSX e NDJSON gerados a partir de uma única leitura do cursor"""
+        patcher, opens = self._count_opens()
+        with patcher:
+            response = self._export(['csv', 'excel', 'ndjson'])
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('Vendas_export.zip', response['Content-Disposition'])
+        self.assertEqual(len(opens), 1)
+        
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(
+            archive.namelist(), ['Vendas_export.csv', 'Vendas_export.xlsx', 'Vendas_export.ndjson']
+        )
+        self.assertEqual(archive.getinfo('Vendas_export.csv').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.getinfo('Vendas_export.xlsx').compress_type, zipfile.ZIP_STORED)
+        
+        rows = list(csv.reader(io.StringIO(archive.read('Vendas_export.csv').decode('utf-8'))))
+        self.assertEqual(rows[0], ['id', 'vendedor', 'valor'])
+        self.assertEqual(len(rows), self.ROWS + 1)
+        
+        workbook = load_workbook(io.BytesIO(archive.read('Vendas_export.xlsx')), read_only=True)
+        self.assertEqual(len(list(workbook['Dados'].iter_rows())), self.ROWS + 1)
+        self.assertIn('Metadados', workbook.sheetnames)
+        
+        lines = archive.read('Vendas_export.ndjson').decode('utf-8').splitlines()
+        self.assertEqual(len(lines), self.ROWS)
+        self.assertEqual(json.loads(lines[-1])['id'], self.ROWS)
+        
+        executions = QueryExecution.objects.filter(query=self.source_query)
+        self.assertEqual(executions.count(), 1)
+        self.assertEqual(executions.get().rows_returned, self.ROWS)
+        # Sem cache_duration nada fica guardado
+        self.assertEqual(list_artifacts(), [])
+    
+    def test_artifacts_bundle(self):
+        """Testa os arquivos guardados como artefatos, com endereço de download por formato"""
+        response = self._export(['csv', 'excel'], bundle='artifacts')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['artifacts']), {'csv', 'excel'})
+        for export_format, artifact in response.data['artifacts'].items():
+            self.assertEqual(artifact['rows'], self.ROWS)
+            download = self.client.get(artifact['download_url'])
+            self.assertEqual(download.status_code, status.HTTP_200_OK)
+            content = b''.join(download.streaming_content)
+            self.assertEqual(len(content), artifact['size'])
+            self.assertEqual(download['Content-Type'], artifact['content_type'])
+        
+        # Disponíveis para download, mas não reaproveitados sem cache_duration
+        patcher, opens = self._count_opens()
+        with patcher:
+            response = self._export(['csv'], bundle='artifacts')
+        self.assertEqual(len(opens), 1)
+    
+    def test_reuses_existing_artifacts(self):
+        """Testa que apenas os formatos sem artefato executam a consulta"""
+        self.source_query.cache_duration = 60
+        self.source_query.save()
+        response = self.client.post(self.export_url, {
+            'query_id': self.source_query.id, 'limit': 1000, 'format': 'csv'
+        }, format='json')
+        csv_content = b''.join(response.streaming_content)
+        
+        patcher, opens = self._count_opens()
+        with patcher:
+            response = self._export(['csv', 'excel'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(opens), 1)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.read('Vendas_export.csv'), csv_content)
+        self.assertTrue(QueryExecution.objects.filter(query=self.source_query, cache_hit=True).exists())
+        
+        # Os dois formatos agora estão guardados
+        with patcher:
+            response = self._export(['excel', 'csv'], bundle='artifacts')
+        self.assertEqual(len(opens), 1)
+        self.assertEqual(len(list_artifacts()), 2)
+    
+    def test_writer_error_aborts_all_formats(self):
+        """Testa que a falha de um formato interrompe os demais e nada é guardado"""
+        def failing_write(stream, output, metadata=None, on_complete=None):
+            for batch in stream.batches():
+                raise ValueError('falha no gravador')
+        
+        failing = ExportFormat('xlsx', EXPORT_FORMATS['excel'].content_type, failing_write, None)
+        with override_settings(REPORTME_SETTINGS={'ARTIFACT_DIR': self.artifact_dir, 'STREAM_BATCH_SIZE': 10}), \
+                mock.patch.dict(EXPORT_FORMATS, {'excel': failing}):
+            response = self._export(['csv', 'excel'], bundle='artifacts')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('falha no gravador', response.data['error'])
+        self.assertEqual(os.listdir(self.artifact_dir), [])
+        execution = QueryExecution.objects.filter(query=self.source_query).latest('executed_at')
+        self.assertEqual(execution.status, 'error')
+    
+    def test_fan_out_source_error(self):
+        """Testa que um erro na leitura do cursor é repassado e encerra os gravadores"""
+        class BrokenStream:
+            columns = ['id']
+            column_types = ['int']
+            description = None
+            closed = False
+            
+            def batches(self):
+                yield [(1,), (2,)]
+                raise RuntimeError('conexão perdida')
+            
+            def close(self):
+                self.closed = True
+        
+        stream = BrokenStream()
+        completed = []
+        outputs = [('csv', io.BytesIO()), ('ndjson', io.BytesIO())]
+        with self.assertRaisesMessage(RuntimeError, 'conexão perdida'):
+            fan_out(stream, outputs, on_complete=lambda rows, error: completed.append((rows, error)))
+        
+        self.assertTrue(stream.closed)
+        self.assertEqual(completed[0][0], 2)
+        self.assertIsInstance(completed[0][1], RuntimeError)
+        self.assertFalse(any(thread.name.startswith('reportme-fanout') for thread in threading.enumerate()))
+    
+    def test_invalid_formats(self):
+        """Testa a validação da lista de formatos"""
+        response = self._export(['csv', 'pdf'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('formats', response.data)
+        
+        response = self._export([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        with override_settings(REPORTME_SETTINGS={'ENABLE_EXPORT_ARTIFACTS': False}):
+            response = self._export(['csv'], bundle='artifacts')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PartitionedExecutionTestCase(SourceDatabaseTestCase):
+    """Testa a execução particionada (intervalos lidos em paralelo)"""
+    
+    def setUp(self):
+        super().setUp()
+        self.export_url = f'{TestConstants.QUERIES_URL}export/'
+        self.source_query.partition_column = 'id'
+        self.source_query.partition_count = 3
+        self.source_query.partition_bounds = [100, 200]
+        self.source_query.save()
+    
+    def _export_csv(self, **data):
+        response = self.client.post(self.export_url, {
+            'query_id': self.source_query.id,
+            'limit': 1000,
+            'format': 'csv',
+            'compression': 'none',
+            **data
+        }, format='json')
+        content = b''.join(response.streaming_content).decode('utf-8') if response.status_code == 200 else ''
+        return response, list(csv.reader(io.StringIO(content)))
+    
+    def _record_opens(self):
+        original_open = StreamingQuery.open
+        opens = []
+        
+        def recording_open(stream):
+            opens.append((stream.sql, stream.params, threading.current_thread().name))
+            return original_open(stream)
+        
+        return mock.patch.object(StreamingQuery, 'open', autospec=True, side_effect=recording_open), opens
+    
+    def test_declared_ranges(self):
+        """Testa uma consulta por intervalo, em threads separadas, com todas as linhas"""
+        patcher, opens = self._record_opens()
+        with patcher:
+            response, rows = self._export_csv()
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(rows[0], ['id', 'vendedor', 'valor'])
+        self.assertEqual(sorted(int(row[0]) for row in rows[1:]), list(range(1, self.ROWS + 1)))
+        
+        self.assertEqual(len(opens), 3)
+        self.assertTrue(all('reportme_partition' in sql for sql, _, _ in opens))
+        self.assertTrue(all(thread.startswith('reportme-partition') for _, _, thread in opens))
+        self.assertEqual(
+            QueryExecution.objects.filter(query=self.source_query).latest('executed_at').rows_returned, self.ROWS
+        )
+    
+    def test_ranges_from_min_max(self):
+        """Testa os intervalos calculados a partir de MIN/MAX da coluna"""
+        self.source_query.partition_bounds = []
+        self.source_query.partition_count = 4
+        self.source_query.save()
+        
+        patcher, opens = self._record_opens()
+        with patcher:
+            response, rows = self._export_csv()
+        
+        self.assertEqual(len(rows), self.ROWS + 1)
+        self.assertIn('MIN(id)', opens[0][0])
+        self.assertEqual(len(opens), 5)
+    
+    def test_null_values_and_limit(self):
+        """Testa linhas com a coluna nula (primeira partição) e o limite total"""
+        self.source_query.partition_column = 'valor'
+        self.source_query.partition_bounds = [1000, 2000]
+        self.source_query.save()
+        source = sqlite3.connect(self.db_path)
+        source.execute("INSERT INTO vendas (id, vendedor, valor) VALUES (999, 'Sem valor', NULL)")
+        source.commit()
+        source.close()
+        
+        response, rows = self._export_csv()
+        self.assertEqual(len(rows), self.ROWS + 2)
+        self.assertIn('999', [row[0] for row in rows])
+        
+        with override_settings(REPORTME_SETTINGS={'STREAM_BATCH_SIZE': 10}):
+            response, rows = self._export_csv(limit=50)
+        self.assertEqual(len(rows), 51)
+    
+    def test_excel_export_and_snapshot(self):
+        """Testa o resultado particionado nos gravadores de arquivo e no snapshot"""
+        response = self.client.post(self.export_url, {
+            'query_id': self.source_query.id, 'limit': 1000, 'format': 'excel'
+        }, format='json')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        self.assertEqual(len(list(workbook['Dados'].iter_rows())), self.ROWS + 1)
+        
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir, ignore_errors=True)
+        with override_settings(REPORTME_SETTINGS={'SNAPSHOT_DIR': snapshot_dir}):
+            response = self.client.post(f'{TestConstants.QUERIES_URL}execute-paginated/', {
+                'query_id': self.source_query.id, 'page_size': 100, 'snapshot': True
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['pagination']['total_records'], self.ROWS)
+    
+    def test_partition_error(self):
+        """Testa que o erro de uma partição é retornado e as demais são encerradas"""
+        self.source_query.partition_column = 'inexistente'
+        self.source_query.save()
+        
+        response, _ = self._export_csv()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(any(thread.name.startswith('reportme-partition') for thread in threading.enumerate()))
+    
+    def test_disabled(self):
+        """Testa a execução em um único cursor com o particionamento desabilitado"""
+        patcher, opens = self._record_opens()
+        with override_settings(REPORTME_SETTINGS={'ENABLE_PARTITIONED_EXECUTION': False}), patcher:
+            response, rows = self._export_csv()
+        self.assertEqual(len(rows), self.ROWS + 1)
+        self.assertEqual(len(opens), 1)
+        self.assertNotIn('reportme_partition', opens[0][0])
+    
+    def test_partition_settings_validation(self):
+        """Testa a validação da coluna e dos limites ao salvar a consulta"""
+        url = f'{TestConstants.QUERIES_URL}{self.source_query.id}/'
+        response = self.client.patch(url, {'partition_column': 'id; DROP TABLE vendas'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('partition_column', response.data)
+        
+        response = self.client.patch(url, {'partition_bounds': [200, 100]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('partition_bounds', response.data)
+        
+        response = self.client.patch(url, {
+            'connection_id': self.source_connection.id,
+            'partition_bounds': ['2024-01-01', '2025-01-01']
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_split_bounds(self):
+        """Testa a divisão de MIN/MAX em intervalos de mesma largura"""
+        self.assertEqual(split_bounds(1, 250, 4), [63, 125, 187])
+        self.assertEqual(split_bounds(1, 3, 2), [2])
+        self.assertEqual(split_bounds(5, 5, 4), [])
+        self.assertEqual(split_bounds(0.0, 1.0, 4), [0.25, 0.5, 0.75])
+        self.assertEqual(
+            split_bounds(datetime.date(2024, 1, 1), datetime.date(2024, 1, 5), 2), [datetime.date(2024, 1, 3)]
+        )
+        self.assertEqual(split_bounds('a', 'z', 4), [])
+        self.assertEqual(split_bounds(None, None, 4), [])